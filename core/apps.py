@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .services import read_models  # noqa: F401 -- connects the Account signal receivers
+        if getattr(settings, 'LEDGER_LOG_DIR', None):
+            from . import ledgerlog
+            ledgerlog.connect_receivers()
@@ -0,0 +1,153 @@
+# core/audit.py
+"""
+Full-ledger audit that re-hashes the Completed chain in parallel.
+
+Each shard's chain is streamed once from the database and cut into
+contiguous segments. Each segment is re-hashed and link-checked in a worker
+process; the parent then stitches every shard's segments together by
+checking that each segment starts where the previous one ended.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .hashing import HASHED_FIELDS, hash_transaction_values
+from .utils import GENESIS_HASH
+
+# Position of each column in the rows handed to workers
+_PREVIOUS_HASH = HASHED_FIELDS.index('previous_block_hash')
+_TIMESTAMP = HASHED_FIELDS.index('timestamp')
+_HASH = len(HASHED_FIELDS)
+
+def verify_segment(shard, index, rows):
+    """
+    Re-hashes one contiguous run of the chain. Runs inside a worker process.
+    Returns a dict describing the segment's boundary hashes and its first failure, if any.
+    """
+    result = {
+        'shard': shard,
+        'segment': index,
+        'count': len(rows),
+        'first_transaction_id': str(rows[0][0]),
+        'first_previous_hash': rows[0][_PREVIOUS_HASH],
+        'last_transaction_id': rows[-1][0],
+        'last_timestamp': rows[-1][_TIMESTAMP],
+        'last_hash': rows[-1][_HASH],
+        'failure': None,
+    }
+    expected_previous = result['first_previous_hash']
+    for offset, row in enumerate(rows):
+        if row[_PREVIOUS_HASH] != expected_previous:
+            result['failure'] = {
+                'offset': offset,
+                'transaction_id': str(row[0]),
+                'reason': f"Expected previous hash {expected_previous}, got {row[_PREVIOUS_HASH]}",
+            }
+            break
+        recalculated_hash = hash_transaction_values(*row[:_HASH])
+        if row[_HASH] != recalculated_hash:
+            result['failure'] = {
+                'offset': offset,
+                'transaction_id': str(row[0]),
+                'reason': f"Hash mismatch: stored {row[_HASH]}, recalculated {recalculated_hash}",
+            }
+            break
+        expected_previous = row[_HASH]
+    return result
+
+def _stream_segments(queryset, segment_size):
+    """Yields lists of at most segment_size rows, in chain order."""
+    segment = []
+    for row in queryset.values_list(*HASHED_FIELDS, 'hash').iterator(chunk_size=min(segment_size, 10000)):
+        segment.append(row)
+        if len(segment) >= segment_size:
+            yield segment
+            segment = []
+    if segment:
+        yield segment
+
+def _stitch(results):
+    """
+    Walks one shard's segment results in order, checking each boundary link.
+    Returns (is_valid, total_blocks, last_result, failure).
+    """
+    current_hash_in_chain = GENESIS_HASH
+    total_blocks = 0
+    last_result = None
+    for result in results:
+        if result['first_previous_hash'] != current_hash_in_chain:
+            return False, total_blocks, last_result, {
+                'shard': result['shard'],
+                'segment': result['segment'],
+                'offset': 0,
+                'transaction_id': result['first_transaction_id'],
+                'reason': f"Segment boundary broken: expected previous hash {current_hash_in_chain}, "
+                          f"got {result['first_previous_hash']}",
+            }
+        if result['failure']:
+            failure = dict(result['failure'], shard=result['shard'], segment=result['segment'])
+            return False, total_blocks + failure['offset'], last_result, failure
+        current_hash_in_chain = result['last_hash']
+        total_blocks += result['count']
+        last_result = result
+    return True, total_blocks, last_result, None
+
+def _shard_segments(shards, segment_size):
+    """Yields (shard, index, rows) for every segment of every shard, in chain order."""
+    from .models import Transaction # Import Transaction here to avoid circular import
+
+    for shard in shards:
+        queryset = Transaction.objects.filter(shard=shard, chain_position__isnull=False).order_by('chain_position')
+        for index, rows in enumerate(_stream_segments(queryset, segment_size)):
+            yield shard, index, rows
+
+def audit_ledger(workers=None, segment_size=50000):
+    """
+    Re-hashes every shard's chain from genesis using a process pool.
+
+    workers defaults to the number of CPUs; workers=1 audits in-process.
+    Returns a report dict with is_valid, total_blocks, the number of segments,
+    a per-shard breakdown and, on failure, which shard and segment broke and
+    where. Every cleanly audited shard also gets a fresh LedgerCheckpoint.
+    """
+    from .models import ChainHead, LedgerCheckpoint # Import models here to avoid circular import
+
+    workers = workers or os.cpu_count() or 1
+    shards = list(ChainHead.objects.order_by('shard').values_list('shard', flat=True))
+    segments = _shard_segments(shards, segment_size)
+
+    results = []
+    if workers == 1:
+        results = [verify_segment(*segment) for segment in segments]
+    else:
+        # Workers only receive plain row tuples and never touch the database
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for segment in segments:
+                pending.append(executor.submit(verify_segment, *segment))
+                # Bound the rows held in memory while the pool catches up with the reader
+                while len(pending) > workers * 2:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+
+    report = {'is_valid': True, 'total_blocks': 0, 'segments': len(results), 'shards': {}, 'failure': None}
+    for shard in shards:
+        is_valid, total_blocks, last_result, failure = _stitch([r for r in results if r['shard'] == shard])
+        if is_valid and last_result is not None:
+            LedgerCheckpoint.objects.create(
+                shard=shard,
+                last_transaction_id=last_result['last_transaction_id'],
+                last_hash=last_result['last_hash'],
+                position=total_blocks,
+                last_timestamp=last_result['last_timestamp'],
+            )
+        report['shards'][shard] = {
+            'is_valid': is_valid,
+            'total_blocks': total_blocks,
+            'last_block_hash': last_result['last_hash'] if last_result else GENESIS_HASH,
+        }
+        report['total_blocks'] += total_blocks
+        if not is_valid and report['failure'] is None:
+            report['is_valid'] = False
+            report['failure'] = failure
+    return report
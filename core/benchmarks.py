@@ -0,0 +1,551 @@
+# core/benchmarks.py
+"""
+Performance scenarios run by the ``benchmark`` management command.
+
+Every scenario writes its fixtures inside a transaction that the command rolls
+back afterwards, so benchmarks never leave rows behind in the target database.
+"""
+import csv
+import io
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CustomUser, Account, Transaction, ChainHead
+from .utils import percentile, verify_ledger_integrity
+from .hashing import CURRENT_HASH_VERSION, hash_transaction_values
+from .audit import audit_ledger
+from .ledgerlog import LedgerLog, replay_ledger, seed_ledger_log
+from .reconciliation import reconcile_balances
+from .seeding import seed_bank
+from .services.transfers import transfer_batch, transfer_funds
+from .services.history import user_history, user_history_page, encode_cursor
+from .services.exports import COLUMNS, export_statement
+from .serializers import TransactionSerializer
+from . import chatbot, qrcodes
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Registers a scenario function under ``name``."""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+def timed(func, *args, **kwargs):
+    """Returns (elapsed_seconds, result) for a single call."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+def measure(operation, samples, setup=None):
+    """
+    Calls operation samples times, each after an untimed setup() if given.
+    Returns (p50 seconds, p99 seconds, database queries per call).
+    """
+    latencies, queries = [], []
+
+    def count(execute, *args):
+        queries.append(1)
+        return execute(*args)
+
+    for _ in range(samples):
+        if setup:
+            setup()
+        with connection.execute_wrapper(count):
+            elapsed, _ = timed(operation)
+        latencies.append(elapsed)
+    return percentile(latencies, 0.50), percentile(latencies, 0.99), len(queries) / samples
+
+def create_benchmark_accounts(count=2):
+    """Creates throwaway users with one funded Checking account each."""
+    suffix = uuid.uuid4().hex[:8]
+    accounts = []
+    for i in range(count):
+        user = CustomUser.objects.create(username=f"bench-{suffix}-{i}")
+        accounts.append(Account.objects.create(
+            user=user,
+            account_type='Checking',
+            account_number=f"B{suffix}{i}"[:20],
+            balance=Decimal('1000000000.00'),
+        ))
+    return accounts
+
+def seed_chain(sender, receiver, count, start=None, batch_size=5000):
+    """
+    Appends ``count`` hash-chained Completed transactions with bulk inserts,
+    advancing the ChainHead once at the end. Returns the last timestamp used
+    so further batches continue in time order.
+    """
+    timestamp = start or timezone.now()
+    head = ChainHead.objects.lock()
+    batch = []
+    for _ in range(count):
+        timestamp += timedelta(microseconds=1)
+        txn = Transaction(
+            sender_account=sender,
+            receiver_account=receiver,
+            amount=Decimal('1.00'),
+            transaction_type='Transfer',
+            description='Benchmark transfer',
+            timestamp=timestamp,
+            status='Completed',
+        )
+        head.link(txn)
+        batch.append(txn)
+        if len(batch) >= batch_size:
+            Transaction.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Transaction.objects.bulk_create(batch)
+    if count:
+        head.save()
+    return timestamp
+
+@benchmark('ledger_verify')
+def ledger_verify(write, sizes, repeat):
+    """
+    Grows the ledger to each size, appends a fixed batch and times one
+    checkpointed verification call against a full rescan of the same chain.
+    """
+    sender, receiver = create_benchmark_accounts()
+    timestamp = timezone.now()
+    seeded = ChainHead.objects.lock().height
+    write(f"{'ledger rows':>12} {'incremental (ms)':>18} {'full rescan (ms)':>18}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_chain(sender, receiver, size - seeded, timestamp)
+            seeded = size
+        verify_ledger_integrity() # Bring the checkpoint up to date
+        incremental = []
+        for _ in range(repeat):
+            timestamp = seed_chain(sender, receiver, 100, timestamp)
+            seeded += 100
+            elapsed, (is_valid, _, _, _) = timed(verify_ledger_integrity)
+            assert is_valid, "Benchmark ledger failed verification"
+            incremental.append(elapsed)
+        full, _ = timed(verify_ledger_integrity, full_rescan=True)
+        write(f"{seeded:>12} {min(incremental) * 1000:>18.2f} {full * 1000:>18.2f}")
+
+@benchmark('ledger_audit')
+def ledger_audit(write, sizes, repeat):
+    """Times the full-chain audit in-process against a pool using every core."""
+    sender, receiver = create_benchmark_accounts()
+    timestamp = timezone.now()
+    seeded = ChainHead.objects.lock().height
+    workers = os.cpu_count() or 1
+    write(f"{'ledger rows':>12} {'1 worker (ms)':>15} {f'{workers} workers (ms)':>18}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_chain(sender, receiver, size - seeded, timestamp)
+            seeded = size
+        single, _ = timed(audit_ledger, workers=1)
+        parallel, report = timed(audit_ledger, workers=workers)
+        assert report['is_valid'], "Benchmark ledger failed the audit"
+        write(f"{seeded:>12} {single * 1000:>15.2f} {parallel * 1000:>18.2f}")
+
+@benchmark('batch_transfer')
+def batch_transfer(write, sizes, repeat):
+    """Times posting a payroll batch of each size from one account."""
+    write(f"{'lines':>10} {'seconds':>10} {'transfers/s':>14}")
+    for size in sizes:
+        payroll, *staff = create_benchmark_accounts(min(size, 1000) + 1)
+        lines = [
+            {'recipient_account_number': staff[i % len(staff)].account_number, 'amount': '1.00', 'description': 'Payroll'}
+            for i in range(size)
+        ]
+        elapsed, entries = timed(transfer_batch, payroll, lines, transaction_type='Salary')
+        write(f"{len(entries):>10} {elapsed:>10.2f} {len(entries) / elapsed:>14,.0f}")
+
+def seed_history(accounts, count, start=None):
+    """
+    Inserts ``count`` Completed transfers spread evenly over every pair of
+    ``accounts``, one microsecond apart. History queries never read the hash
+    chain, so these rows are left unchained, which lets PostgreSQL generate
+    them server-side with generate_series. Returns the last timestamp used.
+    """
+    timestamp = start or timezone.now()
+    ids = [account.pk for account in accounts]
+    k = len(ids)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {Transaction._meta.db_table}
+                    (transaction_id, sender_account_id, receiver_account_id, amount, transaction_type,
+                     description, timestamp, status, shard, hash_version)
+                SELECT gen_random_uuid(), (%s::bigint[])[1 + n %% %s],
+                       (%s::bigint[])[1 + (n + 1 + (n / %s) %% (%s - 1)) %% %s],
+                       1.00, 'Transfer', 'Benchmark transfer', %s + n * interval '1 microsecond', 'Completed', 0, %s
+                FROM generate_series(1, %s) AS n
+            """, [ids, k, ids, k, k, k, timestamp, CURRENT_HASH_VERSION, count])
+        return timestamp + timedelta(microseconds=count)
+
+    batch = []
+    for n in range(1, count + 1):
+        batch.append(Transaction(
+            sender_account_id=ids[n % k],
+            receiver_account_id=ids[(n + 1 + (n // k) % (k - 1)) % k],
+            amount=Decimal('1.00'),
+            transaction_type='Transfer',
+            description='Benchmark transfer',
+            timestamp=timestamp + timedelta(microseconds=n),
+            status='Completed',
+        ))
+        if len(batch) >= 5000:
+            Transaction.objects.bulk_create(batch)
+            batch = []
+    Transaction.objects.bulk_create(batch)
+    return timestamp + timedelta(microseconds=count)
+
+@benchmark('transaction_history')
+def transaction_history(write, sizes, repeat):
+    """
+    Grows the ledger to each size with transfers between 200 accounts and
+    times one user's newest-first history page, comparing the old OR across
+    two joins with the UNION ALL of two index scans. Prints both query plans
+    at the largest size.
+    """
+    accounts = create_benchmark_accounts(200)
+    user = accounts[0].user
+    queries = {
+        'OR of joins': lambda: Transaction.objects.filter(
+            Q(sender_account__user=user) | Q(receiver_account__user=user)
+        ).order_by('-timestamp')[:10],
+        'UNION ALL': lambda: user_history(user, limit=10),
+    }
+    timestamp = timezone.now()
+    seeded = 0
+    write(f"{'ledger rows':>12} {'OR of joins (ms)':>18} {'UNION ALL (ms)':>16}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_history(accounts, size - seeded, timestamp)
+            seeded = size
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {Transaction._meta.db_table}")
+        timings = {}
+        for label, query in queries.items():
+            assert len(list(query())) == 10
+            timings[label] = min(timed(list, query())[0] for _ in range(repeat))
+        write(f"{seeded:>12} {timings['OR of joins'] * 1000:>18.2f} {timings['UNION ALL'] * 1000:>16.2f}")
+    for label, query in queries.items():
+        write(f"\n{label} plan:\n{query().explain()}")
+
+@benchmark('history_pages')
+def history_pages(write, sizes, repeat):
+    """
+    Grows the ledger to each size and times fetching the first and the last
+    25-row page of one user's history, with Paginator (COUNT plus OFFSET)
+    against the keyset cursor.
+    """
+    accounts = create_benchmark_accounts(200)
+    user = accounts[0].user
+    timestamp = timezone.now()
+    seeded = 0
+    write(f"{'ledger rows':>12} {'user rows':>10} {'offset p1 (ms)':>15} {'offset last (ms)':>17} "
+          f"{'keyset p1 (ms)':>15} {'keyset last (ms)':>17}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_history(accounts, size - seeded, timestamp)
+            seeded = size
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {Transaction._meta.db_table}")
+        paginator = Paginator(user_history(user), 25)
+        last = paginator.num_pages
+        # The keyset equivalent of the last page starts after the final row of the page before it
+        cursor = encode_cursor(list(paginator.page(last - 1))[-1]) if last > 1 else None
+
+        def offset_page(number):
+            return list(Paginator(user_history(user), 25).page(number))
+        timings = [
+            min(timed(offset_page, 1)[0] for _ in range(repeat)),
+            min(timed(offset_page, last)[0] for _ in range(repeat)),
+            min(timed(user_history_page, user)[0] for _ in range(repeat)),
+            min(timed(user_history_page, user, cursor)[0] for _ in range(repeat)),
+        ]
+        write(f"{seeded:>12} {paginator.count:>10} " + " ".join(
+            f"{t * 1000:>{w}.2f}" for t, w in zip(timings, (15, 17, 15, 17))
+        ))
+
+@benchmark('qr_code')
+def qr_code(write, sizes, repeat):
+    """
+    Times serving each size of distinct Pay Me QR codes: rendered on every
+    request, as before, and from the cache once each has been rendered.
+    """
+    write(f"{'codes':>8} {'render (ms/code)':>18} {'cached (ms/code)':>18}")
+    for size in sizes:
+        payloads = [f"https://bench.example.com/pay/{uuid.uuid4().hex[:10]}/" for _ in range(min(size, 1000))]
+        render = min(timed(lambda: [qrcodes.render_qr_png(p) for p in payloads])[0] for _ in range(repeat))
+        qrcodes._images.clear()
+        for payload in payloads:
+            qrcodes.qr_png(payload)
+        cached = min(timed(lambda: [qrcodes.qr_png(p) for p in payloads])[0] for _ in range(repeat))
+        write(f"{len(payloads):>8} {render * 1000 / len(payloads):>18.3f} {cached * 1000 / len(payloads):>18.4f}")
+
+@benchmark('chatbot_router')
+def chatbot_router(write, sizes, repeat):
+    """
+    Adds each size of extra keyword intents to the built-in chatbot intents
+    and measures messages routed per second, with the compiled router
+    against searching every intent's pattern in turn.
+    """
+    messages = ['transfer 100 from checking to savings', 'pay 20 to jithu', "what's my balance?",
+                'show my transaction history', 'hello there', 'what can you do for me today?'] * 50
+    write(f"{'intents':>8} {'sequential (msg/s)':>20} {'router (msg/s)':>16}")
+    for size in sizes:
+        intents = list(chatbot.INTENTS) + [
+            chatbot.Intent(f'extra{i}', re.compile(rf'keyword{i}\b'), None, (f'keyword{i}',), 1000) for i in range(size)
+        ]
+        router = chatbot.IntentRouter(intents)
+
+        def sequential():
+            for message in messages:
+                next((intent for intent in router.intents if intent.pattern.search(message)), None)
+
+        def routed():
+            for message in messages:
+                router.match(message)
+        rates = [len(messages) / min(timed(run)[0] for _ in range(repeat)) for run in (sequential, routed)]
+        write(f"{len(intents):>8} {rates[0]:>20,.0f} {rates[1]:>16,.0f}")
+
+@benchmark('statement_export')
+def statement_export(write, sizes, repeat):
+    """
+    Grows one account's history to each size and exports it as CSV: loaded
+    into a list of model instances and written to a string, against the
+    streamed export. Reports the time and the peak Python memory of each.
+    """
+    accounts = create_benchmark_accounts(2)
+    account = accounts[0]
+
+    def loaded():
+        transactions = list(Transaction.objects.filter(
+            Q(sender_account=account) | Q(receiver_account=account)
+        ).select_related('sender_account', 'receiver_account').order_by('timestamp'))
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(COLUMNS)
+        for t in transactions:
+            writer.writerow([t.transaction_id, t.timestamp.isoformat(), t.transaction_type, '', t.amount, t.status,
+                             t.sender_account.account_number, t.receiver_account.account_number, t.description])
+        return len(output.getvalue())
+
+    def streamed():
+        return sum(len(chunk) for chunk in export_statement([account.pk], 'csv'))
+
+    def peak(func):
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    timestamp = timezone.now()
+    seeded = 0
+    write(f"{'rows':>10} {'loaded (s)':>11} {'loaded peak (MB)':>17} {'streamed (s)':>13} {'streamed peak (MB)':>19}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_history(accounts, size - seeded, timestamp)
+            seeded = size
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {Transaction._meta.db_table}")
+        timings = [min(timed(func)[0] for _ in range(repeat)) for func in (loaded, streamed)]
+        peaks = [peak(func) / 2 ** 20 for func in (loaded, streamed)]
+        write(f"{seeded:>10} {timings[0]:>11.2f} {peaks[0]:>17.1f} {timings[1]:>13.2f} {peaks[1]:>19.1f}")
+
+@benchmark('transaction_serializer')
+def transaction_serializer(write, sizes, repeat):
+    """
+    Serializes each size of transactions with TransactionSerializer: per
+    object with lazily loaded accounts, per object with select_related, and
+    through the values() fast path. Reports queries and time of each.
+    """
+    accounts = create_benchmark_accounts(3)
+    serializer = TransactionSerializer()
+    timestamp = timezone.now()
+    seeded = 0
+    write(f"{'rows':>8} {'lazy (q, ms)':>16} {'select_related (q, ms)':>24} {'values (q, ms)':>16}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_history(accounts, size - seeded, timestamp)
+            seeded = size
+        # A fresh queryset per call, so no run reuses another's cached rows
+        def transactions():
+            return Transaction.objects.filter(sender_account__in=accounts).order_by('timestamp')[:size]
+        paths = (
+            lambda: TransactionSerializer(transactions(), many=True).data,
+            lambda: TransactionSerializer(transactions().select_related('sender_account', 'receiver_account'),
+                                          many=True).data,
+            lambda: serializer.from_values(transactions().values(*serializer.values_fields())),
+        )
+        results = []
+        for path in paths:
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                path()
+            results.append((len(queries), min(timed(path)[0] for _ in range(repeat)) * 1000))
+        write(f"{size:>8} " + " ".join(f"{f'{q}, {ms:.1f}':>{w}}" for (q, ms), w in zip(results, (16, 24, 16))))
+
+@benchmark('transaction_hash')
+def transaction_hash(write, sizes, repeat):
+    """
+    Hashes each size of in-memory transaction rows, shaped like the
+    values_list() rows the audit reads, in every hash format.
+    """
+    write(f"{'rows':>8} {'v1 JSON (hashes/s)':>20} {'v2 binary (hashes/s)':>22}")
+    now = timezone.now()
+    for size in sizes:
+        rows = [(uuid.uuid4(), 1000 + i, 2000 + i, Decimal(i % 100000) / 100, 'Transfer', 'Benchmark transfer',
+                 now + timedelta(microseconds=i), uuid.uuid4().hex * 2, 'Completed') for i in range(min(size, 200000))]
+        rates = []
+        for version in (1, 2):
+            elapsed = min(timed(lambda: [hash_transaction_values(*row, version) for row in rows])[0]
+                          for _ in range(repeat))
+            rates.append(len(rows) / elapsed)
+        write(f"{len(rows):>8} {rates[0]:>20,.0f} {rates[1]:>22,.0f}")
+
+@benchmark('ledger_replay')
+def ledger_replay(write, sizes, repeat):
+    """
+    Grows the chain to each size with every new entry also in a temporary
+    ledger log, then times the offline replay of the log against the
+    single-worker database audit of the same chain.
+    """
+    sender, receiver = create_benchmark_accounts()
+    timestamp = timezone.now()
+    directory = tempfile.mkdtemp()
+    try:
+        seed_ledger_log(directory)
+        log = LedgerLog(directory)
+        seeded = logged = ChainHead.objects.lock().height
+        write(f"{'ledger rows':>12} {'append (us/entry)':>18} {'log (MB)':>9} {'replay (ms)':>12} "
+              f"{'db audit (ms)':>14}")
+        for size in sizes:
+            if size > seeded:
+                timestamp = seed_chain(sender, receiver, size - seeded, timestamp)
+                seeded = size
+            entries = list(Transaction.objects.filter(chain_position__gt=logged).select_related(None)
+                           .order_by('shard', 'chain_position'))
+            # One append per entry, as the transfer service makes them
+            elapsed, _ = timed(lambda: [log.append([entry]) for entry in entries])
+            logged = seeded
+            megabytes = sum(os.path.getsize(path) for _, path in log.segments()) / 2 ** 20
+            replay, report = min((timed(replay_ledger, directory) for _ in range(repeat)), key=lambda run: run[0])
+            assert report['is_valid'], "Benchmark ledger log failed its replay"
+            audit = min(timed(audit_ledger, workers=1)[0] for _ in range(repeat))
+            write(f"{seeded:>12} {elapsed / max(len(entries), 1) * 1e6:>18.1f} {megabytes:>9.1f} "
+                  f"{replay * 1000:>12.2f} {audit * 1000:>14.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+def _reconcile_row_by_row():
+    """The straightforward check reconcile_balances replaces: Decimal sums in a Python loop."""
+    flows = {}
+    for sender, receiver, amount, kind in (
+        Transaction.objects.filter(status='Completed')
+        .values_list('sender_account_id', 'receiver_account_id', 'amount', 'transaction_type')
+        .iterator(chunk_size=50000)
+    ):
+        if receiver is not None:
+            flows[sender] = flows.get(sender, 0) - amount
+            flows[receiver] = flows.get(receiver, 0) + amount
+        elif kind in Transaction.EXTERNAL_CREDIT_TYPES:
+            flows[sender] = flows.get(sender, 0) + amount
+        else:
+            flows[sender] = flows.get(sender, 0) - amount
+    return [pk for pk, balance in Account.objects.values_list('pk', 'balance').iterator(chunk_size=50000)
+            if flows.get(pk, 0) != balance]
+
+@benchmark('balance_reconcile')
+def balance_reconcile(write, sizes, repeat):
+    """
+    Grows the ledger to each size of transfers among 1,000 accounts and
+    times the NumPy reconciliation against a row-by-row Python check.
+    """
+    accounts = create_benchmark_accounts(1000)
+    timestamp = timezone.now()
+    seeded = 0
+    write(f"{'ledger rows':>12} {'row by row (ms)':>16} {'numpy (ms)':>11}")
+    for size in sizes:
+        if size > seeded:
+            timestamp = seed_history(accounts, size - seeded, timestamp)
+            seeded = size
+        naive = min(timed(_reconcile_row_by_row)[0] for _ in range(repeat))
+        vectorized, report = min((timed(reconcile_balances) for _ in range(repeat)), key=lambda run: run[0])
+        assert len(report['mismatches']) == len(_reconcile_row_by_row()), "Reconciliations disagree"
+        write(f"{seeded:>12} {naive * 1000:>16.1f} {vectorized * 1000:>11.1f}")
+
+OPERATION_SAMPLES = 100
+
+@benchmark('hot_paths')
+def hot_paths(write, sizes, repeat):
+    """
+    Grows a seed_bank bank to each size of ledger rows and reports the p50
+    and p99 latency and the queries per call of each hot path. Each runs
+    OPERATION_SAMPLES times (or repeat times, if more) for the same customer,
+    so only the size of the tables changes between rows.
+    """
+    samples = max(repeat, OPERATION_SAMPLES)
+    client = Client()
+
+    def get(name, *args):
+        response = client.get(reverse(name, args=args))
+        assert response.status_code == 200, f"{name} returned {response.status_code}"
+
+    def chat():
+        response = client.post(reverse('chatbot_api'), {'message': "what's my balance?"},
+                               content_type='application/json')
+        assert response.status_code == 200, f"chatbot_api returned {response.status_code}"
+
+    seeded, checking = 0, None
+    write(f"{'ledger rows':>12}  {'operation':<22} {'p50 (ms)':>9} {'p99 (ms)':>9} {'queries':>8}")
+    # One process, so the read models may use a local-memory cache
+    with override_settings(ALLOWED_HOSTS=['testserver'], READ_MODEL_CACHE_LOCAL=True):
+        for size in sizes:
+            if size > seeded:
+                report = seed_bank(max(2, (size - seeded) // 100), size - seeded, prefix='bench')
+                seeded += report['transactions']
+                if checking is None:
+                    checking, other = Account.objects.filter(
+                        account_number__startswith=f"SB{report['tag']}", account_type='Checking'
+                    ).select_related('user').order_by('pk')[:2]
+                    client.force_login(checking.user)
+                    # Back and forth, so the customer's balance never runs out
+                    pairs = itertools.cycle([(checking, other), (other, checking)])
+            verify_ledger_integrity() # Bring the checkpoint up to date
+
+            operations = [
+                ('transfer', lambda: transfer_funds(*next(pairs), Decimal('1.00')), None),
+                # Read model invalidation waits for a commit, which never comes here, so start cold by clearing
+                ('dashboard (cold)', lambda: get('dashboard'), cache.clear),
+                ('dashboard (cached)', lambda: get('dashboard'), None),
+                ('history page', lambda: get('transactions'), None),
+                ('history API page', lambda: get('api_transaction_history'), None),
+                ('chatbot message', chat, None),
+                ('QR code render', lambda: get('qr_code', checking.pk), qrcodes._images.clear),
+                ('ledger verify', verify_ledger_integrity, lambda: transfer_funds(*next(pairs), Decimal('1.00'))),
+            ]
+            for name, operation, setup in operations:
+                measure(operation, 1, setup) # Warm up
+                p50, p99, queries = measure(operation, samples, setup)
+                write(f"{seeded:>12}  {name:<22} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f} {queries:>8.1f}")
@@ -0,0 +1,189 @@
+# core/chatbot.py
+"""
+Intent routing for the dashboard chatbot (chatbot_api_view).
+
+Intents live in a registry. Each has a regular expression and a handler,
+and other modules can add their own with the @intent decorator without
+touching the view. The first intent (by priority, then registration order)
+whose pattern occurs anywhere in the lower-cased message handles it.
+
+An intent can also list keywords: literal words at least one of which
+must appear in any message its pattern matches. IntentRouter compiles the
+keywords of every intent into a single trie-shaped regex. One pass over the
+message finds which keywords occur, and only those intents' patterns are
+tried, in priority order. Intents without keywords are always tried. The
+cost of routing therefore grows with the length of the message, not with
+the number of intents. The router is rebuilt whenever the registry changes.
+
+respond is a coroutine for the async chatbot view. Handlers may be
+coroutines, which the built-in ones are; plain functions run in a thread
+through sync_to_async.
+"""
+import inspect
+import re
+import uuid
+from collections import defaultdict, namedtuple
+
+from asgiref.sync import sync_to_async
+
+from .services.read_models import auser_summary
+from .services.recipients import aresolve_recipient
+
+FALLBACK_RESPONSE = "I'm sorry, I don't understand. Try 'Pay 100 to [Username]' or ask for your balance."
+
+Intent = namedtuple('Intent', 'name pattern handler keywords priority')
+
+
+def _trie_pattern(words):
+    """Returns a regex matching the longest of words that starts at a position, shaped as a trie."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Optional groups are greedy, so a longer keyword is always preferred over its prefix
+        return f"(?:{body})?" if '' in node else body
+    return build(trie)
+
+class IntentRouter:
+    """Matches messages against a fixed list of intents."""
+
+    def __init__(self, intents):
+        self.intents = sorted(intents, key=lambda intent: intent.priority)
+        self._always = [index for index, intent in enumerate(self.intents) if not intent.keywords]
+        by_keyword = defaultdict(set)
+        for index, intent in enumerate(self.intents):
+            for keyword in intent.keywords or ():
+                by_keyword[keyword.lower()].add(index)
+        # Keywords starting at the same position are prefixes of the longest one, which is all the regex reports
+        self._candidates = {
+            keyword: set().union(*(by_keyword.get(keyword[:end], ()) for end in range(1, len(keyword) + 1)))
+            for keyword in by_keyword
+        }
+        # A lookahead matches at every position without consuming, so overlapping keywords are all found
+        self._keywords = re.compile(f"(?=({_trie_pattern(by_keyword)}))") if by_keyword else None
+
+    def match(self, message):
+        """Returns (intent, match) for the first intent found in message, or (None, None)."""
+        candidates = set(self._always)
+        if self._keywords is not None:
+            for found in self._keywords.finditer(message):
+                candidates |= self._candidates[found.group(1)]
+        for index in sorted(candidates):
+            intent = self.intents[index]
+            match = intent.pattern.search(message)
+            if match:
+                return intent, match
+        return None, None
+
+
+INTENTS = []
+_router = None
+
+def register_intent(name, pattern, handler, keywords=None, priority=100):
+    """
+    Adds an intent, replacing any of the same name. handler(request, match),
+    a function or a coroutine function, returns the JSON response data. keywords, if given, must include a word
+    from every message the pattern can match. Lower priorities are tried
+    first.
+    """
+    global _router
+    INTENTS[:] = [intent for intent in INTENTS if intent.name != name]
+    INTENTS.append(Intent(name, re.compile(pattern), handler, tuple(keywords or ()), priority))
+    _router = None
+
+def intent(name, pattern, keywords=None, priority=100):
+    """Registers the decorated function as the handler of an intent."""
+    def decorator(handler):
+        register_intent(name, pattern, handler, keywords, priority)
+        return handler
+    return decorator
+
+def router():
+    """Returns the IntentRouter for the current registry, compiling it on first use."""
+    global _router
+    if _router is None:
+        _router = IntentRouter(INTENTS)
+    return _router
+
+async def respond(request, message):
+    """Returns the JSON response data for one chatbot message. request.user must already be loaded."""
+    message = message.lower()
+    matched, match = router().match(message)
+    if matched is None:
+        return {'response': FALLBACK_RESPONSE}
+    if inspect.iscoroutinefunction(matched.handler):
+        return await matched.handler(request, match)
+    return await sync_to_async(matched.handler)(request, match)
+
+
+@intent('self_transfer', r'(?:transfer|move)\s+₹?(?P<amount>\d+(?:\.\d{1,2})?)\s+from\s+'
+                         r'(?P<from_type>checking|savings|investment)\s+to\s+(?P<to_type>checking|savings|investment)',
+        keywords=('transfer', 'move'), priority=10)
+async def self_transfer(request, match):
+    amount = match['amount']
+    from_acc = match['from_type'].capitalize()
+    to_acc = match['to_type'].capitalize()
+    if from_acc == to_acc:
+        return {'response': "You can't transfer money to the same account."}
+    return {
+        'type': 'confirmation',
+        'message': f"I'm ready to transfer ₹{amount} from your {from_acc} to your {to_acc}. Please confirm.",
+        'details': {'amount': amount, 'from_type': from_acc, 'to_type': to_acc,
+                    'idempotency_key': uuid.uuid4().hex},
+    }
+
+@intent('pay', r'(?:pay|send)\s+₹?(?P<amount>\d+(?:\.\d{1,2})?)\s+to\s+(?P<recipient>[a-zA-Z0-9_@\.]+)',
+        keywords=('pay', 'send'), priority=20)
+async def pay(request, match):
+    amount = match['amount']
+    recipient_name = match['recipient']
+
+    # Account number, username or email, in one lookup
+    recipient_account = await aresolve_recipient(recipient_name)
+    if not recipient_account:
+        return {'response': f"I couldn't find a user or account named '{recipient_name}'."}
+    if recipient_account.user_id == request.user.pk:
+        return {'response': "You can't pay yourself using this command. Use 'transfer from checking to savings' instead."}
+    return {
+        'type': 'confirmation',
+        'message': f"Found user {recipient_account.user.username} ({recipient_account.account_number}). "
+                   f"Ready to send ₹{amount} from your Checking account. Confirm?",
+        'details': {
+            'amount': amount,
+            'from_type': 'Checking',
+            'recipient_account_number': recipient_account.account_number,
+            'idempotency_key': uuid.uuid4().hex,
+        },
+    }
+
+@intent('balance', r'balance', keywords=('balance',), priority=30)
+async def balance(request, match):
+    accounts = (await auser_summary(request.user))['accounts']
+    if not accounts:
+        return {'response': "You don't have any accounts yet."}
+    bot_response = "Here are your account balances:\n"
+    for acc in accounts:
+        bot_response += f"• {acc['account_type']}: ₹{acc['balance']:,.2f}\n"
+    return {'response': bot_response}
+
+@intent('history', r'transaction|history', keywords=('transaction', 'history'), priority=40)
+async def history(request, match):
+    txns = (await auser_summary(request.user))['recent_transactions'][:3]
+    if not txns:
+        return {'response': "You don't have any recent transactions."}
+    bot_response = "Here are your last 3 transactions:\n"
+    for txn in txns:
+        bot_response += f"• ₹{txn.amount:,.2f} ({txn.transaction_type}) on {txn.timestamp.strftime('%d-%b-%Y')}\n"
+    return {'response': bot_response}
+
+@intent('greeting', r'hello|hi', keywords=('hello', 'hi'), priority=50)
+async def greeting(request, match):
+    return {'response': f"Hello, {request.user.username}! You can say 'Pay 500 to Jithu' or 'Transfer 100 to savings'."}
@@ -1,3 +1,4 @@
+import uuid
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import CustomUser, Account
@@ -23,6 +24,9 @@ class TransferForm(forms.Form):
     recipient = forms.CharField(label="Recipient (Account #, Email, or Username)", max_length=100)
     amount = forms.DecimalField(max_digits=10, decimal_places=2)
     note = forms.CharField(widget=forms.Textarea, required=False)
+    # A fresh key per rendered form, so a resubmitted or retried POST is only posted once
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False, max_length=255,
+                                      initial=lambda: uuid.uuid4().hex)
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
@@ -0,0 +1,119 @@
+# core/hashing.py
+"""
+Canonical encodings of a transaction for its ledger hash.
+
+Each row stores the hash_version its hash was computed with, and every
+hash, whether written or verified, goes through hash_transaction_values. So
+a new format changes only new rows, and every row stays verifiable under
+the format it was written in.
+
+Version 1 hashes the sort_keys JSON of a dict of the fields as strings.
+Building and serializing that dict is most of the cost of hashing a row.
+
+Version 2, the current format, is a fixed-order binary layout. It starts
+with the version byte, then each field of HASHED_FIELDS in order:
+- transaction_id: its 16 UUID bytes;
+- sender_account_id, receiver_account_id: a presence byte (0 for NULL),
+  then a big-endian signed 64-bit integer;
+- amount: the same, holding the amount in paise (hundredths);
+- timestamp: the same, holding microseconds since the Unix epoch, UTC;
+- previous_block_hash: a presence byte, then its 32 raw bytes;
+- transaction_type, description, status: a 4-byte big-endian length
+  (0xFFFFFFFF for NULL), then the UTF-8 bytes.
+Every field is either fixed-size or length-prefixed, so no two different
+transactions can encode to the same bytes.
+"""
+import hashlib
+import json
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+# Field order of hash_transaction_values, also used when reading transactions with values_list()
+HASHED_FIELDS = (
+    'transaction_id', 'sender_account_id', 'receiver_account_id', 'amount', 'transaction_type',
+    'description', 'timestamp', 'previous_block_hash', 'status', 'hash_version',
+)
+
+CURRENT_HASH_VERSION = 2
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_INT = struct.Struct('>Bq')
+_LENGTH = struct.Struct('>I')
+_ABSENT = b'\x00'
+_NULL_TEXT = _LENGTH.pack(0xFFFFFFFF)
+
+
+def _encode_v1(transaction_id, sender_account_id, receiver_account_id, amount, transaction_type,
+               description, timestamp, previous_block_hash, status):
+    data = {
+        'transaction_id': str(transaction_id),
+        'sender_account_id': str(sender_account_id),
+        'receiver_account_id': str(receiver_account_id) if receiver_account_id else None,
+        'amount': str(amount), # Convert Decimal to string for consistent hashing
+        'transaction_type': transaction_type,
+        'description': description,
+        'timestamp': timestamp.isoformat(), # Use ISO format for consistent datetime string
+        'previous_block_hash': previous_block_hash,
+        'status': status,
+    }
+    # Sort keys to ensure consistent hash regardless of dictionary order
+    return json.dumps(data, sort_keys=True).encode('utf-8')
+
+def _int(value):
+    return _ABSENT if value is None else _INT.pack(1, value)
+
+def _text(value):
+    if value is None:
+        return _NULL_TEXT
+    data = value.encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+def _paise(amount):
+    paise = Decimal(amount).scaleb(2)
+    if paise != paise.to_integral_value():
+        raise ValueError(f"Amount {amount} has more than two decimal places.")
+    return int(paise)
+
+def _encode_v2(transaction_id, sender_account_id, receiver_account_id, amount, transaction_type,
+               description, timestamp, previous_block_hash, status):
+    if not isinstance(transaction_id, uuid.UUID):
+        transaction_id = uuid.UUID(str(transaction_id))
+    return b''.join((
+        b'\x02',
+        transaction_id.bytes,
+        _int(sender_account_id),
+        _int(receiver_account_id),
+        _int(_paise(amount)),
+        _text(transaction_type),
+        _text(description),
+        _int((timestamp - _EPOCH) // _MICROSECOND),
+        _ABSENT if previous_block_hash is None else b'\x01' + bytes.fromhex(previous_block_hash),
+        _text(status),
+    ))
+
+# hash_version -> encoder of the HASHED_FIELDS values before it
+HASH_FORMATS = {
+    1: _encode_v1,
+    2: _encode_v2,
+}
+
+def encode_transaction(transaction_id, sender_account_id, receiver_account_id, amount, transaction_type,
+                       description, timestamp, previous_block_hash, status, hash_version=CURRENT_HASH_VERSION):
+    """Returns the bytes hashed for a transaction under hash_version. Raises ValueError for an unknown version."""
+    try:
+        encode = HASH_FORMATS[hash_version]
+    except KeyError:
+        raise ValueError(f"Unknown hash version {hash_version}.")
+    return encode(transaction_id, sender_account_id, receiver_account_id, amount, transaction_type,
+                  description, timestamp, previous_block_hash, status)
+
+def hash_transaction_values(*values):
+    """
+    Calculates the SHA-256 hash of a transaction from its raw HASHED_FIELDS
+    values. Works on values_list() rows as well as model instances, so bulk
+    audits never build models.
+    """
+    return hashlib.sha256(encode_transaction(*values)).hexdigest()
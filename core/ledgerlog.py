@@ -0,0 +1,415 @@
+# core/ledgerlog.py
+"""
+Append-only ledger log: a local binary copy of every Completed transaction
+from the transfer service. `manage.py replay_ledger` reads it through mmap
+and recomputes every account balance and every shard's hash chain without
+touching the database, so heavy audits can run off the OLTP path, e.g. on a
+copy of the directory on another host.
+
+With settings.LEDGER_LOG_DIR set at startup, CoreConfig.ready connects
+receivers for the transfer_completed and batch_completed signals. They
+append each operation's ledger entries once the database transaction has
+committed, so a rolled-back transfer never reaches the log. Appends from
+every worker process on the host are serialized by a lock on the
+directory's lock file: flock on POSIX, msvcrt.locking on Windows.
+
+The log is a sequence of fixed-size RECORD_SIZE records, numbered from 0.
+Each ends with a CRC-32 of the rest, so a torn or corrupted record is
+detected. The sequence rolls over into a new segment file every
+LEDGER_LOG_SEGMENT_RECORDS records. Each segment is named after the
+sequence number of its first record, so the file names are the index:
+record n lives at offset (n - first) * RECORD_SIZE of the last segment
+whose first record is at most n.
+
+Record kinds:
+- T: a Completed transaction, with every field its hash covers plus its
+  shard, chain position and stored hash. The transaction type, status and
+  description are stored as UTF-8 after the fixed fields. Text that does not
+  fit spills into the + records that follow.
+- B, H, S: a seed, written by `manage.py replay_ledger --seed`. B starts it.
+  H records hold each shard's chain head and S records each account's
+  balance, all read in one database snapshot. Replay restarts from the
+  latest seed. Seeding lets a log begin on a database that already has
+  history, or start over after a gap. Segments before the latest seed may
+  be deleted.
+
+Commits of different shards, and of one shard across processes, can reach
+the log slightly out of chain order. Replay therefore holds back each
+shard's early records until the gap before them is filled. A transaction
+that committed but never reached the log, say because the process died
+between the two, shows up as a missing chain position.
+"""
+import logging
+import mmap
+import os
+import struct
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .hashing import hash_transaction_values
+from .models import Account, ChainHead, Transaction
+from .services.transfers import batch_completed, transfer_completed
+from .utils import GENESIS_HASH
+
+logger = logging.getLogger(__name__)
+
+RECORD_SIZE = 256
+SEGMENT_SUFFIX = '.seg'
+
+_CRC = struct.Struct('>I')
+_BODY_SIZE = RECORD_SIZE - _CRC.size
+# kind, sequence, flags, hash_version, shard, transaction_id, sender, receiver, amount (paise),
+# timestamp (microseconds since the epoch), chain_position, previous hash, hash,
+# then the byte lengths of transaction_type, status and description
+_TRANSACTION = struct.Struct('>cQBBH16sqqqqq32s32sBBH')
+_CONTINUATION = struct.Struct('>cQ')
+_SEED = struct.Struct('>cQQQ')  # kind, sequence, shard count, account count
+_HEAD = struct.Struct('>cQHQ32s')  # kind, sequence, shard, height, last hash
+_BALANCE = struct.Struct('>cQqq')  # kind, sequence, account id, balance (paise)
+_FIRST_TEXT = _BODY_SIZE - _TRANSACTION.size
+_MORE_TEXT = _BODY_SIZE - _CONTINUATION.size
+
+_HAS_RECEIVER = 1
+_HAS_DESCRIPTION = 2
+_HAS_PREVIOUS = 4
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class CorruptLog(ValueError):
+    """A record failed its checksum, or records are missing or out of place."""
+
+def _paise(amount):
+    return int(Decimal(amount).scaleb(2))
+
+def _amount(paise):
+    return Decimal(paise).scaleb(-2)
+
+def _seal(body):
+    body = body.ljust(_BODY_SIZE, b'\x00')
+    return body + _CRC.pack(zlib.crc32(body))
+
+def _encode_transaction(sequence, txn):
+    """Returns the records for one Completed transaction, the first one numbered sequence."""
+    kind = txn.transaction_type.encode('utf-8')
+    status = txn.status.encode('utf-8')
+    description = (txn.description or '').encode('utf-8')
+    flags = ((_HAS_RECEIVER if txn.receiver_account_id is not None else 0)
+             | (_HAS_DESCRIPTION if txn.description is not None else 0)
+             | (_HAS_PREVIOUS if txn.previous_block_hash is not None else 0))
+    header = _TRANSACTION.pack(
+        b'T', sequence, flags, txn.hash_version, txn.shard, txn.transaction_id.bytes,
+        txn.sender_account_id, txn.receiver_account_id or 0, _paise(txn.amount),
+        (txn.timestamp - _EPOCH) // _MICROSECOND, txn.chain_position,
+        bytes.fromhex(txn.previous_block_hash or GENESIS_HASH), bytes.fromhex(txn.hash),
+        len(kind), len(status), len(description),
+    )
+    text = kind + status + description
+    records = [_seal(header + text[:_FIRST_TEXT])]
+    for start in range(_FIRST_TEXT, len(text), _MORE_TEXT):
+        records.append(_seal(_CONTINUATION.pack(b'+', sequence + len(records)) + text[start:start + _MORE_TEXT]))
+    return records
+
+
+@contextmanager
+def _exclusive(path):
+    """Holds an exclusive lock on the file at path, shared with every process on the host."""
+    with open(path, 'a+b') as lock:
+        try:
+            import fcntl
+        except ImportError:
+            # Windows: lock the first byte. LK_LOCK retries for about 10 seconds, then raises OSError
+            import msvcrt
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+
+class LedgerLog:
+    """A ledger log directory. Appending is safe from any number of processes on the host."""
+
+    def __init__(self, directory, segment_records=None, fsync=None):
+        self.directory = directory
+        self.segment_records = segment_records or getattr(settings, 'LEDGER_LOG_SEGMENT_RECORDS', 65536)
+        self.fsync = getattr(settings, 'LEDGER_LOG_FSYNC', False) if fsync is None else fsync
+
+    def segments(self):
+        """Returns [(first sequence, path)] of the segment files, in order."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(self.directory, name))
+                      for name in names if name.endswith(SEGMENT_SUFFIX))
+
+    def _open_tail(self):
+        """Returns (fd, next sequence, free records) for the segment appends go to. Holds the lock."""
+        segments = self.segments()
+        first, path = segments[-1] if segments else (0, None)
+        if path is not None:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+            size = os.fstat(fd).st_size
+            if size % RECORD_SIZE:
+                # A writer died mid-record; that record never completed, so drop it
+                size -= size % RECORD_SIZE
+                os.ftruncate(fd, size)
+            count = size // RECORD_SIZE
+            if count < self.segment_records:
+                return fd, first + count, self.segment_records - count
+            os.close(fd)
+            first += count
+        fd = os.open(os.path.join(self.directory, f"{first:020d}{SEGMENT_SUFFIX}"),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return fd, first, self.segment_records
+
+    def _append(self, encode):
+        """
+        Appends the records encode(first sequence) returns, rolling over to
+        new segments as they fill up. Returns the number of records written.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with _exclusive(os.path.join(self.directory, 'lock')):
+            fd, sequence, free = self._open_tail()
+            try:
+                records = encode(sequence)
+                written = 0
+                while True:
+                    os.write(fd, b''.join(records[written:written + free]))
+                    written += min(free, len(records) - written)
+                    if self.fsync:
+                        os.fsync(fd)
+                    if written == len(records):
+                        return written
+                    os.close(fd)
+                    fd, _, free = self._open_tail()
+            finally:
+                os.close(fd)
+
+    def append(self, transactions):
+        """Appends Completed transactions, as linked and saved by the transfer service."""
+        def encode(sequence):
+            records = []
+            for txn in transactions:
+                records.extend(_encode_transaction(sequence + len(records), txn))
+            return records
+        return self._append(encode)
+
+    def append_seed(self, heads, balances):
+        """
+        Appends a seed: heads is {shard: (height, last hash)} and balances
+        {account id: balance}, as of one database snapshot.
+        """
+        def encode(sequence):
+            records = [_seal(_SEED.pack(b'B', sequence, len(heads), len(balances)))]
+            for shard, (height, last_hash) in sorted(heads.items()):
+                records.append(_seal(_HEAD.pack(b'H', sequence + len(records), shard, height,
+                                                bytes.fromhex(last_hash))))
+            for account_id, balance in sorted(balances.items()):
+                records.append(_seal(_BALANCE.pack(b'S', sequence + len(records), account_id, _paise(balance))))
+            return records
+        return self._append(encode)
+
+    def records(self):
+        """
+        Yields (sequence, record body) for every record, reading each
+        segment through mmap. A partly written last record is left out.
+        Raises CorruptLog on a checksum failure or a missing segment.
+        """
+        expected = None
+        for first, path in self.segments():
+            if expected is not None and first != expected:
+                raise CorruptLog(f"Records {expected} to {first - 1} are missing before {os.path.basename(path)}.")
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size // RECORD_SIZE * RECORD_SIZE
+                expected = first + size // RECORD_SIZE
+                if not size:
+                    continue
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                    for offset in range(0, size, RECORD_SIZE):
+                        body = data[offset:offset + _BODY_SIZE]
+                        sequence = first + offset // RECORD_SIZE
+                        if _CRC.unpack_from(data, offset + _BODY_SIZE)[0] != zlib.crc32(body):
+                            raise CorruptLog(f"Record {sequence} fails its checksum.")
+                        if _CONTINUATION.unpack_from(body)[1] != sequence:
+                            raise CorruptLog(f"Record {sequence} is numbered {_CONTINUATION.unpack_from(body)[1]}.")
+                        yield sequence, body
+
+
+def _transactions(records):
+    """Yields (sequence, kind, fields) for each logged entry, joining transaction text from its + records."""
+    records = iter(records)
+    for sequence, body in records:
+        kind = body[:1]
+        if kind == b'T':
+            fields = _TRANSACTION.unpack_from(body)
+            text = body[_TRANSACTION.size:]
+            length = sum(fields[-3:])
+            while len(text) < length:
+                following, more = next(records, (None, None))
+                if following is None or more[:1] != b'+':
+                    raise CorruptLog(f"Transaction record {sequence} is missing its text.")
+                text += more[_CONTINUATION.size:]
+            yield sequence, kind, (fields, text[:length])
+        elif kind == b'+':
+            # Text of a transaction whose first record was in a deleted segment
+            continue
+        elif kind == b'B':
+            yield sequence, kind, _SEED.unpack_from(body)
+        elif kind == b'H':
+            yield sequence, kind, _HEAD.unpack_from(body)
+        elif kind == b'S':
+            yield sequence, kind, _BALANCE.unpack_from(body)
+        else:
+            raise CorruptLog(f"Record {sequence} has unknown kind {kind!r}.")
+
+def _decode(fields, text):
+    """Returns (shard, chain_position, stored hash, HASHED_FIELDS values) of a transaction record."""
+    (_, _, flags, hash_version, shard, transaction_id, sender, receiver, paise, micros, chain_position,
+     previous_hash, stored_hash, kind_length, status_length, _) = fields
+    kind = text[:kind_length].decode('utf-8')
+    status = text[kind_length:kind_length + status_length].decode('utf-8')
+    description = text[kind_length + status_length:].decode('utf-8') if flags & _HAS_DESCRIPTION else None
+    values = (
+        uuid.UUID(bytes=transaction_id), sender, receiver if flags & _HAS_RECEIVER else None, _amount(paise),
+        kind, description, _EPOCH + micros * _MICROSECOND,
+        previous_hash.hex() if flags & _HAS_PREVIOUS else None, status, hash_version,
+    )
+    return shard, chain_position, stored_hash.hex(), values
+
+def _apply(balances, values):
+    """Applies a Completed transaction's balance changes, in paise, as the transfer service made them."""
+    _, sender, receiver, amount, kind = values[:5]
+    paise = _paise(amount)
+    if receiver is not None:
+        balances[sender] = balances.get(sender, 0) - paise
+        balances[receiver] = balances.get(receiver, 0) + paise
+    elif kind in Transaction.EXTERNAL_CREDIT_TYPES:
+        balances[sender] = balances.get(sender, 0) + paise
+    else:
+        balances[sender] = balances.get(sender, 0) - paise
+
+def replay_ledger(directory):
+    """
+    Replays the log in directory from its latest seed, or from an empty
+    ledger if it has none. Returns a report dict with records, transactions,
+    balances ({account id: Decimal}), shards ({shard: {'height',
+    'last_hash'}}), is_valid and failure (None, or a dict with the sequence
+    of the failing record, if known, and reason). Replay stops at the first
+    failure.
+    """
+    report = {'records': 0, 'transactions': 0, 'seeded_at': None, 'balances': {}, 'shards': {},
+              'is_valid': True, 'failure': None}
+    balances, heads, pending = {}, {}, {}
+
+    def fail(sequence, reason):
+        report['is_valid'] = False
+        report['failure'] = {'sequence': sequence, 'reason': reason}
+
+    def advance(shard):
+        height, last_hash = heads.get(shard, (0, GENESIS_HASH))
+        waiting = pending.get(shard, {})
+        while height + 1 in waiting:
+            sequence, stored_hash, values = waiting.pop(height + 1)
+            if values[7] != last_hash:
+                return fail(sequence, f"Shard {shard} position {height + 1}: expected previous hash "
+                                      f"{last_hash}, got {values[7]}")
+            recalculated = hash_transaction_values(*values)
+            if recalculated != stored_hash:
+                return fail(sequence, f"Shard {shard} position {height + 1}: hash mismatch: "
+                                      f"stored {stored_hash}, recalculated {recalculated}")
+            _apply(balances, values)
+            height, last_hash = height + 1, stored_hash
+            report['transactions'] += 1
+        heads[shard] = (height, last_hash)
+
+    def counted(records):
+        for record in records:
+            report['records'] += 1
+            yield record
+
+    try:
+        for sequence, kind, fields in _transactions(counted(LedgerLog(directory).records())):
+            if kind == b'T':
+                shard, position, stored_hash, values = _decode(*fields)
+                if position > heads.get(shard, (0, None))[0]:
+                    pending.setdefault(shard, {})[position] = (sequence, stored_hash, values)
+                    advance(shard)
+            elif kind == b'B':
+                # Everything before a seed is superseded by it
+                balances.clear()
+                heads.clear()
+                report['transactions'] = 0
+                report['seeded_at'] = sequence
+            elif kind == b'H':
+                _, _, shard, height, last_hash = fields
+                heads[shard] = (height, last_hash.hex())
+                waiting = pending.get(shard, {})
+                for position in [position for position in waiting if position <= height]:
+                    del waiting[position]
+                advance(shard)
+            else:
+                _, _, account_id, paise = fields
+                balances[account_id] = paise
+            if not report['is_valid']:
+                break
+    except CorruptLog as error:
+        fail(None, str(error))
+
+    if report['is_valid']:
+        for shard, waiting in sorted(pending.items()):
+            if waiting:
+                fail(min(entry[0] for entry in waiting.values()),
+                     f"Shard {shard} is missing chain position {heads.get(shard, (0,))[0] + 1}")
+                break
+    report['balances'] = {account_id: _amount(paise) for account_id, paise in balances.items()}
+    report['shards'] = {shard: {'height': height, 'last_hash': last_hash}
+                        for shard, (height, last_hash) in sorted(heads.items())}
+    return report
+
+def seed_ledger_log(directory):
+    """
+    Appends a seed of every chain head and account balance to the log in
+    directory. The chain heads stay locked until the seed is written, so
+    every transaction after it in chain order also comes after it in the
+    log. Returns the number of records written.
+    """
+    with transaction.atomic():
+        heads = {head.shard: (head.height, head.last_hash)
+                 for head in ChainHead.objects.select_for_update().order_by('shard')}
+        balances = dict(Account.objects.values_list('pk', 'balance').iterator(chunk_size=5000))
+        return LedgerLog(directory).append_seed(heads, balances)
+
+def _log_entries(ledger_entries):
+    directory = getattr(settings, 'LEDGER_LOG_DIR', None)
+    if not directory:
+        return
+    try:
+        LedgerLog(directory).append(ledger_entries)
+    except OSError:
+        # The money has moved and committed; a missed append shows up as a gap on replay
+        logger.exception("Could not append %d ledger entries to %s", len(ledger_entries), directory)
+
+def _transfer_completed(sender, ledger_entry, **kwargs):
+    _log_entries([ledger_entry])
+
+def _batch_completed(sender, ledger_entries, **kwargs):
+    _log_entries(ledger_entries)
+
+def connect_receivers():
+    """Appends every completed transfer and batch to settings.LEDGER_LOG_DIR from now on."""
+    transfer_completed.connect(_transfer_completed, dispatch_uid='core.ledgerlog')
+    batch_completed.connect(_batch_completed, dispatch_uid='core.ledgerlog')
@@ -0,0 +1,119 @@
+# core/loadtest.py
+"""
+Concurrent chat session load test, run by the ``chat_load_test`` management
+command against a server that is already running.
+
+Each simulated session is a logged-in user posting chatbot messages one
+after another over fresh connections. A sync worker is held for every
+database round trip of a request, while an async worker serves other
+sessions in the meantime. Running the same levels against gunicorn
+(quantum.wsgi) and uvicorn (quantum.asgi) shows how many concurrent sessions
+one worker of each can hold. The difference comes from database latency, so
+measure against a database across a network, as in production, rather than
+a local socket.
+
+Unlike the ``benchmark`` scenarios this needs committed rows, since the
+server reads them from its own connections. The users it creates are deleted
+again at the end.
+"""
+import asyncio
+import json
+import time
+import uuid
+from decimal import Decimal
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.utils.crypto import get_random_string
+
+from .models import Account, CustomUser
+from .utils import percentile
+
+MESSAGES = ["what's my balance?", 'show my transaction history', 'hello', 'pay 1 to {peer}']
+
+
+def create_sessions(count):
+    """
+    Creates count users with a funded Checking account, each logged in
+    through a session in the project's session store. Returns (user ids,
+    [(session cookie, csrf token, peer username)]); every user's peer is the
+    next user, whom they pay in their chat.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    engine = import_module(settings.SESSION_ENGINE)
+    users = []
+    for i in range(count):
+        user = CustomUser(username=f"load_{suffix}_{i}")
+        user.set_unusable_password()
+        user.save()
+        Account.objects.create(user=user, account_type='Checking', account_number=f"L{suffix}{i}"[:20],
+                               balance=Decimal('1000.00'))
+        users.append(user)
+    sessions = []
+    for i, user in enumerate(users):
+        session = engine.SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        sessions.append((session.session_key, get_random_string(32), users[(i + 1) % count].username))
+    return [user.pk for user in users], sessions
+
+def delete_sessions(user_ids):
+    """Deletes the users create_sessions made, with their accounts and ledger entries."""
+    CustomUser.objects.filter(pk__in=user_ids).delete()
+
+async def _post(host, port, path, headers, body):
+    """Sends one POST and reads the whole response. Returns the status code."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = [f"POST {path} HTTP/1.1", f"Host: {host}:{port}", 'Content-Type: application/json',
+                f"Content-Length: {len(body)}", 'Connection: close'] + headers
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1]) if response.startswith(b'HTTP/') else 0
+
+async def _session(url, session, messages, think_time, latencies, errors):
+    session_key, csrf_token, peer = session
+    parts = urlsplit(url)
+    headers = [f"Cookie: {settings.SESSION_COOKIE_NAME}={session_key}; {settings.CSRF_COOKIE_NAME}={csrf_token}",
+               f"X-CSRFToken: {csrf_token}"]
+    for i in range(messages):
+        body = json.dumps({'message': MESSAGES[i % len(MESSAGES)].format(peer=peer)}).encode('utf-8')
+        started = time.perf_counter()
+        try:
+            status = await _post(parts.hostname, parts.port or 80, parts.path, headers, body)
+        except OSError:
+            status = 0
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+        if think_time:
+            await asyncio.sleep(think_time)
+
+async def run_level(url, sessions, messages, think_time=0.0):
+    """
+    Runs every session concurrently, each sending messages chat messages to
+    url. Returns a dict with sessions, messages, errors, seconds, rate
+    (successful messages per second), p50 and p99 (latency in seconds).
+    """
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(_session(url, session, messages, think_time, latencies, errors)
+                           for session in sessions))
+    seconds = time.perf_counter() - started
+    return {
+        'sessions': len(sessions),
+        'messages': len(latencies),
+        'errors': len(errors),
+        'seconds': seconds,
+        'rate': len(latencies) / seconds,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+    }
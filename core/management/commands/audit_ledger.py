@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+from core.audit import audit_ledger
+
+
+class Command(BaseCommand):
+    """
+    Re-hash the whole Completed chain from genesis across all CPU cores.
+    Intended for the nightly audit; request-time checks use verify_ledger_integrity.
+    """
+    help = 'Runs a parallel full-chain audit of the transaction ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes to use (default: number of CPUs).')
+        parser.add_argument('--segment-size', type=int, default=50000,
+                            help='Transactions per segment handed to a worker.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        report = audit_ledger(workers=options['workers'], segment_size=options['segment_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Audited {report['total_blocks']} transactions in {report['segments']} segments "
+            f"in {elapsed:.2f}s."
+        )
+        for shard, summary in report['shards'].items():
+            self.stdout.write(f"  Shard {shard}: {summary['total_blocks']} blocks, head {summary['last_block_hash']}")
+        if not report['is_valid']:
+            failure = report['failure']
+            raise CommandError(
+                f"Ledger integrity broken in shard {failure['shard']}, segment {failure['segment']} "
+                f"at offset {failure['offset']} "
+                f"(transaction {failure['transaction_id']}): {failure['reason']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Ledger integrity verified."))
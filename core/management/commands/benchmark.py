@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    """
+    Run one or more performance scenarios from core.benchmarks.
+    All data created by a scenario is rolled back when it finishes.
+    """
+    help = 'Runs performance benchmarks against a throwaway, rolled-back dataset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help=f"Scenarios to run (default: all). Available: {', '.join(sorted(BENCHMARKS))}")
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma-separated dataset sizes to grow through.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed calls per size; the best run is reported.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or sorted(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(unknown)}")
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+
+        for name in names:
+            self.stdout.write(self.style.SUCCESS(f"== {name} =="))
+            with transaction.atomic():
+                BENCHMARKS[name](self.stdout.write, sizes, options['repeat'])
+                transaction.set_rollback(True)
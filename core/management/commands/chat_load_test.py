@@ -0,0 +1,42 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import create_sessions, delete_sessions, run_level
+
+
+class Command(BaseCommand):
+    """
+    Measure how many concurrent chatbot sessions a running server holds,
+    e.g. one gunicorn sync worker against one uvicorn worker. The server
+    must use the same database as this command.
+    """
+    help = 'Load-tests the chatbot API of a running server with increasing numbers of concurrent chat sessions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/chatbot/',
+                            help='Chatbot API URL of the server under test.')
+        parser.add_argument('--sessions', default='1,10,50,100',
+                            help='Comma-separated numbers of concurrent sessions to step through.')
+        parser.add_argument('--messages', type=int, default=10, help='Messages each session sends per level.')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Seconds each session waits between messages.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['sessions'].split(',') if level]
+        except ValueError:
+            raise CommandError("--sessions must be a comma-separated list of integers.")
+        if not options['url'].startswith('http://'):
+            raise CommandError("--url must be a plain http:// URL.")
+
+        user_ids, sessions = create_sessions(max(levels))
+        try:
+            self.stdout.write(f"{'sessions':>8} {'msg/s':>9} {'p50 (ms)':>10} {'p99 (ms)':>10} {'errors':>7}")
+            for level in levels:
+                result = asyncio.run(run_level(options['url'], sessions[:level], options['messages'],
+                                               options['think_time']))
+                self.stdout.write(f"{level:>8} {result['rate']:>9.1f} {result['p50'] * 1000:>10.1f} "
+                                  f"{result['p99'] * 1000:>10.1f} {result['errors']:>7}")
+        finally:
+            delete_sessions(user_ids)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.models import LedgerCommitment
+
+
+class Command(BaseCommand):
+    """
+    Bind the heads of all ledger shards into one global Merkle root.
+    Run periodically (e.g. from cron) when LEDGER_SHARDS > 1.
+    """
+    help = 'Records a Merkle root over the current head of every ledger shard.'
+
+    def handle(self, *args, **options):
+        commitment = LedgerCommitment.objects.commit()
+        for shard, head in sorted(commitment.shard_heads.items(), key=lambda item: int(item[0])):
+            self.stdout.write(f"  Shard {shard}: height {head['height']}, head {head['hash']}")
+        self.stdout.write(self.style.SUCCESS(f"Committed ledger root {commitment.merkle_root}"))
@@ -0,0 +1,56 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Account
+from core.services.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_statement
+
+
+class Command(BaseCommand):
+    """
+    Export a user's or an account's transactions, oldest first. The export
+    is streamed to the output chunk by chunk, so memory stays flat however
+    many years of history it covers.
+    """
+    help = 'Exports the transactions of a user or an account as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        owner = parser.add_mutually_exclusive_group(required=True)
+        owner.add_argument('--user', help='Export every account of this username.')
+        owner.add_argument('--account', help='Export only this account number.')
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='csv',
+                            help='Output format (default: csv).')
+        parser.add_argument('--start-date', help='First day to include, YYYY-MM-DD.')
+        parser.add_argument('--end-date', help='Last day to include, YYYY-MM-DD.')
+        parser.add_argument('--output', default='-', help='File to write (default: standard output).')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help=f'Rows fetched and written at a time (default: {EXPORT_CHUNK_SIZE}).')
+
+    def _day(self, value, at):
+        try:
+            return timezone.make_aware(datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), at))
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}'; use YYYY-MM-DD.")
+
+    def handle(self, *args, **options):
+        start = self._day(options['start_date'], time.min) if options['start_date'] else None
+        end = self._day(options['end_date'], time.max) if options['end_date'] else None
+        if options['account']:
+            accounts = Account.objects.filter(account_number=options['account'])
+        else:
+            accounts = Account.objects.filter(user__username=options['user'])
+        account_ids = list(accounts.values_list('pk', flat=True))
+        if not account_ids:
+            raise CommandError("No matching account found.")
+
+        chunks = export_statement(account_ids, options['export_format'], start, end, options['chunk_size'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        # newline='' keeps the CSV writer's own line endings
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported to {options['output']}."))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Account
+from core.qrcodes import DirectoryStore, ZipStore, generate_qr_codes
+
+
+class Command(BaseCommand):
+    """
+    Render Pay Me QR codes for many accounts at once, e.g. for branch signage
+    or merchant onboarding. Each account gets an SVG and one PNG per size.
+    Re-running with the same output skips accounts that are already done.
+    """
+    help = 'Generates Pay Me QR codes (SVG and PNG) for a set of accounts into a directory or zip file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory to write into, or a path ending in .zip.')
+        parser.add_argument('--base-url', required=True,
+                            help='Scheme and host the codes point at, e.g. https://bank.example.com.')
+        parser.add_argument('--account', action='append', dest='accounts',
+                            help='Only this account number (repeatable).')
+        parser.add_argument('--account-type', help='Only accounts of this type, e.g. Checking.')
+        parser.add_argument('--user', help='Only accounts of this username.')
+        parser.add_argument('--png-sizes', default='4,10,20',
+                            help='Comma-separated PNG module sizes in pixels (default: 4,10,20).')
+        parser.add_argument('--no-svg', action='store_true', help='Do not write SVG files.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes to use (default: number of CPUs).')
+
+    def handle(self, *args, **options):
+        try:
+            png_sizes = [int(size) for size in options['png_sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError("--png-sizes must be a comma-separated list of integers.")
+        if not options['base_url'].startswith(('http://', 'https://')):
+            raise CommandError("--base-url must start with http:// or https://.")
+
+        accounts = Account.objects.order_by('pk')
+        if options['accounts']:
+            accounts = accounts.filter(account_number__in=options['accounts'])
+        if options['account_type']:
+            accounts = accounts.filter(account_type__iexact=options['account_type'])
+        if options['user']:
+            accounts = accounts.filter(user__username=options['user'])
+
+        output = options['output']
+        store = ZipStore(output) if output.lower().endswith('.zip') else DirectoryStore(output)
+        report = generate_qr_codes(
+            accounts.values_list('account_number', flat=True).iterator(),
+            options['base_url'],
+            store,
+            png_sizes=png_sizes,
+            svg=not options['no_svg'],
+            workers=options['workers'],
+        )
+        rate = report['generated'] / report['seconds'] if report['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated QR codes for {report['generated']} accounts ({report['files']} files) in "
+            f"{report['seconds']:.2f}s, {rate:,.1f} accounts/s; skipped {report['skipped']} already done."
+        ))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Account
+from core.services.transfers import transfer_batch, read_transfer_lines, TransferError, BatchValidationError
+
+
+class Command(BaseCommand):
+    """
+    Post a payroll or mass-payout file from one account in a single batch.
+    The file is a CSV with a header row (recipient_account_number,amount,description)
+    or a JSON list of objects with the same keys.
+    """
+    help = 'Posts a CSV or JSON file of transfers from one account as a single atomic batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file of transfers.')
+        parser.add_argument('--from-account', required=True, help='Account number to debit.')
+        parser.add_argument('--type', dest='transaction_type', default='Transfer', choices=['Transfer', 'Salary'],
+                            help='Transaction type recorded for every line.')
+        parser.add_argument('--format', choices=['csv', 'json'], default=None,
+                            help='File format (default: from the file extension).')
+
+    def handle(self, *args, **options):
+        sender = Account.objects.filter(account_number=options['from_account']).first()
+        if sender is None:
+            raise CommandError(f"Account {options['from_account']} not found.")
+        fmt = options['format'] or ('json' if options['path'].lower().endswith('.json') else 'csv')
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                lines = read_transfer_lines(stream, fmt)
+            ledger_entries = transfer_batch(sender, lines, transaction_type=options['transaction_type'])
+        except BatchValidationError as e:
+            for line, message in e.errors:
+                self.stderr.write(f"  line {line}: {message}")
+            raise CommandError(str(e))
+        except TransferError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        total = sum(entry.amount for entry in ledger_entries)
+        self.stdout.write(self.style.SUCCESS(
+            f"Posted {len(ledger_entries)} transfers totalling {total:,.2f} in {elapsed:.2f}s "
+            f"({len(ledger_entries) / elapsed:,.0f} transfers/s)."
+        ))
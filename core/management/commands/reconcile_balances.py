@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Account
+from core.reconciliation import RECONCILE_CHUNK_SIZE, reconcile_balances
+
+
+class Command(BaseCommand):
+    """
+    Check every account balance against the net sum of its Completed
+    transactions. Exits with an error listing the mismatched accounts, so it
+    can run as a scheduled job.
+    """
+    help = 'Reconciles every account balance with the net flow of its Completed transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE,
+                            help=f'Rows fetched at a time (default: {RECONCILE_CHUNK_SIZE}).')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Mismatched accounts to list, largest difference first (default: 20).')
+
+    def handle(self, *args, **options):
+        report = reconcile_balances(chunk_size=options['chunk_size'])
+        self.stdout.write(
+            f"Reconciled {report['accounts']} accounts against {report['transactions']} transactions "
+            f"in {report['seconds']:.2f}s."
+        )
+        mismatches = report['mismatches']
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Every account balance matches its transactions."))
+            return
+
+        shown = mismatches[:options['limit']]
+        numbers = dict(Account.objects.filter(pk__in=[pk for pk, _, _ in shown]).values_list('pk', 'account_number'))
+        self.stdout.write(f"{'account':>20} {'stored':>16} {'ledger':>16} {'difference':>16}")
+        for pk, stored, ledger in shown:
+            self.stdout.write(f"{numbers.get(pk, pk):>20} {Decimal(stored).scaleb(-2):>16} "
+                              f"{Decimal(ledger).scaleb(-2):>16} {Decimal(stored - ledger).scaleb(-2):>16}")
+        raise CommandError(f"{len(mismatches)} account balances do not match their transactions.")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ChainHead, LedgerBlock
+
+
+class Command(BaseCommand):
+    """
+    Seal newly completed transactions into Merkle blocks so they can be proven.
+    Run periodically (e.g. from cron); each run picks up where the last block ended.
+    """
+    help = 'Groups unsealed ledger transactions into Merkle-rooted blocks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--block-size', type=int, default=None,
+                            help='Maximum transactions per block (default: settings.LEDGER_BLOCK_SIZE).')
+
+    def handle(self, *args, **options):
+        for shard in ChainHead.objects.order_by('shard').values_list('shard', flat=True):
+            try:
+                blocks = LedgerBlock.objects.seal(shard, block_size=options['block_size'])
+            except ValueError as error:
+                raise CommandError(str(error))
+            for block in blocks:
+                self.stdout.write(
+                    f"  Shard {shard} block {block.height}: positions {block.first_position}-{block.last_position}, "
+                    f"root {block.merkle_root}"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Shard {shard}: sealed {len(blocks)} block(s)."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import SEED_BATCH_SIZE, seed_bank
+
+
+class Command(BaseCommand):
+    """
+    Fill a development or load-test database with synthetic users, accounts
+    and a hash-chained transaction history. The rows are committed; run it
+    against a throwaway database.
+    """
+    help = 'Creates synthetic users, accounts and a hash-chained transaction history with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to create (default: 1000).')
+        parser.add_argument('--transactions', type=int, default=100000,
+                            help='Transactions after the opening deposits (default: 100000).')
+        parser.add_argument('--days', type=int, default=90,
+                            help='Days of history to spread the transactions over (default: 90).')
+        parser.add_argument('--savings-ratio', type=float, default=0.5,
+                            help='Share of users who also get a Savings account (default: 0.5).')
+        parser.add_argument('--password', default=None,
+                            help='Password every seeded user can log in with (default: none, logins disabled).')
+        parser.add_argument('--prefix', default='customer', help='Username prefix (default: customer).')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for a reproducible history.')
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE,
+                            help=f'Rows per bulk insert (default: {SEED_BATCH_SIZE}).')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['transactions'] < 0 or options['days'] < 1:
+            raise CommandError("--users and --days must be positive and --transactions not negative.")
+        if not 0 <= options['savings_ratio'] <= 1:
+            raise CommandError("--savings-ratio must be between 0 and 1.")
+        report = seed_bank(options['users'], options['transactions'], days=options['days'],
+                           savings_ratio=options['savings_ratio'], password=options['password'],
+                           prefix=options['prefix'], seed=options['seed'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['users']} users ({options['prefix']}_{report['tag']}_*), {report['accounts']} accounts "
+            f"and {report['transactions']} transactions in {report['seconds']:.2f}s."
+        ))
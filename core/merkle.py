@@ -0,0 +1,63 @@
+# core/merkle.py
+"""
+Binary Merkle trees over hex-encoded SHA-256 hashes.
+
+Leaves are existing hashes (transaction or shard head hashes). Interior
+nodes are SHA-256(0x01 || left || right) over the raw digests, so an
+interior node can never be confused with a leaf. An odd node at the end of
+a level is promoted to the next level unchanged.
+"""
+import hashlib
+
+from .utils import GENESIS_HASH
+
+_NODE_PREFIX = b'\x01'
+
+def hash_pair(left, right):
+    """Returns the parent of two hex-encoded child hashes."""
+    return hashlib.sha256(_NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+def _parent_level(level):
+    """Pairs up one level of the tree, promoting a trailing odd node unchanged."""
+    parents = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+def merkle_root(hashes):
+    """Returns the Merkle root of a list of hex hashes (GENESIS_HASH when empty)."""
+    level = list(hashes)
+    if not level:
+        return GENESIS_HASH
+    while len(level) > 1:
+        level = _parent_level(level)
+    return level[0]
+
+def merkle_proof(hashes, index):
+    """
+    Returns the audit path for hashes[index]: a list of sibling hashes from the
+    leaf upwards, each tagged with the side it sits on. Levels where the node
+    is promoted without a sibling contribute nothing, so the path has at most
+    ceil(log2(n)) entries.
+    """
+    if not 0 <= index < len(hashes):
+        raise IndexError("Leaf index out of range")
+    proof = []
+    level = list(hashes)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({'hash': level[sibling], 'position': 'left' if sibling < index else 'right'})
+        level = _parent_level(level)
+        index //= 2
+    return proof
+
+def verify_merkle_proof(leaf, proof, root):
+    """Returns True if folding the audit path over leaf reproduces root."""
+    current = leaf
+    for step in proof:
+        if step['position'] == 'left':
+            current = hash_pair(step['hash'], current)
+        else:
+            current = hash_pair(current, step['hash'])
+    return current == root
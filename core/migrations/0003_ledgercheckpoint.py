@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_customuser_options_alter_customuser_address_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_transaction_id', models.UUIDField(help_text='The last transaction covered by this checkpoint.')),
+                ('last_hash', models.CharField(help_text='Hash of the last verified transaction in the chain.', max_length=64)),
+                ('position', models.PositiveBigIntegerField(help_text='Number of completed transactions verified up to and including the last one.')),
+                ('last_timestamp', models.DateTimeField(help_text='Timestamp of the last verified transaction.')),
+                ('verified_at', models.DateTimeField(auto_now_add=True, help_text='When this checkpoint was written.')),
+                ('signature', models.CharField(help_text='HMAC of the checkpoint data, keyed with SECRET_KEY.', max_length=64)),
+            ],
+            options={
+                'verbose_name': 'Ledger Checkpoint',
+                'verbose_name_plural': 'Ledger Checkpoints',
+                'ordering': ['-position'],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+from core.hashing import HASHED_FIELDS, hash_transaction_values
+
+GENESIS_HASH = '0' * 64
+# The hashed fields this version of Transaction has; hash_version arrives in 0011
+LEGACY_HASHED_FIELDS = HASHED_FIELDS[:-1]
+
+
+def backfill_chain_positions(apps, schema_editor):
+    """
+    Number the existing Completed transactions in timestamp order (the order
+    the old head lookup used), re-link and re-hash them, and point the chain
+    head at the last of them.
+
+    The old Transaction.save only hashed when pk was unset, which a UUID
+    default never is, so existing rows have no hash or previous_block_hash.
+    Each row is hashed with the version 1 (JSON) format, which 0011 records
+    as their hash_version.
+    """
+    Transaction = apps.get_model('core', 'Transaction')
+    ChainHead = apps.get_model('core', 'ChainHead')
+
+    height = 0
+    last = None
+    last_hash = GENESIS_HASH
+    batch = []
+    for txn in Transaction.objects.filter(status='Completed').order_by('timestamp', 'pk').iterator(chunk_size=2000):
+        height += 1
+        txn.chain_position = height
+        txn.previous_block_hash = last_hash
+        txn.hash = hash_transaction_values(*(getattr(txn, field) for field in LEGACY_HASHED_FIELDS), 1)
+        last_hash = txn.hash
+        last = txn
+        batch.append(txn)
+        if len(batch) >= 2000:
+            Transaction.objects.bulk_update(batch, ['chain_position', 'previous_block_hash', 'hash'])
+            batch = []
+    if batch:
+        Transaction.objects.bulk_update(batch, ['chain_position', 'previous_block_hash', 'hash'])
+
+    # Let the database assign the id so its sequence stays in step
+    ChainHead.objects.create(
+        last_hash=last_hash,
+        height=height,
+        last_transaction_id=last.pk if last else None,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ledgercheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_hash', models.CharField(default='0000000000000000000000000000000000000000000000000000000000000000', help_text='Hash of the most recent Completed transaction.', max_length=64)),
+                ('height', models.PositiveBigIntegerField(default=0, help_text='Number of Completed transactions in the chain.')),
+                ('last_transaction_id', models.UUIDField(blank=True, help_text='The most recent Completed transaction.', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='When the head last moved.')),
+            ],
+            options={
+                'verbose_name': 'Chain Head',
+                'verbose_name_plural': 'Chain Heads',
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='chain_position',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Height of this transaction in the ledger chain (Completed only).', null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_chain_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_chainhead'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCommitment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merkle_root', models.CharField(help_text='Merkle root over the shard head hashes, in shard order.', max_length=64)),
+                ('shard_heads', models.JSONField(help_text='Height and hash of each shard head at commit time.')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When this commitment was recorded.')),
+            ],
+            options={
+                'verbose_name': 'Ledger Commitment',
+                'verbose_name_plural': 'Ledger Commitments',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='chainhead',
+            options={'ordering': ['shard'], 'verbose_name': 'Chain Head', 'verbose_name_plural': 'Chain Heads'},
+        ),
+        migrations.AlterModelOptions(
+            name='ledgercheckpoint',
+            options={'ordering': ['shard', '-position'], 'verbose_name': 'Ledger Checkpoint', 'verbose_name_plural': 'Ledger Checkpoints'},
+        ),
+        migrations.AddField(
+            model_name='chainhead',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, help_text='The ledger shard this row is the head of.', unique=True),
+        ),
+        migrations.AddField(
+            model_name='ledgercheckpoint',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, help_text='The ledger shard this checkpoint covers.'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='The ledger chain this transaction was appended to.'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='chain_position',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text="Height of this transaction in its shard's chain (Completed only).", null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('shard', 'chain_position'), name='unique_chain_position_per_shard'),
+        ),
+    ]
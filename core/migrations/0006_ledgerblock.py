@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_ledger_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(default=0, help_text='The ledger shard this block belongs to.')),
+                ('height', models.PositiveBigIntegerField(help_text='Position of this block in its shard, starting at 1.')),
+                ('merkle_root', models.CharField(help_text='Merkle root over the hashes of the transactions in this block.', max_length=64)),
+                ('previous_root', models.CharField(help_text='Merkle root of the previous block in the shard.', max_length=64)),
+                ('first_position', models.PositiveBigIntegerField(help_text='Chain position of the first transaction in the block.')),
+                ('last_position', models.PositiveBigIntegerField(help_text='Chain position of the last transaction in the block.')),
+                ('transaction_count', models.PositiveIntegerField(help_text='Number of transactions sealed into the block.')),
+                ('sealed_at', models.DateTimeField(auto_now_add=True, help_text='When the block was sealed.')),
+            ],
+            options={
+                'verbose_name': 'Ledger Block',
+                'verbose_name_plural': 'Ledger Blocks',
+                'ordering': ['shard', 'height'],
+                'indexes': [models.Index(fields=['shard', 'last_position'], name='ledgerblock_shard_last_pos')],
+                'constraints': [models.UniqueConstraint(fields=('shard', 'height'), name='unique_block_height_per_shard')],
+            },
+        ),
+    ]
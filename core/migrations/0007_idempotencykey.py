@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_ledgerblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Client-chosen key from the Idempotency-Key header or idempotency_key field.', max_length=255)),
+                ('request_hash', models.CharField(help_text='SHA-256 of the request path and payload, so a key cannot be reused for a different request.', max_length=64)),
+                ('response_status', models.PositiveSmallIntegerField(help_text='HTTP status of the stored response.')),
+                ('response_content_type', models.CharField(help_text='Content-Type of the stored response.', max_length=100)),
+                ('response_location', models.CharField(blank=True, default='', help_text='Location header of the stored response, for redirects.', max_length=2048)),
+                ('response_body', models.TextField(blank=True, default='', help_text='Body of the stored response.')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the request was first processed.')),
+                ('user', models.ForeignKey(help_text='The user who sent the request.', on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Idempotency Key',
+                'verbose_name_plural': 'Idempotency Keys',
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_idempotency_key_per_user')],
+            },
+        ),
+    ]
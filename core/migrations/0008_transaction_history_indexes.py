@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        # Build the composite indexes before dropping the single-column FK indexes they replace
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender_account', '-timestamp'], name='txn_sender_timestamp'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['receiver_account', '-timestamp'], name='txn_receiver_timestamp'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'timestamp'], name='txn_status_timestamp'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='receiver_account',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='The account to which funds were received (optional).', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='received_transactions', to='core.account'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='sender_account',
+            field=models.ForeignKey(db_index=False, help_text='The account from which funds were sent.', on_delete=django.db.models.deletion.PROTECT, related_name='sent_transactions', to='core.account'),
+        ),
+    ]
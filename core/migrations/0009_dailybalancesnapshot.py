@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_transaction_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='The day (in TIME_ZONE) this snapshot covers.')),
+                ('closing_balance', models.DecimalField(decimal_places=2, help_text='Balance of the account at the end of the day.', max_digits=15)),
+                ('credits', models.DecimalField(decimal_places=2, default=0, help_text='Total money into the account during the day.', max_digits=15)),
+                ('debits', models.DecimalField(decimal_places=2, default=0, help_text='Total money out of the account during the day.', max_digits=15)),
+                ('transaction_count', models.PositiveIntegerField(default=0, help_text='Number of completed transactions during the day.')),
+                ('account', models.ForeignKey(help_text='The account this snapshot belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='core.account')),
+            ],
+            options={
+                'verbose_name': 'Daily Balance Snapshot',
+                'verbose_name_plural': 'Daily Balance Snapshots',
+                'ordering': ['account', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='unique_daily_balance_per_account')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipient_lookup_indexes'),
+    ]
+
+    operations = [
+        # Every existing hash is version 1 (JSON): rows written since 0004 hashed that way, and 0004 hashed older rows
+        migrations.AddField(
+            model_name='transaction',
+            name='hash_version',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, help_text='Canonical encoding the hash was computed with (see core.hashing).'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='hash_version',
+            field=models.PositiveSmallIntegerField(default=2, editable=False, help_text='Canonical encoding the hash was computed with (see core.hashing).'),
+        ),
+    ]
@@ -1,9 +1,14 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser  # For your custom user model
 import uuid # For unique transaction IDs
+from decimal import Decimal
 from django.utils import timezone # For accurate timestamps
-import hashlib # For hashing
-import json    # For serializing data to hash
+from django.utils.crypto import constant_time_compare, salted_hmac # For signing checkpoints
+from .hashing import CURRENT_HASH_VERSION
+from .utils import GENESIS_HASH, calculate_transaction_hash, ledger_shard_for
+from .merkle import merkle_root, merkle_proof
 
 # core/models.py
 
@@ -20,6 +25,11 @@ class CustomUser (AbstractUser ):
     class Meta:
         verbose_name = "User "
         verbose_name_plural = "Users"
+        indexes = [
+            # Case-insensitive recipient lookups (core.services.recipients)
+            models.Index(Lower('username'), name='customuser_username_lower'),
+            models.Index(Lower('email'), name='customuser_email_lower'),
+        ]
 
     def __str__(self):
         return self.username
@@ -59,18 +69,20 @@ class Account(models.Model):
         return f"{self.user.username}'s {self.account_type} ({self.account_number})"
 
     def deposit(self, amount):
-        if amount > 0:
-            self.balance += amount
-            self.save()
-            return True
-        return False
+        from .services.transfers import deposit, TransferError # Avoid circular import
+        try:
+            deposit(self, amount)
+        except TransferError:
+            return False
+        return True
 
     def withdraw(self, amount):
-        if amount > 0 and self.balance >= amount:
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        from .services.transfers import withdraw, TransferError # Avoid circular import
+        try:
+            withdraw(self, amount)
+        except TransferError:
+            return False
+        return True
 
 class Transaction(models.Model):
     """
@@ -80,11 +92,13 @@ class Transaction(models.Model):
     transaction_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False,
                                       help_text="Unique identifier for this transaction.")
     
+    # Indexed by the composite (account, -timestamp) indexes in Meta, which also serve plain FK lookups
     sender_account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='sent_transactions',
+                                       db_index=False,
                                        help_text="The account from which funds were sent.")
     
     receiver_account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='received_transactions',
-                                         null=True, blank=True,
+                                         null=True, blank=True, db_index=False,
                                          help_text="The account to which funds were received (optional).")
     
     amount = models.DecimalField(max_digits=15, decimal_places=2,
@@ -100,6 +114,8 @@ class Transaction(models.Model):
     )
     transaction_type = models.CharField(max_length=50, choices=TRANSACTION_TYPES,
                                         help_text="The type of transaction.")
+    # Types that, booked with no receiver, bring money into the sender account from outside the bank
+    EXTERNAL_CREDIT_TYPES = ('Deposit', 'Salary')
     
     description = models.CharField(max_length=255, blank=True, null=True,
                                    help_text="A brief description of the transaction.")
@@ -121,48 +137,413 @@ class Transaction(models.Model):
     
     previous_block_hash = models.CharField(max_length=64, blank=True, null=True,
                                            help_text="SHA-256 hash of the previous transaction in the ledger chain.")
+
+    shard = models.PositiveSmallIntegerField(default=0, editable=False,
+                                             help_text="The ledger chain this transaction was appended to.")
+
+    chain_position = models.PositiveBigIntegerField(blank=True, null=True, editable=False,
+                                                    help_text="Height of this transaction in its shard's chain (Completed only).")
     
     metadata = models.JSONField(blank=True, null=True,
                                 help_text="Optional JSON field for additional transaction details.")
 
+    hash_version = models.PositiveSmallIntegerField(default=CURRENT_HASH_VERSION, editable=False,
+                                                    help_text="Canonical encoding the hash was computed with (see core.hashing).")
+
     class Meta:
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
         ordering = ['timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['shard', 'chain_position'], name='unique_chain_position_per_shard'),
+        ]
+        indexes = [
+            # History is read newest first per account; see core.services.history
+            models.Index(fields=['sender_account', '-timestamp'], name='txn_sender_timestamp'),
+            models.Index(fields=['receiver_account', '-timestamp'], name='txn_receiver_timestamp'),
+            models.Index(fields=['status', 'timestamp'], name='txn_status_timestamp'),
+        ]
 
     def __str__(self):
         return f"Txn {self.transaction_id} ({self.transaction_type}) - {self.amount} from {self.sender_account} to {self.receiver_account or 'N/A'}"
 
     def _calculate_hash(self):
-        """
-        Calculates the SHA-256 hash of the transaction's core data.
-        The order of fields in the dictionary is important for consistent hashing.
-        """
-        data = {
-            'transaction_id': str(self.transaction_id),
-            'sender_account_id': str(self.sender_account.id),
-            'receiver_account_id': str(self.receiver_account.id) if self.receiver_account else None,
-            'amount': str(self.amount),
-            'transaction_type': self.transaction_type,
-            'description': self.description,
-            'timestamp': self.timestamp.isoformat(),
-            'previous_block_hash': self.previous_block_hash,
-            'status': self.status,
-        }
-        encoded_data = json.dumps(data, sort_keys=True).encode('utf-8')
-        return hashlib.sha256(encoded_data).hexdigest()
+        """Calculates the SHA-256 hash of the transaction's core data, in the format of its hash_version."""
+        return calculate_transaction_hash(self)
 
     def save(self, *args, **kwargs):
-        if not self.pk: # Only on creation of a new transaction
-            last_completed_transaction = Transaction.objects.filter(status='Completed').order_by('-timestamp').first()
-            if last_completed_transaction:
-                self.previous_block_hash = last_completed_transaction.hash
-            else:
-                self.previous_block_hash = '0' * 64 # Genesis block hash
+        # The UUID primary key is assigned by its default before save, so check _state instead of pk
+        if self._state.adding: # Only on creation of a new transaction
+            # Hash the amount exactly as the database will return it (two decimal places)
+            self.amount = Decimal(self.amount).quantize(Decimal('0.01'))
 
             if not self.timestamp:
                 self.timestamp = timezone.now()
 
-            self.hash = self._calculate_hash()
+            # Lock this shard's chain head so concurrent appends to it are serialized and cannot fork it
+            self.shard = ledger_shard_for(self.sender_account)
+            # No savepoint: when called from the transfer service the outer atomic block already covers it
+            with transaction.atomic(savepoint=False):
+                head = ChainHead.objects.lock(self.shard)
+                head.link(self)
+                super().save(*args, **kwargs)
+                head.advance(self)
+            return
 
         super().save(*args, **kwargs)
+
+
+class ChainHeadManager(models.Manager):
+    def lock(self, shard=0):
+        """
+        Returns the head of the given shard's chain, locked with SELECT ... FOR UPDATE
+        until the surrounding atomic block ends, creating it for a new shard.
+        Must be called inside transaction.atomic().
+        """
+        try:
+            return self.select_for_update().get(shard=shard)
+        except self.model.DoesNotExist:
+            pass
+        try:
+            # In a savepoint, so losing the race to create the head leaves the caller's transaction usable
+            with transaction.atomic():
+                return self.create(shard=shard, last_hash=GENESIS_HASH)
+        except IntegrityError:
+            # The winner's row is committed by the time its unique index lets the INSERT fail; wait for its lock
+            return self.select_for_update().get(shard=shard)
+
+class ChainHead(models.Model):
+    """
+    The tip of one ledger chain, kept in a single row per shard.
+    Appends read and advance this row instead of searching for the last Completed transaction.
+    """
+    shard = models.PositiveSmallIntegerField(unique=True, default=0,
+                                             help_text="The ledger shard this row is the head of.")
+
+    last_hash = models.CharField(max_length=64, default=GENESIS_HASH,
+                                 help_text="Hash of the most recent Completed transaction.")
+
+    height = models.PositiveBigIntegerField(default=0,
+                                            help_text="Number of Completed transactions in the chain.")
+
+    last_transaction_id = models.UUIDField(blank=True, null=True,
+                                           help_text="The most recent Completed transaction.")
+
+    updated_at = models.DateTimeField(auto_now=True,
+                                      help_text="When the head last moved.")
+
+    objects = ChainHeadManager()
+
+    class Meta:
+        verbose_name = "Chain Head"
+        verbose_name_plural = "Chain Heads"
+        ordering = ['shard']
+
+    def __str__(self):
+        return f"Shard {self.shard} head at block {self.height} ({self.last_hash[:12]}...)"
+
+    def link(self, txn):
+        """
+        Points txn at the current head and computes its hash. Completed
+        transactions also take the next chain position and become the head.
+        The caller saves txn and then calls advance().
+        """
+        txn.shard = self.shard
+        txn.previous_block_hash = self.last_hash
+        if txn.status == 'Completed':
+            self.height += 1
+            txn.chain_position = self.height
+        txn.hash = txn._calculate_hash()
+        if txn.status == 'Completed':
+            self.last_hash = txn.hash
+            self.last_transaction_id = txn.transaction_id
+
+    def advance(self, txn):
+        """Persists the head after txn was linked, if txn moved it."""
+        if txn.chain_position is not None:
+            self.save(update_fields=['last_hash', 'height', 'last_transaction_id', 'updated_at'])
+
+class LedgerCheckpoint(models.Model):
+    """
+    A signed marker recording how far the ledger chain has been verified.
+    Verification resumes from the latest checkpoint instead of re-hashing from genesis.
+    """
+    shard = models.PositiveSmallIntegerField(default=0,
+                                             help_text="The ledger shard this checkpoint covers.")
+
+    last_transaction_id = models.UUIDField(help_text="The last transaction covered by this checkpoint.")
+
+    last_hash = models.CharField(max_length=64,
+                                 help_text="Hash of the last verified transaction in the chain.")
+
+    position = models.PositiveBigIntegerField(
+        help_text="Number of completed transactions verified up to and including the last one.")
+
+    last_timestamp = models.DateTimeField(help_text="Timestamp of the last verified transaction.")
+
+    verified_at = models.DateTimeField(auto_now_add=True,
+                                       help_text="When this checkpoint was written.")
+
+    signature = models.CharField(max_length=64,
+                                 help_text="HMAC of the checkpoint data, keyed with SECRET_KEY.")
+
+    class Meta:
+        verbose_name = "Ledger Checkpoint"
+        verbose_name_plural = "Ledger Checkpoints"
+        ordering = ['shard', '-position']
+
+    def __str__(self):
+        return f"Shard {self.shard} checkpoint at block {self.position} ({self.last_hash[:12]}...)"
+
+    def _signed_value(self):
+        return f"{self.shard}:{self.position}:{self.last_transaction_id}:{self.last_hash}:{self.last_timestamp.isoformat()}"
+
+    def compute_signature(self):
+        return salted_hmac('core.LedgerCheckpoint', self._signed_value(), algorithm='sha256').hexdigest()
+
+    def is_authentic(self):
+        """
+        Returns True if the stored signature matches the checkpoint data,
+        i.e. the row was written by this application and not edited since.
+        """
+        return constant_time_compare(self.signature, self.compute_signature())
+
+    def save(self, *args, **kwargs):
+        self.signature = self.compute_signature()
+        super().save(*args, **kwargs)
+
+
+class LedgerCommitmentManager(models.Manager):
+    def commit(self):
+        """
+        Records a Merkle root over the current head of every shard.
+        Heads are locked in shard order so the commitment is a consistent cut.
+        """
+        with transaction.atomic():
+            heads = list(ChainHead.objects.select_for_update().order_by('shard'))
+            return self.create(
+                merkle_root=merkle_root([head.last_hash for head in heads]),
+                shard_heads={str(head.shard): {'height': head.height, 'hash': head.last_hash} for head in heads},
+            )
+
+class LedgerCommitment(models.Model):
+    """
+    A periodic global commitment binding the heads of all ledger shards together.
+    """
+    merkle_root = models.CharField(max_length=64,
+                                   help_text="Merkle root over the shard head hashes, in shard order.")
+
+    shard_heads = models.JSONField(help_text="Height and hash of each shard head at commit time.")
+
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      help_text="When this commitment was recorded.")
+
+    objects = LedgerCommitmentManager()
+
+    class Meta:
+        verbose_name = "Ledger Commitment"
+        verbose_name_plural = "Ledger Commitments"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Commitment {self.merkle_root[:12]}... over {len(self.shard_heads)} shard(s)"
+
+
+class LedgerBlockManager(models.Manager):
+    def seal(self, shard=0, block_size=None):
+        """
+        Groups the shard's unsealed Completed transactions, in chain order, into
+        blocks of at most block_size (default settings.LEDGER_BLOCK_SIZE) and
+        records each block's Merkle root. Returns the newly sealed blocks.
+
+        The shard's chain head stays locked until the blocks are written, so
+        concurrent sealers of a shard take turns, and appends to it wait.
+        Raises ValueError if a transaction in the range has no hash.
+        """
+        block_size = block_size or getattr(settings, 'LEDGER_BLOCK_SIZE', 1024)
+        with transaction.atomic():
+            head = ChainHead.objects.select_for_update().filter(shard=shard).first()
+            if head is None:
+                return []
+            last_block = self.filter(shard=shard).order_by('-height').first()
+            height = last_block.height if last_block else 0
+            previous_root = last_block.merkle_root if last_block else GENESIS_HASH
+            first_position = last_block.last_position + 1 if last_block else 1
+            # Every position up to the committed head height is already written
+            tip = head.height
+
+            blocks = []
+            while first_position <= tip:
+                last_position = min(first_position + block_size - 1, tip)
+                hashes = list(Transaction.objects.filter(
+                    shard=shard, chain_position__range=(first_position, last_position)
+                ).order_by('chain_position').values_list('hash', flat=True))
+                if None in hashes:
+                    position = first_position + hashes.index(None)
+                    raise ValueError(f"Shard {shard} transaction at chain position {position} has no hash; "
+                                     "run audit_ledger to find where the chain breaks.")
+                height += 1
+                block = self.create(
+                    shard=shard,
+                    height=height,
+                    merkle_root=merkle_root(hashes),
+                    previous_root=previous_root,
+                    first_position=first_position,
+                    last_position=last_position,
+                    transaction_count=len(hashes),
+                )
+                blocks.append(block)
+                previous_root = block.merkle_root
+                first_position = last_position + 1
+            return blocks
+
+class LedgerBlock(models.Model):
+    """
+    A sealed batch of consecutive Completed transactions from one shard's chain.
+    The Merkle root lets a single transaction be proven with a logarithmic audit path.
+    """
+    shard = models.PositiveSmallIntegerField(default=0,
+                                             help_text="The ledger shard this block belongs to.")
+
+    height = models.PositiveBigIntegerField(help_text="Position of this block in its shard, starting at 1.")
+
+    merkle_root = models.CharField(max_length=64,
+                                   help_text="Merkle root over the hashes of the transactions in this block.")
+
+    previous_root = models.CharField(max_length=64,
+                                     help_text="Merkle root of the previous block in the shard.")
+
+    first_position = models.PositiveBigIntegerField(help_text="Chain position of the first transaction in the block.")
+
+    last_position = models.PositiveBigIntegerField(help_text="Chain position of the last transaction in the block.")
+
+    transaction_count = models.PositiveIntegerField(help_text="Number of transactions sealed into the block.")
+
+    sealed_at = models.DateTimeField(auto_now_add=True,
+                                     help_text="When the block was sealed.")
+
+    objects = LedgerBlockManager()
+
+    class Meta:
+        verbose_name = "Ledger Block"
+        verbose_name_plural = "Ledger Blocks"
+        ordering = ['shard', 'height']
+        constraints = [
+            models.UniqueConstraint(fields=['shard', 'height'], name='unique_block_height_per_shard'),
+        ]
+        indexes = [
+            models.Index(fields=['shard', 'last_position'], name='ledgerblock_shard_last_pos'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} block {self.height} ({self.transaction_count} txns, root {self.merkle_root[:12]}...)"
+
+    @classmethod
+    def inclusion_proof(cls, txn):
+        """
+        Returns the Merkle inclusion proof for a Completed transaction, or None
+        if the transaction is not part of a sealed block yet.
+        """
+        if txn.chain_position is None:
+            return None
+        block = cls.objects.filter(
+            shard=txn.shard, last_position__gte=txn.chain_position, first_position__lte=txn.chain_position
+        ).order_by('last_position').first()
+        if block is None:
+            return None
+        hashes = list(Transaction.objects.filter(
+            shard=block.shard, chain_position__range=(block.first_position, block.last_position)
+        ).order_by('chain_position').values_list('hash', flat=True))
+        index = txn.chain_position - block.first_position
+        return {
+            'transaction_id': str(txn.transaction_id),
+            'hash': txn.hash,
+            'shard': block.shard,
+            'block': {
+                'height': block.height,
+                'merkle_root': block.merkle_root,
+                'previous_root': block.previous_root,
+                'first_position': block.first_position,
+                'last_position': block.last_position,
+                'sealed_at': block.sealed_at.isoformat(),
+            },
+            'index': index,
+            'proof': merkle_proof(hashes, index),
+        }
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a money-moving request made with an Idempotency-Key.
+    A retry with the same key replays this response instead of posting again.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='idempotency_keys',
+                             help_text="The user who sent the request.")
+
+    key = models.CharField(max_length=255,
+                           help_text="Client-chosen key from the Idempotency-Key header or idempotency_key field.")
+
+    request_hash = models.CharField(max_length=64,
+                                    help_text="SHA-256 of the request path and payload, so a key cannot be reused for a different request.")
+
+    response_status = models.PositiveSmallIntegerField(help_text="HTTP status of the stored response.")
+
+    response_content_type = models.CharField(max_length=100,
+                                             help_text="Content-Type of the stored response.")
+
+    response_location = models.CharField(max_length=2048, blank=True, default='',
+                                         help_text="Location header of the stored response, for redirects.")
+
+    response_body = models.TextField(blank=True, default='',
+                                     help_text="Body of the stored response.")
+
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      help_text="When the request was first processed.")
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.response_status})"
+
+
+class DailyBalanceSnapshot(models.Model):
+    """
+    One account's activity and closing balance for one day, kept up to date by
+    core.services.transfers so statements never have to sum the ledger.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_balances',
+                                help_text="The account this snapshot belongs to.")
+
+    date = models.DateField(help_text="The day (in TIME_ZONE) this snapshot covers.")
+
+    closing_balance = models.DecimalField(max_digits=15, decimal_places=2,
+                                          help_text="Balance of the account at the end of the day.")
+
+    credits = models.DecimalField(max_digits=15, decimal_places=2, default=0,
+                                  help_text="Total money into the account during the day.")
+
+    debits = models.DecimalField(max_digits=15, decimal_places=2, default=0,
+                                 help_text="Total money out of the account during the day.")
+
+    transaction_count = models.PositiveIntegerField(default=0,
+                                                    help_text="Number of completed transactions during the day.")
+
+    class Meta:
+        verbose_name = "Daily Balance Snapshot"
+        verbose_name_plural = "Daily Balance Snapshots"
+        ordering = ['account', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='unique_daily_balance_per_account'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} on {self.date}: {self.closing_balance}"
+
+    @property
+    def opening_balance(self):
+        return self.closing_balance - self.credits + self.debits
@@ -0,0 +1,206 @@
+# core/qrcodes.py
+"""
+Rendered "Pay Me" QR code images.
+
+A QR image depends only on its payload: the absolute pay_me URL, which
+combines the host with an account number that never changes. Rendering
+one with qrcode and Pillow costs milliseconds of CPU. So each PNG is
+rendered once and then served from a bounded in-process LRU cache keyed on
+the payload. With settings.QR_CACHE_DIR set, images are also written
+there, so they survive restarts and are shared by every worker on the
+host.
+
+Each image's ETag is the SHA-256 of its PNG bytes, which lets browsers
+revalidate with If-None-Match and receive a 304 instead of the image.
+
+generate_qr_codes renders codes for many accounts at once, as SVG and PNGs
+in several sizes, across a process pool (`manage.py generate_qr_codes`).
+"""
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+from django.conf import settings
+from django.urls import reverse
+
+from .utils import LRUCache
+
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+# payload digest -> (png bytes, etag)
+_images = LRUCache(maxsize=getattr(settings, 'QR_CACHE_SIZE', 1024))
+
+
+def render_qr_png(data, box_size=QR_BOX_SIZE, border=QR_BORDER):
+    """Renders data as a QR code and returns the PNG bytes."""
+    stream = BytesIO()
+    qrcode.make(data, box_size=box_size, border=border).save(stream, format='PNG')
+    return stream.getvalue()
+
+def render_qr_svg(data, border=QR_BORDER):
+    """Renders data as a QR code and returns the SVG document bytes."""
+    stream = BytesIO()
+    qrcode.make(data, image_factory=SvgPathImage, border=border).save(stream)
+    return stream.getvalue()
+
+def png_etag(png):
+    """Returns the strong ETag for a PNG: the quoted SHA-256 of its bytes."""
+    return f'"{hashlib.sha256(png).hexdigest()}"'
+
+def _payload_key(data):
+    return hashlib.sha256(f"{QR_BOX_SIZE}:{QR_BORDER}:{data}".encode('utf-8')).hexdigest()
+
+def _read_from_disk(directory, key):
+    try:
+        with open(os.path.join(directory, f"{key}.png"), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _write_file(directory, name, content):
+    # Write under a temporary name and rename, so readers never see a partial file
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(path, os.path.join(directory, name))
+
+def _write_to_disk(directory, key, png):
+    os.makedirs(directory, exist_ok=True)
+    _write_file(directory, f"{key}.png", png)
+
+def qr_png(data):
+    """
+    Returns (png, etag) for data, rendering it only if neither the memory
+    cache nor the disk store (settings.QR_CACHE_DIR) has it yet.
+    """
+    key = _payload_key(data)
+    cached = _images.get(key)
+    if cached is not None:
+        return cached
+    directory = getattr(settings, 'QR_CACHE_DIR', None)
+    png = _read_from_disk(directory, key) if directory else None
+    if png is None:
+        png = render_qr_png(data)
+        if directory:
+            _write_to_disk(directory, key, png)
+    cached = (png, png_etag(png))
+    _images.set(key, cached)
+    return cached
+
+def pay_me_url(base_url, account_number):
+    """Returns the absolute pay_me URL qr_code_view encodes for an account."""
+    return base_url.rstrip('/') + reverse('pay_me', args=[account_number])
+
+def qr_file_names(account_number, png_sizes, svg=True):
+    """Returns the file names generate_qr_codes writes for one account."""
+    names = [f"{account_number}-{size}.png" for size in png_sizes]
+    if svg:
+        names.append(f"{account_number}.svg")
+    return names
+
+def render_qr_files(account_number, data, png_sizes, svg=True):
+    """Renders one account's files and returns [(name, bytes)]. Runs in the worker processes."""
+    names = qr_file_names(account_number, png_sizes, svg)
+    files = [render_qr_png(data, box_size=size) for size in png_sizes]
+    if svg:
+        files.append(render_qr_svg(data))
+    return list(zip(names, files))
+
+class DirectoryStore:
+    """Writes generated files into a directory, each one atomically."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def existing(self):
+        return set(os.listdir(self.path))
+
+    def write(self, files):
+        for name, content in files:
+            _write_file(self.path, name, content)
+
+class ZipStore:
+    """
+    Appends generated files to a zip archive. The archive is closed after
+    every batch of files, so an interrupted run leaves a readable archive
+    with everything written so far.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def existing(self):
+        if not os.path.exists(self.path):
+            return set()
+        with zipfile.ZipFile(self.path) as archive:
+            return set(archive.namelist())
+
+    def write(self, files):
+        with zipfile.ZipFile(self.path, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+            # A resumed run re-renders an account that was only partly written; append only its missing files
+            names = set(archive.namelist())
+            for name, content in files:
+                if name not in names:
+                    archive.writestr(name, content)
+                    names.add(name)
+
+def generate_qr_codes(account_numbers, base_url, store, png_sizes=(4, 10, 20), svg=True, workers=None,
+                      batch_size=200):
+    """
+    Renders the QR codes of account_numbers into store (a DirectoryStore or
+    ZipStore) with a pool of workers processes (default: one per CPU;
+    workers=1 renders in-process). Accounts whose files are all in the
+    store already are skipped, so an interrupted run can simply be
+    restarted. Returns a report dict with generated, skipped, files and
+    seconds.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    existing = store.existing()
+    report = {'generated': 0, 'skipped': 0, 'files': 0, 'seconds': 0.0}
+
+    def jobs():
+        for number in account_numbers:
+            if existing.issuperset(qr_file_names(number, png_sizes, svg)):
+                report['skipped'] += 1
+                continue
+            yield number, pay_me_url(base_url, number), png_sizes, svg
+
+    def flush(batch):
+        store.write([file for files in batch for file in files])
+        report['generated'] += len(batch)
+        report['files'] += sum(len(files) for files in batch)
+        batch.clear()
+
+    batch = []
+    if workers == 1:
+        for job in jobs():
+            batch.append(render_qr_files(*job))
+            if len(batch) >= batch_size:
+                flush(batch)
+    else:
+        # Workers only render; the parent writes, so the store needs no locking
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for job in jobs():
+                pending.append(executor.submit(render_qr_files, *job))
+                # Bound the rendered files held in memory while the writer catches up
+                while len(pending) > workers * 4:
+                    batch.append(pending.popleft().result())
+                    if len(batch) >= batch_size:
+                        flush(batch)
+            for future in pending:
+                batch.append(future.result())
+    if batch:
+        flush(batch)
+    report['seconds'] = time.perf_counter() - started
+    return report
@@ -1,48 +1,139 @@
 # core/serializers.py
+"""
+DRF serializers for the JSON API.
+
+Serializing model instances is slow for long lists: every row becomes a
+model instance, plus one per nested account, before any field is read.
+ValuesSerializerMixin adds a read-only fast path. values_fields() names the
+columns a serializer reads, and from_values() turns the matching .values()
+rows straight into the dicts to_representation would return. It calls the
+same fields' to_representation, so both paths give identical output, and
+the nested accounts come from joins in the one query.
+"""
+from decimal import Decimal
 from rest_framework import serializers
 from .models import CustomUser, Account, Transaction
 
+
+class ValuesSerializerMixin:
+    """
+    Read-only fast path for serializers whose fields are model fields,
+    primary keys of relations, or nested serializers built the same way.
+    """
+
+    def _values_plan(self, serializer=None, prefix=''):
+        # [(output name, lookup, convert, nested plan)]; a relation's own lookup is its primary key
+        plan = []
+        for name, field in (serializer or self).fields.items():
+            if field.write_only:
+                continue
+            lookup = prefix + field.source.replace('.', '__')
+            if isinstance(field, serializers.BaseSerializer):
+                plan.append((name, lookup, None, self._values_plan(field, lookup + '__')))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                plan.append((name, lookup, None, None))
+            elif not isinstance(field, serializers.RelatedField):
+                plan.append((name, lookup, field.to_representation, None))
+            else:
+                raise TypeError(f"{type(field).__name__} '{name}' cannot be built from values() rows.")
+        return plan
+
+    def values_fields(self):
+        """Returns the lookups to pass to .values() for from_values."""
+        def lookups(plan):
+            for _, lookup, _, nested in plan:
+                yield lookup
+                if nested is not None:
+                    yield from lookups(nested)
+        return list(lookups(self._values_plan()))
+
+    def from_values(self, rows):
+        """Returns the representation of every row of a .values(*self.values_fields()) queryset."""
+        def represent(row, plan):
+            data = {}
+            for name, lookup, convert, nested in plan:
+                value = row[lookup]
+                if value is None:
+                    data[name] = None
+                elif nested is not None:
+                    data[name] = represent(row, nested)
+                else:
+                    data[name] = convert(value) if convert else value
+            return data
+        plan = self._values_plan()
+        return [represent(row, plan) for row in rows]
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
-        class Meta:
-            model = CustomUser
-            fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'address']
-            read_only_fields = ['username', 'email'] # Prevent direct update of these via API if not desired
-
-class AccountSerializer(serializers.ModelSerializer):
-        user = CustomUserSerializer(read_only=True) # Nested serializer to show user details
-
-        class Meta:
-            model = Account
-            fields = ['id', 'user', 'account_type', 'account_number', 'balance', 'created_at', 'updated_at']
-            read_only_fields = ['account_number', 'balance', 'created_at', 'updated_at'] # Balance updated via transactions
-
-class TransactionSerializer(serializers.ModelSerializer):
-        sender_account = serializers.StringRelatedField() # Displays __str__ of Account
-        receiver_account = serializers.StringRelatedField() # Displays __str__ of Account
-
-        class Meta:
-            model = Transaction
-            fields = [
-                'transaction_id', 'sender_account', 'receiver_account', 'amount',
-                'transaction_type', 'description', 'timestamp', 'status',
-                'hash', 'previous_block_hash', 'metadata'
-            ]
-            read_only_fields = [
-                'transaction_id', 'timestamp', 'status', 'hash', 'previous_block_hash'
-            ] # These are set by backend logic
-    
-from rest_framework import serializers
-from .models import Transaction, Account
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'address']
+        read_only_fields = ['username', 'email'] # Prevent direct update of these via API if not desired
+
+
+class AccountSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
+    user = CustomUserSerializer(read_only=True) # Nested serializer to show user details
 
-class AccountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Account
+        fields = ['id', 'user', 'account_type', 'account_number', 'balance', 'created_at', 'updated_at']
+        read_only_fields = ['account_number', 'balance', 'created_at', 'updated_at'] # Balance updated via transactions
+
+
+class AccountSummarySerializer(serializers.ModelSerializer):
+    """The account on either side of a transaction."""
     class Meta:
         model = Account
         fields = ['account_number', 'account_type']
 
-class TransactionSerializer(serializers.ModelSerializer):
-    sender_account = AccountSerializer()
-    receiver_account = AccountSerializer()
-    
+
+class TransactionSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
+    # Nested, not StringRelatedField: Account.__str__ would load each account's user
+    sender_account = AccountSummarySerializer(read_only=True)
+    receiver_account = AccountSummarySerializer(read_only=True)
+
     class Meta:
         model = Transaction
         fields = '__all__'
+
+
+class TransferRequestSerializer(serializers.Serializer):
+    """Validates a transfer request; the transfer itself runs in core.services.transfers."""
+    from_account = serializers.PrimaryKeyRelatedField(queryset=Account.objects.none())
+    recipient_account_number = serializers.CharField(max_length=20)
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0.01'))
+    description = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            # Only the requesting user's own accounts can be debited
+            self.fields['from_account'].queryset = Account.objects.filter(user=request.user)
+
+    def validate(self, attrs):
+        to_account = Account.objects.filter(account_number=attrs['recipient_account_number']).first()
+        if to_account is None:
+            raise serializers.ValidationError({'recipient_account_number': "Recipient account not found."})
+        attrs['to_account'] = to_account
+        return attrs
+
+
+class BatchTransferRequestSerializer(serializers.Serializer):
+    """Validates the envelope of a batch transfer; lines are validated together by the service."""
+    from_account = serializers.PrimaryKeyRelatedField(queryset=Account.objects.none())
+    transaction_type = serializers.ChoiceField(choices=['Transfer', 'Salary'], default='Transfer')
+    # Lines stay plain dicts: the service validates the whole batch in bulk
+    transfers = serializers.ListField(child=serializers.DictField(), required=False)
+    file = serializers.FileField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            self.fields['from_account'].queryset = Account.objects.filter(user=request.user)
+
+    def validate(self, attrs):
+        if ('transfers' in attrs) == ('file' in attrs):
+            raise serializers.ValidationError("Provide either a 'transfers' list or a 'file', not both.")
+        return attrs
@@ -0,0 +1,104 @@
+# core/services/exports.py
+"""
+Statement exports: the transactions of a user's accounts, or of one
+account, as CSV or JSON Lines, oldest first.
+
+A merchant account can have years of history, so an export is never held
+in memory. The rows come from history_for_accounts (the UNION ALL of index
+scans, see core.services.history) as plain values_list tuples rather than
+model instances, read with .iterator(chunk_size=...). On PostgreSQL that
+is a server-side cursor. Each chunk is formatted and handed on before the
+next one is fetched, so memory stays at one chunk however long the history
+is.
+
+export_statement_view streams an export over HTTP through
+StreamingHttpResponse; `manage.py export_statement` writes one to a file.
+Under ASGI, StreamingHttpResponse reads a sync iterator into a list before
+sending anything, so the view streams aexport_statement there instead.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .history import history_for_accounts
+
+EXPORT_CHUNK_SIZE = 2000
+# Oldest first, as on a printed statement
+CHRONOLOGICAL = ('timestamp', 'transaction_id')
+
+COLUMNS = ('transaction_id', 'timestamp', 'transaction_type', 'direction', 'amount', 'status',
+           'sender_account', 'receiver_account', 'description')
+_FIELDS = ('transaction_id', 'timestamp', 'transaction_type', 'direction', 'amount', 'status',
+           'sender_account__account_number', 'receiver_account__account_number', 'description')
+
+
+class _Echo:
+    """A file whose write returns what it was given, so csv.writer formats rows without buffering them."""
+
+    def write(self, value):
+        return value
+
+def statement_rows(account_ids, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields a tuple of COLUMNS values for every transaction touching
+    account_ids between start and end (inclusive datetimes, either may be
+    None), oldest first. direction is as seen by the accounts.
+    """
+    history = history_for_accounts(account_ids, start, end).order_by(*CHRONOLOGICAL)
+    return history.values_list(*_FIELDS).iterator(chunk_size=chunk_size)
+
+def _text(row):
+    transaction_id, timestamp, *rest = row
+    return (str(transaction_id), timestamp.isoformat(),
+            *(str(value) if value is not None else None for value in rest))
+
+def _chunks(rows, size):
+    return iter(lambda: list(islice(rows, size)), [])
+
+def csv_chunks(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields the CSV text of rows, a header line first, chunk_size rows at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(writer.writerow(_text(row)) for row in chunk)
+
+def jsonl_chunks(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields rows as JSON Lines, one object per transaction, chunk_size rows at a time."""
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(json.dumps(dict(zip(COLUMNS, _text(row)))) + '\n' for row in chunk)
+
+# format -> (content type, formatter)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_chunks),
+    'jsonl': ('application/x-ndjson', jsonl_chunks),
+}
+
+def export_statement(account_ids, export_format, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Returns an iterator over the text of a statement export of account_ids
+    in export_format ('csv' or 'jsonl'). Nothing is queried until it is
+    first advanced. Raises ValueError for an unknown format.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}'.")
+    _, formatter = EXPORT_FORMATS[export_format]
+    return formatter(statement_rows(account_ids, start, end, chunk_size), chunk_size)
+
+async def _aiterate(chunks):
+    # Every chunk is fetched in the same sync thread, which owns the connection and its cursor
+    fetch = sync_to_async(next)
+    try:
+        while (chunk := await fetch(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+def aexport_statement(account_ids, export_format, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Async version of export_statement: returns an async iterator over the
+    same text, fetching one chunk at a time. Raises ValueError for an
+    unknown format.
+    """
+    return _aiterate(export_statement(account_ids, export_format, start, end, chunk_size))
@@ -0,0 +1,155 @@
+# core/services/history.py
+"""
+Per-user and per-account transaction history.
+
+Filtering on Q(sender_account__user=...) | Q(receiver_account__user=...)
+joins Account twice and ORs the two joins, so no single index can serve
+it and the database ends up scanning the ledger. Here the history is
+written as a UNION ALL with two branches per account instead:
+- the entries the account sent, an index scan on (sender_account, -timestamp);
+- the entries it received from other accounts, an index scan on
+  (receiver_account, -timestamp).
+
+The account ids are looked up first and inlined, so each branch filters on
+one constant and its index returns rows already newest first. With a limit,
+every branch is cut to that many rows on its own and the database merges
+them, rather than sorting the account's whole history.
+
+Entries between two of the accounts only appear in the sent branch, so
+nothing is listed twice.
+
+Each row is annotated with its direction: 'debit' or 'credit' as seen by
+the accounts. Deposits are booked with the account as sender and no
+receiver, so they come out of the sent branch as credits (see
+Transaction.EXTERNAL_CREDIT_TYPES).
+
+Pages are keyset-paginated on (timestamp, transaction_id). A cursor names
+the last row of the previous page, and the next page starts right after it
+in every branch's index. No page ever counts rows or skips over them with
+OFFSET, so page 1,000 costs the same as page 1.
+"""
+import uuid
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Case, CharField, Q, Value, When
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from ..models import Account, Transaction
+
+DEBIT = 'debit'
+CREDIT = 'credit'
+# Newest first; the primary key breaks ties between entries with the same timestamp
+ORDERING = ('-timestamp', '-transaction_id')
+PAGE_SIZE = 25
+
+
+def history_for_accounts(account_ids, start=None, end=None, limit=None, before=None, select_related=()):
+    """
+    Returns every transaction touching any of account_ids, newest first, as a
+    UNION ALL queryset annotated with direction. It supports slicing, count()
+    and Paginator, but not further filtering: pass start and end (inclusive
+    datetimes) to restrict the period, and before, a (timestamp,
+    transaction_id) pair, to start right after that row. When only the newest
+    rows are needed, pass limit rather than slicing the result, so each branch
+    stops after that many rows of its index. select_related names relations
+    to load in the same query.
+    """
+    account_ids = sorted(set(account_ids))
+    branches = []
+    for account_id in account_ids:
+        # One equality branch per account and side, so each can walk its index newest first
+        sent = Transaction.objects.filter(sender_account_id=account_id).annotate(direction=Case(
+            When(receiver_account__isnull=True, transaction_type__in=Transaction.EXTERNAL_CREDIT_TYPES, then=Value(CREDIT)),
+            default=Value(DEBIT), output_field=CharField()
+        ))
+        received = Transaction.objects.filter(receiver_account_id=account_id).exclude(
+            sender_account_id__in=account_ids
+        ).annotate(direction=Value(CREDIT, output_field=CharField()))
+        branches += [sent, received]
+    if not branches:
+        return Transaction.objects.none()
+    if start is not None:
+        branches = [branch.filter(timestamp__gte=start) for branch in branches]
+    if end is not None:
+        branches = [branch.filter(timestamp__lte=end) for branch in branches]
+    if before is not None:
+        timestamp, transaction_id = before
+        # The range on timestamp alone is what the index can seek to; the pair comparison only settles ties
+        branches = [
+            branch.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, transaction_id__lt=transaction_id),
+                          timestamp__lte=timestamp)
+            for branch in branches
+        ]
+    if select_related:
+        branches = [branch.select_related(*select_related) for branch in branches]
+
+    if limit is not None and connection.features.supports_slicing_ordering_in_compound:
+        # Top-N per branch: the database merges a few rows from each index scan instead of sorting them all
+        branches = [branch.order_by(*ORDERING)[:limit] for branch in branches]
+    else:
+        # Compound statements cannot order their branches here, so drop the model's default ordering
+        branches = [branch.order_by() for branch in branches]
+    first, *rest = branches
+    history = first.union(*rest, all=True).order_by(*ORDERING)
+    return history[:limit] if limit is not None else history
+
+def user_history(user, start=None, end=None, limit=None):
+    """History of every account user owns; see history_for_accounts."""
+    return history_for_accounts(Account.objects.filter(user=user).values_list('pk', flat=True), start, end, limit)
+
+def account_history(account, start=None, end=None, limit=None):
+    """History of a single account; see history_for_accounts."""
+    return history_for_accounts([account.pk], start, end, limit)
+
+def encode_cursor(entry):
+    """Returns an opaque cursor for the page that starts right after entry, a Transaction or a values() dict."""
+    if isinstance(entry, dict):
+        timestamp, transaction_id = entry['timestamp'], entry['transaction_id']
+    else:
+        timestamp, transaction_id = entry.timestamp, entry.transaction_id
+    return urlsafe_base64_encode(f"{timestamp.isoformat()}|{transaction_id}".encode('utf-8'))
+
+def decode_cursor(cursor):
+    """Returns the (timestamp, transaction_id) a cursor points after. Raises ValueError if it is malformed."""
+    try:
+        timestamp, transaction_id = urlsafe_base64_decode(cursor).decode('utf-8').split('|')
+        timestamp = datetime.fromisoformat(timestamp)
+        transaction_id = uuid.UUID(transaction_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if timestamp.tzinfo is None:
+        raise ValueError("Invalid cursor.")
+    return timestamp, transaction_id
+
+def _page_query(account_ids, before, page_size, start, end, select_related, values):
+    # Fetch one extra row to learn whether another page follows
+    history = history_for_accounts(account_ids, start, end, page_size + 1, before, select_related)
+    return history.values(*values) if values else history
+
+def user_history_page(user, cursor=None, page_size=PAGE_SIZE, start=None, end=None, select_related=(), values=()):
+    """
+    Returns (entries, next_cursor) for one page of user's history, starting
+    after cursor (None for the newest page). next_cursor is None on the last
+    page. Raises ValueError for a malformed cursor. With values, the names
+    of fields including timestamp and transaction_id, entries are values()
+    dicts rather than model instances.
+    """
+    before = decode_cursor(cursor) if cursor else None
+    account_ids = Account.objects.filter(user=user).values_list('pk', flat=True)
+    entries = list(_page_query(account_ids, before, page_size, start, end, select_related, values))
+    return _page(entries, page_size)
+
+async def auser_history_page(user, cursor=None, page_size=PAGE_SIZE, start=None, end=None, select_related=(),
+                             values=()):
+    """Async version of user_history_page, for async views."""
+    before = decode_cursor(cursor) if cursor else None
+    account_ids = [pk async for pk in Account.objects.filter(user=user).values_list('pk', flat=True)]
+    history = _page_query(account_ids, before, page_size, start, end, select_related, values)
+    return _page([entry async for entry in history], page_size)
+
+def _page(entries, page_size):
+    if len(entries) <= page_size:
+        return entries, None
+    entries = entries[:page_size]
+    return entries, encode_cursor(entries[-1])
@@ -0,0 +1,156 @@
+# core/services/idempotency.py
+"""
+Idempotency keys for the money-moving endpoints.
+
+A client sends an Idempotency-Key header (or an idempotency_key field) with a
+transfer or a batch of transfers and can then retry it as often as it likes. The first request to
+succeed stores its response in an IdempotencyKey row, in the same database
+transaction as the transfer. Every later request with that key gets the
+stored response back without touching accounts or the ledger.
+
+The unique (user, key) index is what guarantees a single posting. If two
+requests with the same key race, the second one's INSERT waits for the first
+to commit and then fails. Its transfer is rolled back and it replays the
+first request's response. Stored responses are also kept in an in-process
+LRU cache, so most retries are answered without a query.
+
+Only successful responses (status below 400) are stored. A rejected request
+leaves no record, so the client can correct it and retry with the same key.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+
+from ..models import IdempotencyKey
+from ..utils import LRUCache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+# Set on replayed responses so clients can tell a retry from a fresh posting
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# (user id, key) -> IdempotencyKey, for keys this process has already seen completed
+_responses = LRUCache(maxsize=getattr(settings, 'IDEMPOTENCY_CACHE_SIZE', 10000))
+
+
+def get_idempotency_key(request):
+    """Returns the request's idempotency key from the header or the body, or None."""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                data = None
+            key = data.get(IDEMPOTENCY_FIELD) if isinstance(data, dict) else None
+        else:
+            key = request.POST.get(IDEMPOTENCY_FIELD)
+    key = str(key).strip() if key else ''
+    return key or None
+
+def _upload_hash(upload):
+    """Hashes an uploaded file's contents chunk by chunk, then rewinds it for the view."""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+def _request_hash(request):
+    """
+    Fingerprints the path and payload, ignoring the per-render CSRF token of
+    form posts. Uploads count by content, so a corrected batch file is a
+    different request.
+    """
+    digest = hashlib.sha256(request.path.encode('utf-8'))
+    if request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        fields = sorted(
+            (name, value) for name, values in request.POST.lists() if name != 'csrfmiddlewaretoken' for value in values
+        )
+        fields += sorted((name, upload.name, _upload_hash(upload))
+                         for name, uploads in request.FILES.lists() for upload in uploads)
+        digest.update(json.dumps(fields).encode('utf-8'))
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+def _replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return JsonResponse({'error': "This Idempotency-Key was already used for a different request."}, status=422)
+    response = HttpResponse(record.response_body, status=record.response_status,
+                            content_type=record.response_content_type)
+    if record.response_location:
+        response['Location'] = record.response_location
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+def _store(request, key, request_hash, response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        view = getattr(request, 'parser_context', {}).get('view')
+        if view is not None:
+            # A DRF Response from inside @api_view has no renderer until the view finalizes it
+            response = view.finalize_response(request, response)
+        response.render() # DRF and template responses render lazily
+    return IdempotencyKey.objects.create(
+        user=request.user,
+        key=key,
+        request_hash=request_hash,
+        response_status=response.status_code,
+        response_content_type=response.get('Content-Type', 'text/html; charset=utf-8'),
+        response_location=response.get('Location', ''),
+        response_body=response.content.decode(response.charset or 'utf-8'),
+    )
+
+def idempotent(view):
+    """
+    Makes a POST view safe to retry under an idempotency key.
+
+    Requests without a key, and anonymous requests, go straight to the view.
+    Apply it inside @api_view on DRF views, so the user is the one DRF's
+    authentication classes (session, basic, token) resolved.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        # The key and fingerprint come from the Django request under a DRF one; DRF reuses what it parses
+        http_request = getattr(request, '_request', request)
+        key = get_idempotency_key(http_request)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'error': f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters."}, status=400)
+
+        request_hash = _request_hash(http_request)
+        cache_key = (request.user.pk, key)
+        record = _responses.get(cache_key)
+        if record is None:
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is not None:
+            _responses.set(cache_key, record)
+            return _replay(record, request_hash)
+
+        try:
+            with transaction.atomic():
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 400:
+                    # Nothing was posted; leave no record so the request can be corrected and retried
+                    transaction.set_rollback(True)
+                    return response
+                # Written in the same transaction as the transfer: both commit or neither does
+                record = _store(request, key, request_hash, response)
+                transaction.on_commit(lambda: _responses.set(cache_key, record))
+        except IntegrityError:
+            # A concurrent request with the same key committed first; our transfer was rolled back
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                raise
+            _responses.set(cache_key, record)
+            return _replay(record, request_hash)
+        return response
+    return wrapper
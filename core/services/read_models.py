@@ -0,0 +1,130 @@
+# core/services/read_models.py
+"""
+Cached per-user read model behind the dashboard and the chatbot's balance
+and history answers.
+
+A user's summary (account balances, the dashboard totals and the newest
+ledger entries) is built once and kept in Django's cache. The key carries
+a per-user version number. The transfer path calls invalidate_users for the
+owners of every account it touches. That registers a version bump that runs
+when the transaction commits, so the next read misses and rebuilds from the
+committed rows. Nothing is deleted, and a summary built from older data
+can only ever be stored under a version nobody reads any more. That is what
+keeps the cache exactly consistent after a transfer, even when a read races
+with the commit.
+
+Balance changes made outside core.services.transfers (account creation,
+admin edits) are caught by the post_save and post_delete receivers below.
+
+The cache must be shared by every worker process for invalidation to reach
+them all: use Redis or Memcached in production. With the process-local
+LocMemCache, a transfer served by one worker would leave every other worker
+serving the old summary, so summaries are built on every read instead,
+unless settings.READ_MODEL_CACHE_LOCAL says there is only one process.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import Account
+from .history import history_for_accounts
+from .statements import ZERO
+
+# Newest entries kept in a summary: the dashboard shows 5, the chatbot 3
+RECENT_LIMIT = 5
+
+_TIMEOUT = getattr(settings, 'READ_MODEL_CACHE_TIMEOUT', 300)
+
+
+def _version_key(user_id):
+    return f'read-model:{user_id}:version'
+
+def _version(user_id):
+    # Seeded from the clock so a version lost to eviction never comes back as an old number
+    return cache.get_or_set(_version_key(user_id), time.time_ns, timeout=None)
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError: # Not cached (yet, or any more): start a fresh version
+            cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+def invalidate_users(user_ids):
+    """
+    Invalidates the cached summaries of user_ids once the current
+    transaction commits (immediately outside one). Call it wherever their
+    accounts or ledger entries change.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
+
+def _cached():
+    """Returns True if every worker sees the summaries this one caches."""
+    return getattr(settings, 'READ_MODEL_CACHE_LOCAL', False) or not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+def _accounts(user_id):
+    return Account.objects.filter(user_id=user_id).order_by('pk').values('pk', 'account_type', 'balance')
+
+def _summarize(accounts, recent_transactions):
+    # (user, account_type) is unique, so a user has at most one account of each type
+    by_type = {account['account_type'].lower(): account for account in accounts}
+    checking, savings = by_type.get('checking'), by_type.get('savings')
+    return {
+        'accounts': accounts,
+        'total_balance': sum((account['balance'] for account in accounts), ZERO),
+        'checking_balance': checking['balance'] if checking else ZERO,
+        'savings_balance': savings['balance'] if savings else ZERO,
+        'checking_account_id': checking['pk'] if checking else None,
+        'recent_transactions': recent_transactions,
+    }
+
+def _build(user_id):
+    accounts = list(_accounts(user_id))
+    recent = list(history_for_accounts([account['pk'] for account in accounts], limit=RECENT_LIMIT))
+    return _summarize(accounts, recent)
+
+async def _abuild(user_id):
+    accounts = [account async for account in _accounts(user_id)]
+    history = history_for_accounts([account['pk'] for account in accounts], limit=RECENT_LIMIT)
+    return _summarize(accounts, [entry async for entry in history])
+
+def user_summary(user):
+    """
+    Returns user's read model: accounts (dicts with pk, account_type and
+    balance), total_balance, checking_balance, savings_balance,
+    checking_account_id and recent_transactions (the newest RECENT_LIMIT
+    entries, annotated with direction). Served from the cache when it is
+    current.
+    """
+    if not _cached():
+        return _build(user.pk)
+    key = f'read-model:{user.pk}:{_version(user.pk)}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = _build(user.pk)
+        cache.set(key, summary, _TIMEOUT)
+    return summary
+
+async def auser_summary(user):
+    """Async version of user_summary, for async views."""
+    if not _cached():
+        return await _abuild(user.pk)
+    version = await cache.aget_or_set(_version_key(user.pk), time.time_ns, timeout=None)
+    key = f'read-model:{user.pk}:{version}'
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await _abuild(user.pk)
+        await cache.aset(key, summary, _TIMEOUT)
+    return summary
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def _account_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
@@ -0,0 +1,94 @@
+# core/services/recipients.py
+"""
+Resolves what a payer typed as the recipient (an account number, username
+or email address) to the account to credit.
+
+The three possibilities are looked up in one UNION ALL query. Each branch
+is an index lookup: the unique account number index, or the lower-case
+functional indexes on CustomUser.username and email. The rows are ranked in
+this order:
+- an account number match;
+- a username match with the exact case;
+- a case-insensitive username match;
+- an email match.
+Within one user, the Checking account is preferred.
+
+Resolutions are kept in a short-TTL in-process cache, since people tend
+to pay the same recipients again. Only identifiers, never balances, are
+cached. The account comes back with every other field deferred, so a
+balance is read fresh if it is ever needed.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Lower
+
+from ..models import Account, CustomUser
+from ..utils import LRUCache
+
+_Resolved = namedtuple('_Resolved', 'account_id account_number account_type user_id username')
+
+# identifier -> _Resolved
+_recipients = LRUCache(maxsize=getattr(settings, 'RECIPIENT_CACHE_SIZE', 10000),
+                       ttl=getattr(settings, 'RECIPIENT_CACHE_TTL', 60))
+
+
+def _deferred(model, **values):
+    """Builds a model instance from some field values, as a query with only() would."""
+    # from_db wants the loaded values in the model's field order
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(model.objects.db, names, [values[name] for name in names])
+
+def _lookup_query(identifier):
+    lowered = identifier.lower()
+    checking_first = Case(When(account_type='Checking', then=Value(0)), default=Value(1), output_field=IntegerField())
+    columns = ('pk', 'account_number', 'account_type', 'user_id', 'user__username', 'rank', 'type_rank')
+    by_number = Account.objects.filter(account_number=identifier).annotate(rank=Value(0, output_field=IntegerField()))
+    by_username = Account.objects.alias(username_lower=Lower('user__username')).filter(username_lower=lowered).annotate(
+        rank=Case(When(user__username=identifier, then=Value(1)), default=Value(2), output_field=IntegerField())
+    )
+    by_email = Account.objects.alias(email_lower=Lower('user__email')).filter(email_lower=lowered).annotate(
+        rank=Value(3, output_field=IntegerField())
+    )
+    branches = [branch.annotate(type_rank=checking_first).values_list(*columns).order_by()
+                for branch in (by_number, by_username, by_email)]
+    return branches[0].union(*branches[1:], all=True).order_by('rank', 'type_rank', 'pk')
+
+def _instance(resolved):
+    account = _deferred(Account, id=resolved.account_id, user_id=resolved.user_id,
+                        account_number=resolved.account_number, account_type=resolved.account_type)
+    account.user = _deferred(CustomUser, id=resolved.user_id, username=resolved.username)
+    return account
+
+def resolve_recipient(identifier):
+    """
+    Returns the Account identifier names, or None. Only pk, account_number,
+    account_type, user_id and user.username are loaded; other fields load
+    on access.
+    """
+    identifier = (identifier or '').strip()
+    if not identifier:
+        return None
+    resolved = _recipients.get(identifier)
+    if resolved is None:
+        row = _lookup_query(identifier).first()
+        if row is None:
+            return None
+        resolved = _Resolved(*row[:5])
+        _recipients.set(identifier, resolved)
+    return _instance(resolved)
+
+async def aresolve_recipient(identifier):
+    """Async version of resolve_recipient, for async views."""
+    identifier = (identifier or '').strip()
+    if not identifier:
+        return None
+    resolved = _recipients.get(identifier)
+    if resolved is None:
+        row = await _lookup_query(identifier).afirst()
+        if row is None:
+            return None
+        resolved = _Resolved(*row[:5])
+        _recipients.set(identifier, resolved)
+    return _instance(resolved)
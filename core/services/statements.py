@@ -0,0 +1,166 @@
+# core/services/statements.py
+"""
+Daily balance snapshots, and the statements and period totals built on them.
+
+Every completed money movement updates one DailyBalanceSnapshot per account
+it touches, in the same database transaction and while the accounts are
+still locked. A snapshot holds the day's credits, debits, entry count and
+closing balance. That makes the balance as of any date a single indexed
+lookup. Totals for a period sum at most one row per account per day, however
+many transactions the accounts have.
+
+backfill_snapshots, also run by `manage.py backfill_balance_snapshots`,
+rebuilds the snapshots from the ledger. It is for existing data, or after
+entries were written without going through core.services.transfers.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import Account, DailyBalanceSnapshot, Transaction
+
+ZERO = Decimal('0.00')
+# Bounds the CASE expressions and IN lists of one statement
+SNAPSHOT_CHUNK_SIZE = 500
+
+_MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+def _chunks(items, size=SNAPSHOT_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def record_daily_balances(day, changes):
+    """
+    Adds activity to the accounts' snapshots for day. changes maps an account
+    id to (closing_balance, credits, debits, transaction_count). The caller
+    must hold the accounts' row locks, which is what makes update-then-insert
+    safe here. Normally a single UPDATE; the first entry of an account's day
+    also inserts its row.
+    """
+    for ids in _chunks(sorted(changes)):
+        def per_account(column):
+            return Case(*[When(account_id=pk, then=Value(changes[pk][column])) for pk in ids], output_field=_MONEY)
+
+        updated = DailyBalanceSnapshot.objects.filter(account_id__in=ids, date=day).update(
+            closing_balance=per_account(0),
+            credits=F('credits') + per_account(1),
+            debits=F('debits') + per_account(2),
+            transaction_count=F('transaction_count') + Case(
+                *[When(account_id=pk, then=Value(changes[pk][3])) for pk in ids]
+            ),
+        )
+        if updated == len(ids):
+            continue
+        existing = set(DailyBalanceSnapshot.objects.filter(account_id__in=ids, date=day).values_list('account_id', flat=True))
+        DailyBalanceSnapshot.objects.bulk_create([
+            DailyBalanceSnapshot(account_id=pk, date=day, closing_balance=changes[pk][0], credits=changes[pk][1],
+                                 debits=changes[pk][2], transaction_count=changes[pk][3])
+            for pk in ids if pk not in existing
+        ])
+
+def _daily_flows(account_ids):
+    """Returns {account_id: {date: [credits, debits, count]}} from the Completed ledger."""
+    completed = Transaction.objects.filter(status='Completed').annotate(
+        day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone())
+    )
+    external_credit = Q(receiver_account__isnull=True, transaction_type__in=Transaction.EXTERNAL_CREDIT_TYPES)
+    sent = completed.filter(sender_account_id__in=account_ids).values('sender_account_id', 'day').annotate(
+        credits=Sum('amount', filter=external_credit),
+        debits=Sum('amount', filter=~external_credit),
+        count=Count('pk'),
+    ).order_by()
+    received = completed.filter(receiver_account_id__in=account_ids).values('receiver_account_id', 'day').annotate(
+        credits=Sum('amount'),
+        count=Count('pk'),
+    ).order_by()
+
+    flows = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO, 0]))
+    for row in sent:
+        day = flows[row['sender_account_id']][row['day']]
+        day[0] += row['credits'] or ZERO
+        day[1] += row['debits'] or ZERO
+        day[2] += row['count']
+    for row in received:
+        day = flows[row['receiver_account_id']][row['day']]
+        day[0] += row['credits']
+        day[2] += row['count']
+    return flows
+
+def backfill_snapshots(account_ids=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """
+    Rebuilds the snapshots of the given accounts (default: all) from the
+    Completed ledger and returns the number of rows written. Closing balances
+    are worked backwards from each account's current balance, so balances
+    that did not start at zero come out right too. Accounts are locked a
+    chunk at a time, in primary-key order, while theirs are rebuilt.
+    """
+    if account_ids is None:
+        account_ids = Account.objects.order_by('pk').values_list('pk', flat=True)
+    account_ids = sorted(account_ids)
+    written = 0
+    for ids in _chunks(account_ids, chunk_size):
+        with transaction.atomic():
+            balances = dict(
+                Account.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', 'balance')
+            )
+            flows = _daily_flows(list(balances))
+            snapshots = []
+            for account_id, balance in balances.items():
+                closing = balance
+                for day, (credits, debits, count) in sorted(flows[account_id].items(), reverse=True):
+                    snapshots.append(DailyBalanceSnapshot(
+                        account_id=account_id, date=day, closing_balance=closing,
+                        credits=credits, debits=debits, transaction_count=count,
+                    ))
+                    closing -= credits - debits
+            DailyBalanceSnapshot.objects.filter(account_id__in=list(balances)).delete()
+            DailyBalanceSnapshot.objects.bulk_create(snapshots, batch_size=2000)
+            written += len(snapshots)
+    return written
+
+def balance_as_of(account, day):
+    """Returns account's closing balance at the end of day."""
+    snapshot = DailyBalanceSnapshot.objects.filter(account=account, date__lte=day).order_by('-date').first()
+    if snapshot is not None:
+        return snapshot.closing_balance
+    # No activity up to day: the balance then is what the first active day opened with
+    first = DailyBalanceSnapshot.objects.filter(account=account).order_by('date').first()
+    return first.opening_balance if first is not None else account.balance
+
+def period_totals(account_ids, start=None, end=None):
+    """
+    Returns the credits, debits and transaction_count of the given accounts
+    between the start and end dates (inclusive, either may be None).
+    """
+    snapshots = DailyBalanceSnapshot.objects.filter(account_id__in=account_ids)
+    if start is not None:
+        snapshots = snapshots.filter(date__gte=start)
+    if end is not None:
+        snapshots = snapshots.filter(date__lte=end)
+    totals = snapshots.aggregate(credits=Sum('credits'), debits=Sum('debits'), transaction_count=Sum('transaction_count'))
+    return {
+        'credits': totals['credits'] or ZERO,
+        'debits': totals['debits'] or ZERO,
+        'transaction_count': totals['transaction_count'] or 0,
+    }
+
+def statement(account, start=None, end=None):
+    """
+    Returns the opening and closing balance and the totals of account for
+    the dates start to end (inclusive, either may be None: from its first
+    entry, up to now).
+    """
+    return {
+        'account': account,
+        'start': start,
+        'end': end,
+        'opening_balance': balance_as_of(account, start - timedelta(days=1) if start else date.min),
+        'closing_balance': balance_as_of(account, end) if end else account.balance,
+        **period_totals([account.pk], start, end),
+    }
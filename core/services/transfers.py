@@ -0,0 +1,340 @@
+# core/services/transfers.py
+"""
+The money path: every balance change and its ledger entry goes through here.
+
+Accounts are locked with SELECT ... FOR UPDATE in primary-key order, so two
+operations touching the same accounts always queue in the same order and
+cannot deadlock. Balances change through a single UPDATE using F()
+expressions that writes only the balance columns, so concurrent operations
+never overwrite each other's updates.
+
+A transfer costs a fixed number of queries: lock the accounts, update the
+balances, lock the chain head, insert the ledger entry, advance the head and
+update both accounts' daily balance snapshots (core.services.statements).
+The owners' cached read models (core.services.read_models) are invalidated
+when the transaction commits.
+
+Metrics and other side effects hook in through the transfer_completed and
+transfer_failed signals rather than by editing this module.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from ..models import Account, Transaction, ChainHead
+from ..utils import ledger_shard_for
+from .statements import record_daily_balances, ZERO
+from .read_models import invalidate_users
+
+# Sent after the database commit with ledger_entry and duration (seconds).
+transfer_completed = Signal()
+# Sent when an operation is rejected or fails, with error, transaction_type and duration.
+transfer_failed = Signal()
+
+
+class TransferError(Exception):
+    """Raised when a transfer cannot be carried out; the message is user-facing."""
+
+class InsufficientFunds(TransferError):
+    def __init__(self, message="Insufficient funds."):
+        super().__init__(message)
+
+
+# Transaction.amount and Account.balance hold 15 digits, two of them decimals
+MAX_AMOUNT = Decimal('9999999999999.99')
+
+
+def _validate_amount(amount):
+    try:
+        amount = Decimal(amount)
+    except (InvalidOperation, TypeError, ValueError):
+        raise TransferError("Invalid amount.")
+    if not amount.is_finite() or amount <= 0:
+        raise TransferError("Amount must be greater than zero.")
+    # The ledger stores two decimal places; a finer amount would move more or less money than it records
+    if amount.scaleb(2) != amount.scaleb(2).to_integral_value():
+        raise TransferError("Amounts can have at most two decimal places.")
+    if amount > MAX_AMOUNT:
+        raise TransferError("Amount is too large.")
+    return amount
+
+def _lock_balances(*accounts):
+    """
+    Locks the given accounts in primary-key order and returns {pk: balance}.
+    Raises TransferError if any of them no longer exists.
+    """
+    ids = sorted({account.pk for account in accounts})
+    balances = dict(
+        Account.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', 'balance')
+    )
+    if len(balances) != len(ids):
+        raise TransferError("Account not found.")
+    return balances
+
+def _apply(operation, transaction_type, *args, **kwargs):
+    """
+    Runs one money operation atomically and reports it to the signal hooks.
+    """
+    started = time.perf_counter()
+    try:
+        with transaction.atomic():
+            ledger_entry = operation(*args, **kwargs)
+            duration = time.perf_counter() - started
+            transaction.on_commit(lambda: transfer_completed.send(
+                sender=Transaction, ledger_entry=ledger_entry, duration=duration
+            ))
+    except Exception as error:
+        transfer_failed.send(sender=Transaction, error=error, transaction_type=transaction_type,
+                             duration=time.perf_counter() - started)
+        raise
+    return ledger_entry
+
+def _transfer(sender_account, receiver_account, amount, description, transaction_type):
+    amount = _validate_amount(amount)
+    if sender_account.pk == receiver_account.pk:
+        raise TransferError("You can't transfer money to the same account.")
+
+    balances = _lock_balances(sender_account, receiver_account)
+    if balances[sender_account.pk] < amount:
+        raise InsufficientFunds()
+
+    Account.objects.filter(pk__in=[sender_account.pk, receiver_account.pk]).update(
+        balance=Case(
+            When(pk=sender_account.pk, then=F('balance') - amount),
+            When(pk=receiver_account.pk, then=F('balance') + amount),
+        ),
+        updated_at=timezone.now(),
+    )
+    ledger_entry = Transaction.objects.create(
+        sender_account=sender_account,
+        receiver_account=receiver_account,
+        amount=amount,
+        transaction_type=transaction_type,
+        description=description,
+        status='Completed'
+    )
+
+    # Keep the caller's instances in step with the rows we just updated
+    sender_account.balance = balances[sender_account.pk] - amount
+    receiver_account.balance = balances[receiver_account.pk] + amount
+    record_daily_balances(timezone.localdate(ledger_entry.timestamp), {
+        sender_account.pk: (sender_account.balance, ZERO, amount, 1),
+        receiver_account.pk: (receiver_account.balance, amount, ZERO, 1),
+    })
+    invalidate_users([sender_account.user_id, receiver_account.user_id])
+    return ledger_entry
+
+def _adjust(account, amount, sign, description, transaction_type):
+    delta = _validate_amount(amount) * sign
+    balances = _lock_balances(account)
+    if balances[account.pk] + delta < 0:
+        raise InsufficientFunds()
+
+    Account.objects.filter(pk=account.pk).update(balance=F('balance') + delta, updated_at=timezone.now())
+    ledger_entry = Transaction.objects.create(
+        sender_account=account,
+        receiver_account=None,
+        amount=abs(delta),
+        transaction_type=transaction_type,
+        description=description,
+        status='Completed'
+    )
+
+    account.balance = balances[account.pk] + delta
+    record_daily_balances(timezone.localdate(ledger_entry.timestamp), {
+        account.pk: (account.balance, max(delta, ZERO), max(-delta, ZERO), 1),
+    })
+    invalidate_users([account.user_id])
+    return ledger_entry
+
+def transfer_funds(sender_account, receiver_account, amount, description=None, transaction_type='Transfer'):
+    """
+    Moves amount from sender_account to receiver_account and records a
+    Completed ledger transaction, all in one atomic block.
+    Raises TransferError (or InsufficientFunds) without changing anything if
+    the transfer is not allowed. Returns the created Transaction.
+    """
+    return _apply(_transfer, transaction_type, sender_account, receiver_account, amount, description, transaction_type)
+
+def deposit(account, amount, description=None, transaction_type='Deposit'):
+    """
+    Credits amount to account from outside the bank (cash, salary, opening balance).
+    Recorded as a ledger transaction with the account as sender and no receiver;
+    transaction_type must be one of Transaction.EXTERNAL_CREDIT_TYPES.
+    """
+    if transaction_type not in Transaction.EXTERNAL_CREDIT_TYPES:
+        raise ValueError(f"'{transaction_type}' is not a deposit transaction type.")
+    return _apply(_adjust, transaction_type, account, amount, 1, description, transaction_type)
+
+def withdraw(account, amount, description=None, transaction_type='Withdrawal'):
+    """
+    Debits amount from account to outside the bank. Raises InsufficientFunds
+    if the balance does not cover it.
+    """
+    if transaction_type in Transaction.EXTERNAL_CREDIT_TYPES:
+        raise ValueError(f"'{transaction_type}' is not a withdrawal transaction type.")
+    return _apply(_adjust, transaction_type, account, amount, -1, description, transaction_type)
+
+
+# --- Batch transfers (payroll and mass payouts) ---
+
+# Sent after the database commit with ledger_entries and duration (seconds).
+batch_completed = Signal()
+
+# Keeps IN (...) lists and CASE expressions within every backend's parameter limit
+BATCH_CHUNK_SIZE = 2000
+BATCH_FIELDS = ('recipient_account_number', 'amount', 'description')
+
+
+class BatchValidationError(TransferError):
+    """Raised when any line of a batch is invalid; nothing is posted. errors is a list of (line, message)."""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid line(s) in batch.")
+
+
+def _chunks(items, size=BATCH_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def read_transfer_lines(stream, fmt):
+    """
+    Parses a batch file into a list of dicts with BATCH_FIELDS keys.
+    fmt is 'csv' (with a header row) or 'json' (a list of objects).
+    Raises BatchValidationError for malformed JSON, or for items that are not objects.
+    """
+    if fmt == 'json':
+        try:
+            lines = json.load(stream)
+        except ValueError:
+            raise BatchValidationError([(0, "The file is not valid JSON.")])
+        if not isinstance(lines, list):
+            raise BatchValidationError([(0, "Expected a JSON list of transfers.")])
+        errors = [(number, "Expected a JSON object.")
+                  for number, line in enumerate(lines, start=1) if not isinstance(line, dict)]
+        if errors:
+            raise BatchValidationError(errors)
+    elif fmt == 'csv':
+        lines = list(csv.DictReader(stream))
+    else:
+        raise TransferError(f"Unsupported batch format '{fmt}'.")
+    return [{field: line.get(field) for field in BATCH_FIELDS} for line in lines]
+
+def _validate_batch(sender_account, lines):
+    """
+    Resolves every recipient with account_number__in lookups and validates amounts.
+    Returns a list of (receiver_id, amount, description) or raises BatchValidationError.
+    """
+    numbers = sorted({str(line.get('recipient_account_number') or '').strip() for line in lines})
+    accounts = {}
+    for chunk in _chunks(numbers):
+        accounts.update(Account.objects.filter(account_number__in=chunk).values_list('account_number', 'pk'))
+
+    errors, postings = [], []
+    for number, line in enumerate(lines, start=1):
+        account_number = str(line.get('recipient_account_number') or '').strip()
+        try:
+            amount = _validate_amount(line.get('amount'))
+        except TransferError as error:
+            errors.append((number, str(error)))
+            continue
+        except InvalidOperation:
+            # Decimal arithmetic beyond the context's precision; report the line rather than fail the request
+            errors.append((number, "Invalid amount."))
+            continue
+        receiver_id = accounts.get(account_number)
+        if receiver_id is None:
+            errors.append((number, f"Recipient account '{account_number}' not found."))
+        elif receiver_id == sender_account.pk:
+            errors.append((number, "You can't transfer money to the same account."))
+        else:
+            postings.append((receiver_id, amount, line.get('description') or None))
+    if not lines:
+        errors.append((0, "The batch is empty."))
+    if errors:
+        raise BatchValidationError(errors)
+    return postings
+
+def _transfer_batch(sender_account, postings, transaction_type):
+    total = sum(amount for _, amount, _ in postings)
+    credits, counts = {}, {}
+    for receiver_id, amount, _ in postings:
+        credits[receiver_id] = credits.get(receiver_id, 0) + amount
+        counts[receiver_id] = counts.get(receiver_id, 0) + 1
+
+    # Lock the sender and every recipient in one global primary-key order
+    ids = sorted(set(credits) | {sender_account.pk})
+    balances, owners = {}, set()
+    for chunk in _chunks(ids):
+        for pk, balance, user_id in (
+            Account.objects.select_for_update().filter(pk__in=chunk).order_by('pk').values_list('pk', 'balance', 'user_id')
+        ):
+            balances[pk] = balance
+            owners.add(user_id)
+    if len(balances) != len(ids):
+        raise TransferError("Account not found.")
+    if balances[sender_account.pk] < total:
+        raise InsufficientFunds()
+
+    # Rows are locked, so the new balances can be written directly in bulk
+    now = timezone.now()
+    updated = [Account(pk=pk, balance=balances[pk] + delta, updated_at=now) for pk, delta in credits.items()]
+    updated.append(Account(pk=sender_account.pk, balance=balances[sender_account.pk] - total, updated_at=now))
+    Account.objects.bulk_update(updated, ['balance', 'updated_at'], batch_size=BATCH_CHUNK_SIZE)
+
+    # Every entry shares the sender, and therefore the shard: lock its head once and chain in order
+    head = ChainHead.objects.lock(ledger_shard_for(sender_account))
+    ledger_entries = []
+    for receiver_id, amount, description in postings:
+        entry = Transaction(
+            sender_account=sender_account,
+            receiver_account_id=receiver_id,
+            amount=amount,
+            transaction_type=transaction_type,
+            description=description,
+            timestamp=now,
+            status='Completed'
+        )
+        head.link(entry)
+        ledger_entries.append(entry)
+    Transaction.objects.bulk_create(ledger_entries, batch_size=BATCH_CHUNK_SIZE)
+    head.save(update_fields=['last_hash', 'height', 'last_transaction_id', 'updated_at'])
+
+    sender_account.balance = balances[sender_account.pk] - total
+    changes = {pk: (balances[pk] + credit, credit, ZERO, counts[pk]) for pk, credit in credits.items()}
+    changes[sender_account.pk] = (sender_account.balance, ZERO, total, len(postings))
+    record_daily_balances(timezone.localdate(now), changes)
+    invalidate_users(owners)
+    return ledger_entries
+
+def transfer_batch(sender_account, lines, transaction_type='Transfer'):
+    """
+    Posts many transfers from sender_account in one atomic block.
+
+    lines are dicts with recipient_account_number, amount and optional
+    description (see read_transfer_lines). The whole batch is validated
+    first; if any line is invalid, BatchValidationError lists every
+    problem and nothing is posted. Recipients are resolved, locked and
+    credited in bulk, and the ledger entries are chained in line order and
+    written with bulk_create. Returns the created Transactions.
+    """
+    started = time.perf_counter()
+    try:
+        postings = _validate_batch(sender_account, lines)
+        with transaction.atomic():
+            ledger_entries = _transfer_batch(sender_account, postings, transaction_type)
+            duration = time.perf_counter() - started
+            transaction.on_commit(lambda: batch_completed.send(
+                sender=Transaction, ledger_entries=ledger_entries, duration=duration
+            ))
+    except Exception as error:
+        transfer_failed.send(sender=Transaction, error=error, transaction_type=transaction_type,
+                             duration=time.perf_counter() - started)
+        raise
+    return ledger_entries
@@ -1,12 +1,55 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings, skipUnlessDBFeature
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+import threading
+import io
 from django.urls import reverse
-from django.contrib.auth.models import User
-from .models import Account, Transaction
+from decimal import Decimal
+from .models import Account, Transaction, CustomUser, LedgerCheckpoint, ChainHead, LedgerCommitment, LedgerBlock
+from .utils import GENESIS_HASH, verify_ledger_integrity
+from .hashing import CURRENT_HASH_VERSION, HASHED_FIELDS, encode_transaction, hash_transaction_values
+from .audit import audit_ledger
+from .services.transfers import (
+    transfer_funds, transfer_batch, read_transfer_lines, deposit, withdraw, TransferError, InsufficientFunds,
+    BatchValidationError, batch_completed, transfer_completed, transfer_failed,
+)
+from .services import idempotency, recipients
+from .services.history import user_history, account_history, user_history_page, decode_cursor
+from .services.read_models import user_summary
+from .services.exports import aexport_statement, export_statement
+from .services.statements import ZERO, backfill_snapshots, balance_as_of, period_totals, statement
+from .models import IdempotencyKey, DailyBalanceSnapshot
+from . import chatbot, ledgerlog, loadtest, qrcodes
+from .reconciliation import reconcile_balances
+from .seeding import seed_bank
+from .serializers import AccountSerializer, TransactionSerializer, ValuesSerializerMixin
+from rest_framework import serializers
+from .merkle import merkle_root, hash_pair, verify_merkle_proof
+import base64
+import csv
 import datetime
+import decimal
+import json
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+import zipfile
+from itertools import islice
+from unittest import mock
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.utils import timezone
 
 class ViewTests(TestCase):
     def setUp(self):
-        self.user = User.objects.create_user(username='testuser', password='12345')
+        cache.clear()
+        recipients._recipients.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='12345')
         self.client = Client()
         self.checking = Account.objects.create(
             user=self.user,
@@ -24,6 +67,7 @@ class ViewTests(TestCase):
             sender_account=self.checking,
             receiver_account=self.savings,
             amount=100,
+            description='Monthly savings',
             status='Completed'
         )
 
@@ -31,8 +75,9 @@ class ViewTests(TestCase):
         self.client.login(username='testuser', password='12345')
         response = self.client.get(reverse('dashboard'))
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, 'CHK123')
-        self.assertContains(response, '$1,000.00')
+        # Balances are shown in rupees, with the Checking account's Pay Me QR code
+        self.assertContains(response, '<strong>Checking:</strong> \u20b91000.00')
+        self.assertContains(response, reverse('qr_code', args=[self.checking.pk]))
 
     def test_successful_transfer(self):
         self.client.login(username='testuser', password='12345')
@@ -49,7 +94,8 @@ class ViewTests(TestCase):
     def test_transaction_list(self):
         self.client.login(username='testuser', password='12345')
         response = self.client.get(reverse('transactions') + '?start_date=2023-01-01')
-        self.assertContains(response, self.transaction.transaction_id)
+        self.assertContains(response, 'Monthly savings')
+        self.assertContains(response, '\u20b9100.00')
 
     def test_api_transaction_detail(self):
         self.client.login(username='testuser', password='12345')
@@ -57,4 +103,1659 @@ class ViewTests(TestCase):
             reverse('api_transaction_detail', args=[str(self.transaction.transaction_id)])
         )
         self.assertEqual(response.status_code, 200)
-        self.assertIn('amount', response.json())
\ No newline at end of file
+        self.assertIn('amount', response.json())
+
+
+class LedgerVerificationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ledgeruser', password='12345')
+        self.checking = Account.objects.create(
+            user=self.user, account_type='Checking', balance=1000, account_number='LCHK1'
+        )
+        self.savings = Account.objects.create(
+            user=self.user, account_type='Savings', balance=0, account_number='LSAV1'
+        )
+
+    def _append(self, count):
+        for _ in range(count):
+            Transaction.objects.create(
+                sender_account=self.checking,
+                receiver_account=self.savings,
+                amount=Decimal('10.00'),
+                transaction_type='Transfer',
+                status='Completed'
+            )
+
+    def test_verification_writes_signed_checkpoint(self):
+        self._append(3)
+        is_valid, total_blocks, last_hash, _ = verify_ledger_integrity()
+        self.assertTrue(is_valid)
+        self.assertEqual(total_blocks, 3)
+        checkpoint = LedgerCheckpoint.objects.get()
+        self.assertEqual(checkpoint.position, 3)
+        self.assertEqual(checkpoint.last_hash, last_hash)
+        self.assertTrue(checkpoint.is_authentic())
+
+    def test_verification_resumes_from_checkpoint(self):
+        self._append(5)
+        verify_ledger_integrity()
+        self._append(2)
+        # Shard list, checkpoint lookup, anchor check, tail scan and the new checkpoint insert
+        with self.assertNumQueries(5):
+            is_valid, total_blocks, _, _ = verify_ledger_integrity()
+        self.assertTrue(is_valid)
+        self.assertEqual(total_blocks, 7)
+
+    def test_full_rescan_detects_tampering_behind_checkpoint(self):
+        self._append(3)
+        verify_ledger_integrity()
+        first = Transaction.objects.order_by('chain_position').first()
+        Transaction.objects.filter(pk=first.pk).update(amount=Decimal('99999.00'))
+        self.assertTrue(verify_ledger_integrity()[0])
+        self.assertFalse(verify_ledger_integrity(full_rescan=True)[0])
+
+    def test_forged_checkpoint_is_ignored(self):
+        self._append(2)
+        verify_ledger_integrity()
+        LedgerCheckpoint.objects.update(position=1000)
+        is_valid, total_blocks, _, _ = verify_ledger_integrity()
+        self.assertTrue(is_valid)
+        self.assertEqual(total_blocks, 2)
+
+    def test_parallel_audit_matches_sequential_verification(self):
+        self._append(5)
+        report = audit_ledger(workers=2, segment_size=2)
+        self.assertTrue(report['is_valid'])
+        self.assertEqual(report['segments'], 3)
+        self.assertEqual(report['total_blocks'], 5)
+        self.assertEqual(report['shards'][0]['last_block_hash'], verify_ledger_integrity(full_rescan=True)[2])
+
+    def test_parallel_audit_reports_broken_segment(self):
+        self._append(5)
+        fourth = Transaction.objects.order_by('chain_position')[3]
+        Transaction.objects.filter(pk=fourth.pk).update(description='tampered')
+        report = audit_ledger(workers=2, segment_size=2)
+        self.assertFalse(report['is_valid'])
+        self.assertEqual(report['failure']['segment'], 1)
+        self.assertEqual(report['failure']['offset'], 1)
+        self.assertEqual(report['failure']['transaction_id'], str(fourth.pk))
+
+
+class ChainHeadTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='chainuser', password='12345')
+        self.checking = Account.objects.create(
+            user=self.user, account_type='Checking', balance=1000, account_number='CCHK1'
+        )
+        self.savings = Account.objects.create(
+            user=self.user, account_type='Savings', balance=0, account_number='CSAV1'
+        )
+
+    def _create(self, status='Completed'):
+        return Transaction.objects.create(
+            sender_account=self.checking, receiver_account=self.savings,
+            amount=Decimal('5.00'), transaction_type='Transfer', status=status
+        )
+
+    def test_append_advances_head_without_scanning_transactions(self):
+        first = self._create()
+        # Head lock, insert, head update
+        with self.assertNumQueries(3):
+            second = self._create()
+        head = ChainHead.objects.get()
+        self.assertEqual(second.previous_block_hash, first.hash)
+        self.assertEqual((first.chain_position, second.chain_position), (1, 2))
+        self.assertEqual((head.height, head.last_hash), (2, second.hash))
+
+    def test_pending_transaction_links_but_does_not_move_head(self):
+        completed = self._create()
+        pending = self._create(status='Pending')
+        head = ChainHead.objects.get()
+        self.assertEqual(pending.previous_block_hash, completed.hash)
+        self.assertIsNone(pending.chain_position)
+        self.assertEqual(head.last_hash, completed.hash)
+
+
+class LegacyLedgerMigrationTests(TransactionTestCase):
+    """Migrates rows written by the original Transaction.save, which never hashed them, through the ledger migrations."""
+    legacy = [('core', '0003_ledgercheckpoint')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.legacy)
+        state = self.executor.loader.project_state(self.legacy)
+        user_model = state.apps.get_model('core', 'CustomUser')
+        account_model = state.apps.get_model('core', 'Account')
+        transaction_model = state.apps.get_model('core', 'Transaction')
+
+        user = user_model.objects.create(username='legacy', password='!')
+        checking = account_model.objects.create(user=user, account_type='Checking', account_number='LCHK1', balance=70)
+        other = user_model.objects.create(username='legacy2', password='!')
+        savings = account_model.objects.create(user=other, account_type='Savings', account_number='LSAV1', balance=30)
+        start = timezone.now() - datetime.timedelta(days=1)
+        for n, (amount, status) in enumerate([(100, 'Completed'), (20, 'Completed'), (5, 'Failed'), (10, 'Completed')]):
+            transaction_model.objects.create(
+                sender_account=checking if n else savings, receiver_account=checking if not n else savings,
+                amount=Decimal(amount), transaction_type='Transfer', status=status,
+                timestamp=start + datetime.timedelta(minutes=n),
+            )
+        self.assertEqual(transaction_model.objects.filter(hash__isnull=False).count(), 0)
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.executor.loader.graph.leaf_nodes('core'))
+
+    def tearDown(self):
+        # Leave the schema at the latest migration for the next test case
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('core'))
+
+    def test_legacy_rows_are_chained_and_hashed(self):
+        chain = list(Transaction.objects.filter(chain_position__isnull=False).order_by('chain_position'))
+        self.assertEqual([txn.amount for txn in chain], [Decimal('100.00'), Decimal('20.00'), Decimal('10.00')])
+        self.assertEqual(chain[0].previous_block_hash, GENESIS_HASH)
+        self.assertEqual([txn.previous_block_hash for txn in chain[1:]], [txn.hash for txn in chain[:-1]])
+        head = ChainHead.objects.get()
+        self.assertEqual((head.height, head.last_hash, head.last_transaction_id), (3, chain[-1].hash, chain[-1].pk))
+        self.assertIsNone(Transaction.objects.get(status='Failed').chain_position)
+
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, 3))
+        self.assertTrue(audit_ledger(workers=1)['is_valid'])
+        self.assertEqual(len(LedgerBlock.objects.seal(block_size=2)), 2)
+
+        transfer_funds(Account.objects.get(account_number='LCHK1'), Account.objects.get(account_number='LSAV1'),
+                       Decimal('1.00'))
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, 4))
+
+    def test_legacy_rows_verify_under_version_1(self):
+        legacy = list(Transaction.objects.filter(chain_position__isnull=False))
+        self.assertEqual({txn.hash_version for txn in legacy}, {1})
+        for txn in legacy:
+            values = [getattr(txn, field) for field in HASHED_FIELDS]
+            self.assertEqual(txn.hash, hash_transaction_values(*values))
+            self.assertNotEqual(txn.hash, hash_transaction_values(*values[:-1], 2))
+
+        txn = transfer_funds(Account.objects.get(account_number='LCHK1'), Account.objects.get(account_number='LSAV1'),
+                             Decimal('1.00'))
+        self.assertEqual(txn.hash_version, CURRENT_HASH_VERSION)
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, 4))
+
+        # A legacy row edited after the migration no longer verifies
+        Transaction.objects.filter(pk=legacy[0].pk).update(amount=Decimal('999.00'))
+        self.assertFalse(verify_ledger_integrity(full_rescan=True)[0])
+
+
+class ConcurrentChainAppendTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_appends_do_not_fork_the_chain(self):
+        user = CustomUser.objects.create_user(username='racer', password='12345')
+        sender = Account.objects.create(user=user, account_type='Checking', account_number='RCHK1')
+        receiver = Account.objects.create(user=user, account_type='Savings', account_number='RSAV1')
+
+        def append():
+            try:
+                for _ in range(10):
+                    Transaction.objects.create(
+                        sender_account=sender, receiver_account=receiver,
+                        amount=Decimal('1.00'), transaction_type='Transfer', status='Completed'
+                    )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=append) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(ChainHead.objects.get().height, 80)
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, 80))
+
+
+    @skipUnlessDBFeature('has_select_for_update')
+    @override_settings(LEDGER_SHARDS=2, LEDGER_SHARD_FUNCTION='core.tests.shard_by_account_type')
+    def test_concurrent_first_appends_create_one_shard_head(self):
+        user = CustomUser.objects.create_user(username='pioneer', password='12345')
+        sender = Account.objects.create(user=user, account_type='Savings', account_number='NSAV1')
+        receiver = Account.objects.create(user=user, account_type='Checking', account_number='NCHK1')
+        self.assertFalse(ChainHead.objects.filter(shard=1).exists())
+        start = threading.Barrier(8)
+        errors = []
+
+        def append():
+            try:
+                start.wait()
+                Transaction.objects.create(
+                    sender_account=sender, receiver_account=receiver,
+                    amount=Decimal('1.00'), transaction_type='Transfer', status='Completed'
+                )
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=append) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(ChainHead.objects.get(shard=1).height, 8)
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, 8))
+
+def shard_by_account_type(account, shard_count):
+    return 1 if account.account_type == 'Savings' else 0
+
+
+class LedgerShardingTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='sharduser', password='12345')
+        self.checking = Account.objects.create(
+            user=self.user, account_type='Checking', balance=1000, account_number='SCHK1'
+        )
+        self.savings = Account.objects.create(
+            user=self.user, account_type='Savings', balance=1000, account_number='SSAV1'
+        )
+
+    def _transfer(self, sender, receiver):
+        return Transaction.objects.create(
+            sender_account=sender, receiver_account=receiver,
+            amount=Decimal('1.00'), transaction_type='Transfer', status='Completed'
+        )
+
+    @override_settings(LEDGER_SHARDS=2, LEDGER_SHARD_FUNCTION='core.tests.shard_by_account_type')
+    def test_each_shard_keeps_its_own_chain(self):
+        a = self._transfer(self.checking, self.savings)
+        b = self._transfer(self.savings, self.checking)
+        c = self._transfer(self.checking, self.savings)
+        self.assertEqual((a.shard, b.shard, c.shard), (0, 1, 0))
+        self.assertEqual(c.previous_block_hash, a.hash)
+        self.assertEqual((b.chain_position, c.chain_position), (1, 2))
+
+        is_valid, total_blocks, root, _ = verify_ledger_integrity(full_rescan=True)
+        self.assertTrue(is_valid)
+        self.assertEqual(total_blocks, 3)
+        self.assertEqual(root, merkle_root([c.hash, b.hash]))
+        self.assertEqual(LedgerCheckpoint.objects.filter(shard=1).get().last_hash, b.hash)
+
+        report = audit_ledger(workers=1)
+        self.assertTrue(report['is_valid'])
+        self.assertEqual(report['shards'][1]['total_blocks'], 1)
+
+    @override_settings(LEDGER_SHARDS=2, LEDGER_SHARD_FUNCTION='core.tests.shard_by_account_type')
+    def test_commitment_binds_all_shard_heads(self):
+        a = self._transfer(self.checking, self.savings)
+        b = self._transfer(self.savings, self.checking)
+        commitment = LedgerCommitment.objects.commit()
+        self.assertEqual(commitment.merkle_root, hash_pair(a.hash, b.hash))
+        self.assertEqual(commitment.shard_heads['1'], {'height': 1, 'hash': b.hash})
+
+    def test_merkle_root_promotes_odd_node(self):
+        leaves = ['11' * 32, '22' * 32, '33' * 32]
+        self.assertEqual(merkle_root(leaves), hash_pair(hash_pair(leaves[0], leaves[1]), leaves[2]))
+        self.assertEqual(merkle_root(leaves[:1]), leaves[0])
+
+
+class LedgerBlockTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='blockuser', password='12345')
+        self.client = Client()
+        self.checking = Account.objects.create(
+            user=self.user, account_type='Checking', balance=1000, account_number='BCHK1'
+        )
+        self.savings = Account.objects.create(
+            user=self.user, account_type='Savings', balance=0, account_number='BSAV1'
+        )
+        self.transactions = [
+            Transaction.objects.create(
+                sender_account=self.checking, receiver_account=self.savings,
+                amount=Decimal('3.00'), transaction_type='Transfer', status='Completed'
+            )
+            for _ in range(5)
+        ]
+
+    def test_seal_groups_chain_into_linked_blocks(self):
+        blocks = LedgerBlock.objects.seal(block_size=2)
+        self.assertEqual([(b.first_position, b.last_position) for b in blocks], [(1, 2), (3, 4), (5, 5)])
+        self.assertEqual(blocks[1].previous_root, blocks[0].merkle_root)
+        self.assertEqual(blocks[2].merkle_root, self.transactions[4].hash)
+        self.assertEqual(LedgerBlock.objects.seal(block_size=2), [])
+
+    def test_inclusion_proof_verifies_against_block_root(self):
+        LedgerBlock.objects.seal(block_size=8)
+        for txn in self.transactions:
+            proof = LedgerBlock.inclusion_proof(txn)
+            self.assertLessEqual(len(proof['proof']), 3)
+            self.assertTrue(verify_merkle_proof(txn.hash, proof['proof'], proof['block']['merkle_root']))
+        proof = LedgerBlock.inclusion_proof(self.transactions[2])
+        self.assertFalse(verify_merkle_proof(self.transactions[1].hash, proof['proof'], proof['block']['merkle_root']))
+
+    def test_api_transaction_proof(self):
+        self.client.login(username='blockuser', password='12345')
+        url = reverse('api_transaction_proof', args=[str(self.transactions[3].transaction_id)])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        LedgerBlock.objects.seal()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['index'], 3)
+        self.assertTrue(verify_merkle_proof(data['hash'], data['proof'], data['block']['merkle_root']))
+
+    def test_seal_rejects_unhashed_transaction(self):
+        Transaction.objects.filter(pk=self.transactions[2].pk).update(hash=None)
+        with self.assertRaisesMessage(ValueError, 'chain position 3 has no hash'):
+            LedgerBlock.objects.seal(block_size=2)
+        with self.assertRaises(CommandError):
+            call_command('seal_ledger_blocks', stdout=io.StringIO())
+        self.assertEqual(LedgerBlock.objects.count(), 0)
+
+
+class ConcurrentSealTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_sealers_take_turns(self):
+        user = CustomUser.objects.create_user(username='sealer', password='12345')
+        sender = Account.objects.create(user=user, account_type='Checking', account_number='SCHK1')
+        receiver = Account.objects.create(user=user, account_type='Savings', account_number='SSAV1')
+        for _ in range(20):
+            Transaction.objects.create(
+                sender_account=sender, receiver_account=receiver,
+                amount=Decimal('1.00'), transaction_type='Transfer', status='Completed'
+            )
+
+        start = threading.Barrier(4)
+        errors = []
+
+        def seal():
+            try:
+                start.wait()
+                LedgerBlock.objects.seal(block_size=3)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=seal) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        blocks = list(LedgerBlock.objects.order_by('height'))
+        self.assertEqual([block.height for block in blocks], list(range(1, 8)))
+        self.assertEqual(blocks[-1].last_position, 20)
+
+
+class TransferServiceTests(TestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', password='12345')
+        self.bob = CustomUser.objects.create_user(username='bob', password='12345')
+        self.source = Account.objects.create(
+            user=self.alice, account_type='Checking', balance=Decimal('100.00'), account_number='TA1'
+        )
+        self.target = Account.objects.create(
+            user=self.bob, account_type='Checking', balance=Decimal('0.00'), account_number='TB1'
+        )
+
+    def test_transfer_moves_funds_and_records_ledger_entry(self):
+        txn = transfer_funds(self.source, self.target, Decimal('40.00'), description='rent')
+        self.source.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual((self.source.balance, self.target.balance), (Decimal('60.00'), Decimal('40.00')))
+        self.assertEqual((txn.status, txn.description, txn.chain_position), ('Completed', 'rent', 1))
+
+    def test_rejected_transfers_change_nothing(self):
+        with self.assertRaises(InsufficientFunds):
+            transfer_funds(self.source, self.target, Decimal('100.01'))
+        with self.assertRaises(TransferError):
+            transfer_funds(self.source, self.target, Decimal('-5'))
+        with self.assertRaises(TransferError):
+            transfer_funds(self.source, self.source, Decimal('5'))
+        self.source.refresh_from_db()
+        self.assertEqual(self.source.balance, Decimal('100.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_sub_paisa_amounts_are_rejected(self):
+        for operation, args in ((transfer_funds, (self.source, self.target)), (deposit, (self.source,)),
+                                (withdraw, (self.source,))):
+            with self.assertRaisesMessage(TransferError, 'at most two decimal places'):
+                operation(*args, Decimal('0.005'))
+        # Trailing zeros are still whole paise
+        transfer_funds(self.source, self.target, Decimal('1.500'))
+        self.assertEqual(Transaction.objects.get().amount, Decimal('1.50'))
+        self.source.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual((self.source.balance, self.target.balance), (Decimal('98.50'), Decimal('1.50')))
+
+    def test_transfer_runs_fixed_number_of_queries(self):
+        transfer_funds(self.source, self.target, Decimal('1.00'))
+        # Savepoint, lock accounts, update balances, lock head, insert entry, advance head,
+        # update today's balance snapshots, release
+        with self.assertNumQueries(8):
+            transfer_funds(self.source, self.target, Decimal('1.00'))
+
+    def test_account_deposit_and_withdraw_use_the_ledger(self):
+        self.assertTrue(self.target.deposit(Decimal('25.00')))
+        self.assertFalse(self.target.withdraw(Decimal('30.00')))
+        self.assertTrue(self.target.withdraw(Decimal('5.00')))
+        self.assertFalse(self.target.deposit(0))
+        self.target.refresh_from_db()
+        self.assertEqual(self.target.balance, Decimal('20.00'))
+        self.assertEqual(
+            list(Transaction.objects.order_by('chain_position').values_list('transaction_type', 'amount', 'receiver_account')),
+            [('Deposit', Decimal('25.00'), None), ('Withdrawal', Decimal('5.00'), None)]
+        )
+
+    def test_metrics_hooks_receive_completed_and_failed_transfers(self):
+        completed, failed = [], []
+        def on_completed(sender, ledger_entry, duration, **kwargs):
+            completed.append((ledger_entry.amount, duration >= 0))
+        def on_failed(sender, error, transaction_type, **kwargs):
+            failed.append((type(error), transaction_type))
+        transfer_completed.connect(on_completed)
+        transfer_failed.connect(on_failed)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                transfer_funds(self.source, self.target, Decimal('2.00'))
+            with self.assertRaises(InsufficientFunds):
+                transfer_funds(self.source, self.target, Decimal('1000.00'))
+        finally:
+            transfer_completed.disconnect(on_completed)
+            transfer_failed.disconnect(on_failed)
+        self.assertEqual(completed, [(Decimal('2.00'), True)])
+        self.assertEqual(failed, [(InsufficientFunds, 'Transfer')])
+
+    def test_api_transfer(self):
+        client = Client()
+        client.login(username='alice', password='12345')
+        url = reverse('api_transfer')
+        response = client.post(url, {'from_account': self.source.pk, 'recipient_account_number': 'TB1',
+                                      'amount': '30.00', 'description': 'api'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['receiver_account']['account_number'], 'TB1')
+        response = client.post(url, {'from_account': self.target.pk, 'recipient_account_number': 'TA1',
+                                      'amount': '1.00'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {'from_account': self.source.pk, 'recipient_account_number': 'TB1',
+                                      'amount': '500.00'}, content_type='application/json')
+        self.assertEqual(response.json(), {'error': 'Insufficient funds.'})
+        self.source.refresh_from_db()
+        self.assertEqual(self.source.balance, Decimal('70.00'))
+
+    def test_balance_update_writes_only_balance_columns(self):
+        with CaptureQueriesContext(connection) as captured:
+            transfer_funds(self.source, self.target, Decimal('1.00'))
+        updates = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('UPDATE "core_account"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('account_number', updates[0])
+        self.assertNotIn('"user_id"', updates[0])
+
+
+class ConcurrentTransferTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_hot_account_keeps_exact_balance_under_concurrent_transfers(self):
+        hot_owner = CustomUser.objects.create_user(username='hot', password='12345')
+        hot = Account.objects.create(user=hot_owner, account_type='Checking',
+                                     balance=Decimal('1000.00'), account_number='HOT1')
+        others = []
+        for i in range(8):
+            owner = CustomUser.objects.create_user(username=f'peer{i}', password='12345')
+            others.append(Account.objects.create(user=owner, account_type='Checking',
+                                                 balance=Decimal('1000.00'), account_number=f'PEER{i}'))
+
+        def hammer(peer):
+            try:
+                for _ in range(25):
+                    # Alternate directions so lock ordering is exercised both ways
+                    transfer_funds(peer, hot, Decimal('1.00'))
+                    transfer_funds(hot, peer, Decimal('0.50'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hammer, args=(peer,)) for peer in others]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        hot.refresh_from_db()
+        self.assertEqual(hot.balance, Decimal('1000.00') + 8 * 25 * Decimal('0.50'))
+        for peer in others:
+            peer.refresh_from_db()
+            self.assertEqual(peer.balance, Decimal('1000.00') - 25 * Decimal('0.50'))
+        self.assertEqual(Transaction.objects.count(), 8 * 25 * 2)
+        self.assertTrue(verify_ledger_integrity(full_rescan=True)[0])
+
+
+class BatchTransferTests(TestCase):
+    def setUp(self):
+        self.employer = CustomUser.objects.create_user(username='employer', password='12345')
+        self.payroll = Account.objects.create(
+            user=self.employer, account_type='Checking', balance=Decimal('1000.00'), account_number='PAY1'
+        )
+        self.staff = []
+        for i in range(3):
+            user = CustomUser.objects.create_user(username=f'staff{i}', password='12345')
+            self.staff.append(Account.objects.create(
+                user=user, account_type='Checking', balance=Decimal('0.00'), account_number=f'STAFF{i}'
+            ))
+
+    def test_batch_posts_balances_and_chained_entries(self):
+        lines = read_transfer_lines(io.StringIO(
+            "recipient_account_number,amount,description\n"
+            "STAFF0,100.00,June\nSTAFF1,200.50,June\nSTAFF0,50.00,Bonus\n"
+        ), 'csv')
+        # Resolve recipients, savepoint, lock, bulk balance update, head lock, bulk insert, head update,
+        # first snapshots of the day (update, find existing, insert), release
+        with self.assertNumQueries(11):
+            entries = transfer_batch(self.payroll, lines, transaction_type='Salary')
+        self.assertEqual(len(entries), 3)
+        balances = dict(Account.objects.values_list('account_number', 'balance'))
+        self.assertEqual(balances['PAY1'], Decimal('649.50'))
+        self.assertEqual(balances['STAFF0'], Decimal('150.00'))
+        self.assertEqual(balances['STAFF1'], Decimal('200.50'))
+        chain = list(Transaction.objects.order_by('chain_position'))
+        self.assertEqual([t.description for t in chain], ['June', 'June', 'Bonus'])
+        self.assertEqual({t.transaction_type for t in chain}, {'Salary'})
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, 3))
+
+    def test_invalid_lines_reject_whole_batch(self):
+        lines = [
+            {'recipient_account_number': 'STAFF0', 'amount': '10.00'},
+            {'recipient_account_number': 'NOPE', 'amount': '10.00'},
+            {'recipient_account_number': 'STAFF1', 'amount': '-1'},
+            {'recipient_account_number': 'STAFF2', 'amount': '1.001'},
+            {'recipient_account_number': 'STAFF2', 'amount': '1e30'},
+            {'recipient_account_number': 'STAFF2', 'amount': '1e13'},
+        ]
+        with self.assertRaises(BatchValidationError) as raised:
+            transfer_batch(self.payroll, lines)
+        self.assertEqual([line for line, _ in raised.exception.errors], [2, 3, 4, 5, 6])
+        self.assertEqual(raised.exception.errors[3:], [(5, "Amount is too large."), (6, "Amount is too large.")])
+        with mock.patch('core.services.transfers._validate_amount', side_effect=decimal.InvalidOperation):
+            with self.assertRaises(BatchValidationError) as raised:
+                transfer_batch(self.payroll, lines[:1])
+        self.assertEqual(raised.exception.errors, [(1, "Invalid amount.")])
+        with self.assertRaises(InsufficientFunds):
+            transfer_batch(self.payroll, [{'recipient_account_number': 'STAFF0', 'amount': '1000.01'}])
+        self.assertFalse(Transaction.objects.exists())
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.balance, Decimal('1000.00'))
+
+    def test_api_transfer_batch(self):
+        client = Client()
+        client.login(username='employer', password='12345')
+        response = client.post(reverse('api_transfer_batch'), {
+            'from_account': self.payroll.pk,
+            'transaction_type': 'Salary',
+            'transfers': [{'recipient_account_number': f'STAFF{i}', 'amount': '10.00'} for i in range(3)],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['posted'], response.json()['total']), (3, '30.00'))
+
+        upload = io.BytesIO(b"recipient_account_number,amount\nSTAFF0,1.00\nMISSING,1.00\n")
+        upload.name = 'payroll.csv'
+        response = client.post(reverse('api_transfer_batch'), {'from_account': self.payroll.pk, 'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['lines'][0]['line'], 2)
+
+        upload = io.BytesIO(b'[{"recipient_account_number": "STAFF0", "amount": "1.00"}, 1, [2]]')
+        upload.name = 'payroll.json'
+        response = client.post(reverse('api_transfer_batch'), {'from_account': self.payroll.pk, 'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([line['line'] for line in response.json()['lines']], [2, 3])
+        with self.assertRaises(BatchValidationError) as raised:
+            read_transfer_lines(io.StringIO('[{"amount": '), 'json')
+        self.assertEqual(raised.exception.errors, [(0, "The file is not valid JSON.")])
+
+        response = client.post(reverse('api_transfer_batch'), {
+            'from_account': self.payroll.pk,
+            'transfers': [{'recipient_account_number': 'STAFF0', 'amount': '1e30'}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['lines'], [{'line': 1, 'error': 'Amount is too large.'}])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        idempotency._responses.clear()
+        recipients._recipients.clear()
+        self.alice = CustomUser.objects.create_user(username='alice', password='12345')
+        self.bob = CustomUser.objects.create_user(username='bob', password='12345')
+        self.checking = Account.objects.create(
+            user=self.alice, account_type='Checking', balance=Decimal('100.00'), account_number='IA1'
+        )
+        self.savings = Account.objects.create(
+            user=self.alice, account_type='Savings', balance=Decimal('0.00'), account_number='IA2'
+        )
+        self.client = Client()
+        self.client.login(username='alice', password='12345')
+
+    def _chatbot_transfer(self, key, amount='10.00'):
+        return self.client.post(reverse('chatbot_execute_transfer'),
+                                {'amount': amount, 'from_type': 'Checking', 'to_type': 'Savings'},
+                                content_type='application/json', headers={'Idempotency-Key': key})
+
+    def test_retried_chatbot_transfer_posts_once(self):
+        first = self._chatbot_transfer('retry-1')
+        self.assertEqual(first.json()['status'], 'success')
+        # A replay served from the database touches neither accounts nor the ledger
+        idempotency._responses.clear()
+        with self.assertNumQueries(3): # Session, user, stored response
+            replay = self._chatbot_transfer('retry-1')
+        self.assertEqual((replay.json(), replay['Idempotent-Replayed']), (first.json(), 'true'))
+        # Once cached in-process, a replay needs no idempotency query at all
+        with self.assertNumQueries(2):
+            self._chatbot_transfer('retry-1')
+        self.checking.refresh_from_db()
+        self.assertEqual(self.checking.balance, Decimal('90.00'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        self._chatbot_transfer('retry-2')
+        self.assertEqual(self._chatbot_transfer('retry-2', amount='20.00').status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_rejected_transfer_is_not_stored(self):
+        self.assertEqual(self._chatbot_transfer('retry-3', amount='500.00').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self._chatbot_transfer('retry-3', amount='500.00').status_code, 400)
+
+    def test_keys_are_scoped_per_user(self):
+        self._chatbot_transfer('shared')
+        Account.objects.create(user=self.bob, account_type='Checking', balance=Decimal('50.00'), account_number='IB1')
+        Account.objects.create(user=self.bob, account_type='Savings', balance=Decimal('0.00'), account_number='IB2')
+        self.client.login(username='bob', password='12345')
+        response = self._chatbot_transfer('shared')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_transfer_form_replays_redirect(self):
+        data = {'from_account': self.checking.pk, 'recipient': 'IA2', 'amount': '5.00', 'note': '',
+                'idempotency_key': 'form-1'}
+        first = self.client.post(reverse('transfer'), data)
+        replay = self.client.post(reverse('transfer'), data)
+        self.assertEqual((first.status_code, replay.status_code), (302, 302))
+        self.assertEqual(replay['Location'], first['Location'])
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(self.client.post(reverse('transfer'), dict(data, amount='1000.00', idempotency_key='form-2')).status_code, 400)
+
+    def test_api_transfer_accepts_key_in_body(self):
+        body = {'from_account': self.checking.pk, 'recipient_account_number': 'IA2', 'amount': '7.00',
+                'idempotency_key': 'api-1'}
+        first = self.client.post(reverse('api_transfer'), body, content_type='application/json')
+        replay = self.client.post(reverse('api_transfer'), body, content_type='application/json')
+        self.assertEqual((first.status_code, replay.status_code), (201, 201))
+        self.assertEqual(replay.json()['transaction_id'], first.json()['transaction_id'])
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+    def test_retried_batch_posts_once(self):
+        Account.objects.create(user=self.bob, account_type='Checking', account_number='IB1')
+        body = {'from_account': self.checking.pk, 'transfers': [
+            {'recipient_account_number': 'IA2', 'amount': '10.00'},
+            {'recipient_account_number': 'IB1', 'amount': '15.00'},
+        ]}
+        first = self.client.post(reverse('api_transfer_batch'), body, content_type='application/json',
+                                 headers={'Idempotency-Key': 'payroll-1'})
+        replay = self.client.post(reverse('api_transfer_batch'), body, content_type='application/json',
+                                  headers={'Idempotency-Key': 'payroll-1'})
+        self.assertEqual((first.status_code, replay.status_code), (201, 201))
+        self.assertEqual((replay.json(), replay['Idempotent-Replayed']), (first.json(), 'true'))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_retried_batch_file_is_fingerprinted_by_content(self):
+        Account.objects.create(user=self.bob, account_type='Checking', account_number='IB1')
+
+        def upload(contents):
+            batch = io.BytesIO(contents)
+            batch.name = 'payroll.csv'
+            return self.client.post(reverse('api_transfer_batch'), {
+                'from_account': self.checking.pk, 'file': batch, 'idempotency_key': 'payroll-2',
+            })
+
+        rows = b"recipient_account_number,amount\nIA2,10.00\nIB1,15.00\n"
+        first, replay = upload(rows), upload(rows)
+        self.assertEqual((first.status_code, replay.status_code), (201, 201))
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        # Same name and size, different payee: not a retry
+        self.assertEqual(upload(rows.replace(b'IB1,15', b'IA2,15')).status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.checking.refresh_from_db()
+        self.assertEqual(self.checking.balance, Decimal('75.00'))
+
+    def test_api_clients_without_a_session_get_idempotency(self):
+        client = Client()
+        credentials = {'Authorization': 'Basic ' + base64.b64encode(b'alice:12345').decode('ascii'),
+                       'Idempotency-Key': 'basic-1'}
+        body = {'from_account': self.checking.pk, 'recipient_account_number': 'IA2', 'amount': '7.00'}
+        first = client.post(reverse('api_transfer'), body, content_type='application/json', headers=credentials)
+        replay = client.post(reverse('api_transfer'), body, content_type='application/json', headers=credentials)
+        self.assertEqual((first.status_code, replay.status_code), (201, 201))
+        self.assertEqual((replay.json(), replay['Idempotent-Replayed']), (first.json(), 'true'))
+        self.assertEqual(replay['Content-Type'], 'application/json')
+        self.assertEqual(IdempotencyKey.objects.get().user, self.alice)
+
+        batch = {'from_account': self.checking.pk, 'transfers': [{'recipient_account_number': 'IA2', 'amount': '3.00'}]}
+        credentials['Idempotency-Key'] = 'basic-2'
+        for _ in range(2):
+            response = client.post(reverse('api_transfer_batch'), batch, content_type='application/json',
+                                   headers=credentials)
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_retries_post_once(self):
+        user = CustomUser.objects.create_user(username='racer', password='12345')
+        Account.objects.create(user=user, account_type='Checking', balance=Decimal('100.00'), account_number='RC1')
+        Account.objects.create(user=user, account_type='Savings', balance=Decimal('0.00'), account_number='RC2')
+        idempotency._responses.clear()
+        responses = []
+
+        def retry():
+            try:
+                client = Client()
+                client.login(username='racer', password='12345')
+                responses.append(client.post(
+                    reverse('chatbot_execute_transfer'),
+                    {'amount': '10.00', 'from_type': 'Checking', 'to_type': 'Savings'},
+                    content_type='application/json', headers={'Idempotency-Key': 'race'},
+                ))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=retry) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({r.json()['status'] for r in responses}, {'success'})
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Account.objects.get(account_number='RC1').balance, Decimal('90.00'))
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username='alice', password='12345')
+        bob = CustomUser.objects.create_user(username='bob', password='12345')
+        self.checking = Account.objects.create(
+            user=self.alice, account_type='Checking', balance=Decimal('100.00'), account_number='HA1'
+        )
+        self.savings = Account.objects.create(
+            user=self.alice, account_type='Savings', balance=Decimal('0.00'), account_number='HA2'
+        )
+        self.other = Account.objects.create(
+            user=bob, account_type='Checking', balance=Decimal('100.00'), account_number='HB1'
+        )
+        self.entries = [
+            transfer_funds(self.checking, self.savings, Decimal('10.00')), # Between Alice's own accounts
+            transfer_funds(self.other, self.checking, Decimal('20.00')),
+            transfer_funds(self.checking, self.other, Decimal('5.00')),
+            deposit(self.savings, Decimal('1.00')),
+            transfer_funds(self.other, self.savings, Decimal('2.00')),
+        ]
+        transfer_funds(self.other, Account.objects.create(
+            user=bob, account_type='Savings', balance=Decimal('0.00'), account_number='HB2'
+        ), Decimal('3.00')) # Not Alice's
+
+    def test_user_history_lists_each_entry_once_newest_first(self):
+        for limit in (None, 3):
+            history = list(user_history(self.alice, limit=limit))
+            expected = self.entries[::-1][:limit]
+            self.assertEqual([t.pk for t in history], [t.pk for t in expected])
+        directions = [t.direction for t in user_history(self.alice)]
+        self.assertEqual(directions, ['credit', 'credit', 'debit', 'credit', 'debit'])
+
+    def test_account_history_and_period_filter(self):
+        history = account_history(self.savings)
+        self.assertEqual([t.pk for t in history], [self.entries[4].pk, self.entries[3].pk, self.entries[0].pk])
+        self.assertEqual({t.direction for t in history}, {'credit'})
+        start = self.entries[2].timestamp
+        self.assertEqual(user_history(self.alice, start=start).count(), 3)
+
+    def test_history_queries_use_union(self):
+        with CaptureQueriesContext(connection) as captured:
+            list(user_history(self.alice, limit=5))
+        self.assertIn('UNION ALL', captured.captured_queries[-1]['sql'])
+        self.assertNotIn(' OR ', captured.captured_queries[-1]['sql'])
+
+    def test_history_views_render(self):
+        client = Client()
+        client.login(username='alice', password='12345')
+        response = client.get(reverse('transactions'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['transactions']), 5)
+        response = client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['recent_transactions']), 5)
+
+    def test_keyset_pages_walk_history_without_gaps(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = user_history_page(self.alice, cursor, page_size=2)
+            seen += [t.pk for t in page]
+            if cursor is None:
+                break
+        self.assertEqual(seen, [t.pk for t in self.entries[::-1]])
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+
+    def test_keyset_page_breaks_timestamp_ties(self):
+        # Entries sharing one timestamp still page in a stable order, split across page boundaries
+        Transaction.objects.filter(pk__in=[t.pk for t in self.entries]).update(timestamp=self.entries[0].timestamp)
+        first, cursor = user_history_page(self.alice, page_size=3)
+        second, _ = user_history_page(self.alice, cursor, page_size=3)
+        self.assertEqual(sorted(t.pk for t in first + second), sorted(t.pk for t in self.entries))
+
+    def test_api_transaction_history_follows_next_cursor(self):
+        client = Client()
+        client.login(username='alice', password='12345')
+        url, seen = reverse('api_transaction_history') + '?page_size=3', []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['transaction_id'] for row in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(seen, [str(t.pk) for t in self.entries[::-1]])
+        self.assertEqual(client.get(reverse('api_transaction_history') + '?cursor=bogus').status_code, 400)
+
+
+class BalanceSnapshotTests(TestCase):
+    def setUp(self):
+        owner = CustomUser.objects.create_user(username='saver', password='12345')
+        self.checking = Account.objects.create(
+            user=owner, account_type='Checking', balance=Decimal('500.00'), account_number='SN1'
+        )
+        self.savings = Account.objects.create(
+            user=owner, account_type='Savings', balance=Decimal('0.00'), account_number='SN2'
+        )
+
+    def _move_to(self, day):
+        """Re-dates every ledger entry and snapshot to day, as if they had been posted then."""
+        Transaction.objects.update(timestamp=timezone.make_aware(datetime.datetime.combine(day, datetime.time(12))))
+        DailyBalanceSnapshot.objects.update(date=day)
+
+    def test_transfers_maintain_daily_snapshots(self):
+        transfer_funds(self.checking, self.savings, Decimal('100.00'))
+        transfer_funds(self.savings, self.checking, Decimal('30.00'))
+        deposit(self.savings, Decimal('5.00'))
+        today = timezone.localdate()
+        snapshots = {s.account_id: s for s in DailyBalanceSnapshot.objects.filter(date=today)}
+        checking, savings = snapshots[self.checking.pk], snapshots[self.savings.pk]
+        self.assertEqual((checking.closing_balance, checking.credits, checking.debits, checking.transaction_count),
+                         (Decimal('430.00'), Decimal('30.00'), Decimal('100.00'), 2))
+        self.assertEqual((savings.closing_balance, savings.credits, savings.debits, savings.transaction_count),
+                         (Decimal('75.00'), Decimal('105.00'), Decimal('30.00'), 3))
+        self.assertEqual(checking.opening_balance, Decimal('500.00'))
+
+    def test_backfill_rebuilds_snapshots_from_ledger(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        transfer_funds(self.checking, self.savings, Decimal('100.00'))
+        self._move_to(yesterday)
+        transfer_funds(self.savings, self.checking, Decimal('40.00'))
+        withdraw(self.checking, Decimal('10.00'))
+        live = sorted(DailyBalanceSnapshot.objects.filter(date=timezone.localdate()).values_list(
+            'account_id', 'closing_balance', 'credits', 'debits', 'transaction_count'))
+        DailyBalanceSnapshot.objects.all().delete()
+
+        self.assertEqual(backfill_snapshots(), 4)
+        rebuilt = sorted(DailyBalanceSnapshot.objects.filter(date=timezone.localdate()).values_list(
+            'account_id', 'closing_balance', 'credits', 'debits', 'transaction_count'))
+        self.assertEqual(rebuilt, live)
+        self.assertEqual(balance_as_of(self.checking, yesterday), Decimal('400.00'))
+        self.assertEqual(balance_as_of(self.checking, yesterday - datetime.timedelta(days=1)), Decimal('500.00'))
+        report = statement(self.checking, yesterday, timezone.localdate())
+        self.assertEqual((report['opening_balance'], report['closing_balance']), (Decimal('500.00'), Decimal('430.00')))
+        self.assertEqual((report['credits'], report['debits'], report['transaction_count']),
+                         (Decimal('40.00'), Decimal('110.00'), 3))
+
+    def test_period_totals_and_list_view(self):
+        transfer_funds(self.checking, self.savings, Decimal('20.00'))
+        deposit(self.checking, Decimal('7.00'))
+        totals = period_totals([self.checking.pk], start=timezone.localdate())
+        self.assertEqual((totals['credits'], totals['debits'], totals['transaction_count']),
+                         (Decimal('7.00'), Decimal('20.00'), 2))
+        client = Client()
+        client.login(username='saver', password='12345')
+        # Session, user, history (account ids, page), accounts; then per account its opening balance (latest
+        # snapshot before the period, none here, so the first one's opening) and the period totals
+        with self.assertNumQueries(11):
+            response = client.get(reverse('transactions'))
+        checking, savings = response.context['statements']
+        # The transfer between the user's own accounts is out of one and into the other, not both in each
+        self.assertEqual((checking['opening_balance'], checking['credits'], checking['debits'], checking['closing_balance']),
+                         (Decimal('500.00'), Decimal('7.00'), Decimal('20.00'), Decimal('487.00')))
+        self.assertEqual((savings['credits'], savings['debits'], savings['closing_balance']),
+                         (Decimal('20.00'), ZERO, savings['account'].balance))
+        self.assertContains(response, 'Money out: ₹20.00')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+# The test runner is a single process, so its local-memory cache sees every invalidation
+@override_settings(READ_MODEL_CACHE_LOCAL=True)
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(username='dash', password='12345')
+        other = CustomUser.objects.create_user(username='payee', password='12345')
+        self.checking = Account.objects.create(
+            user=self.owner, account_type='Checking', balance=Decimal('700.00'), account_number='DB1'
+        )
+        self.savings = Account.objects.create(
+            user=self.owner, account_type='Savings', balance=Decimal('300.00'), account_number='DB2'
+        )
+        self.payee = Account.objects.create(user=other, account_type='Checking', balance=Decimal('0.00'), account_number='DB3')
+        for _ in range(4):
+            transfer_funds(self.checking, self.payee, Decimal('10.00'))
+            transfer_funds(self.checking, self.savings, Decimal('5.00'))
+        self.client.login(username='dash', password='12345')
+
+    def _chat(self, message):
+        return self.client.post(reverse('chatbot_api'), json.dumps({'message': message}),
+                                content_type='application/json').json()['response']
+
+    def test_dashboard_runs_fixed_number_of_queries(self):
+        # Session, user, accounts, recent history; then only session and user while cached
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_balance'], Decimal('960.00'))
+        self.assertEqual(response.context['checking_balance'], Decimal('640.00'))
+        self.assertEqual(response.context['savings_balance'], Decimal('320.00'))
+        self.assertEqual(response.context['checking_account_id'], self.checking.pk)
+        self.assertEqual(len(response.context['recent_transactions']), 5)
+        self.assertContains(response, reverse('qr_code', args=[self.checking.pk]))
+
+    def test_dashboard_without_accounts(self):
+        CustomUser.objects.create_user(username='empty', password='12345')
+        self.client.login(username='empty', password='12345')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_balance'], Decimal('0.00'))
+        self.assertIsNone(response.context['checking_account_id'])
+
+    def test_transfers_invalidate_every_owner(self):
+        self.assertEqual(user_summary(self.payee.user)['total_balance'], Decimal('40.00'))
+        self.client.get(reverse('dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            transfer_funds(self.checking, self.payee, Decimal('100.00'))
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['checking_balance'], Decimal('540.00'))
+        self.assertEqual(response.context['recent_transactions'][0].amount, Decimal('100.00'))
+        self.assertEqual(user_summary(self.payee.user)['total_balance'], Decimal('140.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transfer_batch(self.savings, [{'recipient_account_number': 'DB3', 'amount': '20.00'}])
+        self.assertEqual(user_summary(self.payee.user)['total_balance'], Decimal('160.00'))
+        self.assertIn('Savings: ₹300.00', self._chat("what's my balance"))
+
+    def test_account_saves_invalidate_owner(self):
+        self.assertIn('Checking: ₹640.00', self._chat("what's my balance"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Account.objects.create(user=self.owner, account_type='Investment', account_number='DB4')
+        self.assertIn('Investment: ₹0.00', self._chat("what's my balance"))
+        with self.captureOnCommitCallbacks(execute=True):
+            withdraw(self.checking, Decimal('40.00'))
+        self.assertIn('₹40.00 (Withdrawal)', self._chat('show my history'))
+
+
+    @override_settings(READ_MODEL_CACHE_LOCAL=False)
+    def test_process_local_cache_is_bypassed(self):
+        self.client.get(reverse('dashboard'))
+        # The invalidation never runs here, as for a transfer another worker served
+        transfer_funds(self.checking, self.payee, Decimal('100.00'))
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['checking_balance'], Decimal('540.00'))
+        self.assertIn('Checking: ₹540.00', self._chat("what's my balance"))
+
+class QRCodeTests(TestCase):
+    def setUp(self):
+        qrcodes._images.clear()
+        owner = CustomUser.objects.create_user(username='qr', password='12345')
+        stranger = CustomUser.objects.create_user(username='stranger', password='12345')
+        self.account = Account.objects.create(user=owner, account_type='Checking', account_number='QR1')
+        self.other = Account.objects.create(user=stranger, account_type='Checking', account_number='QR2')
+        self.client.login(username='qr', password='12345')
+        self.url = reverse('qr_code', args=[self.account.pk])
+
+    def test_rendered_once_then_revalidated(self):
+        with mock.patch('core.qrcodes.render_qr_png', wraps=qrcodes.render_qr_png) as render:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertTrue(first.content.startswith(b'\x89PNG'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(first['ETag'], qrcodes.png_etag(first.content))
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'bank.example.com'])
+    def test_payload_includes_host(self):
+        local = self.client.get(self.url)
+        other_host = self.client.get(self.url, HTTP_HOST='bank.example.com')
+        self.assertNotEqual(local['ETag'], other_host['ETag'])
+
+    def test_other_users_account_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('qr_code', args=[self.other.pk])).status_code, 404)
+
+    def test_disk_store_survives_memory_eviction(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(QR_CACHE_DIR=directory):
+            first = self.client.get(self.url)
+            self.assertEqual(len(os.listdir(directory)), 1)
+            qrcodes._images.clear()
+            with mock.patch('core.qrcodes.render_qr_png') as render:
+                second = self.client.get(self.url)
+            render.assert_not_called()
+        self.assertEqual(second.content, first.content)
+
+
+class GenerateQRCodesCommandTests(TestCase):
+    def setUp(self):
+        owner = CustomUser.objects.create_user(username='merchant', password='12345')
+        Account.objects.create(user=owner, account_type='Checking', account_number='M1')
+        Account.objects.create(user=owner, account_type='Savings', account_number='M2')
+
+    def _generate(self, output, *args):
+        out = io.StringIO()
+        call_command('generate_qr_codes', output, '--base-url', 'https://bank.example.com', '--workers', '1',
+                     *args, stdout=out)
+        return out.getvalue()
+
+    def test_directory_output_is_resumable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = self._generate(directory, '--png-sizes', '4,10')
+            self.assertIn('for 2 accounts (6 files)', output)
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['M1-10.png', 'M1-4.png', 'M1.svg', 'M2-10.png', 'M2-4.png', 'M2.svg'])
+            with open(os.path.join(directory, 'M1-10.png'), 'rb') as f:
+                self.assertEqual(f.read(), qrcodes.render_qr_png('https://bank.example.com' + reverse('pay_me', args=['M1'])))
+            os.remove(os.path.join(directory, 'M2.svg'))
+            output = self._generate(directory, '--png-sizes', '4,10')
+            self.assertIn('for 1 accounts (3 files)', output)
+            self.assertIn('skipped 1 already done', output)
+
+    def test_zip_output_with_filters(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, 'codes.zip')
+            self._generate(archive, '--account-type', 'checking', '--no-svg')
+            self.assertIn('skipped 1', self._generate(archive, '--no-svg'))
+            with zipfile.ZipFile(archive) as codes:
+                self.assertEqual(sorted(codes.namelist()),
+                                 ['M1-10.png', 'M1-20.png', 'M1-4.png', 'M2-10.png', 'M2-20.png', 'M2-4.png'])
+
+
+    def test_resumed_zip_has_no_duplicate_members(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, 'codes.zip')
+            # An interrupted run that got through only part of M1's files
+            qrcodes.ZipStore(archive).write([('M1-4.png', b'partial')])
+            self.assertIn('for 2 accounts', self._generate(archive, '--png-sizes', '4,10'))
+            with zipfile.ZipFile(archive) as codes:
+                names = codes.namelist()
+                self.assertEqual(sorted(names), ['M1-10.png', 'M1-4.png', 'M1.svg', 'M2-10.png', 'M2-4.png', 'M2.svg'])
+                self.assertIsNone(codes.testzip())
+
+class ChatbotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        recipients._recipients.clear()
+        self.user = CustomUser.objects.create_user(username='chatter', password='12345')
+        payee = CustomUser.objects.create_user(username='jithu', password='12345')
+        Account.objects.create(user=self.user, account_type='Checking', balance=Decimal('50.00'), account_number='CB1')
+        Account.objects.create(user=payee, account_type='Checking', account_number='CB2')
+        self.client.login(username='chatter', password='12345')
+
+    def _chat(self, message):
+        return self.client.post(reverse('chatbot_api'), json.dumps({'message': message}),
+                                content_type='application/json').json()
+
+    def test_intents(self):
+        transfer = self._chat('Transfer ₹100.50 from checking to Savings')
+        self.assertEqual(transfer['type'], 'confirmation')
+        self.assertEqual({k: v for k, v in transfer['details'].items() if k != 'idempotency_key'},
+                         {'amount': '100.50', 'from_type': 'Checking', 'to_type': 'Savings'})
+        self.assertEqual(self._chat('move 5 from savings to savings')['response'],
+                         "You can't transfer money to the same account.")
+        self.assertEqual(self._chat('please pay 20 to Jithu')['details']['recipient_account_number'], 'CB2')
+        self.assertIn("can't pay yourself", self._chat('send 20 to chatter')['response'])
+        self.assertIn("couldn't find", self._chat('pay 20 to nobody')['response'])
+        self.assertIn('Checking: ₹50.00', self._chat('hi, what is my balance?')['response'])
+        self.assertIn("don't have any recent transactions", self._chat('show history')['response'])
+        self.assertIn('Hello, chatter', self._chat('Hello')['response'])
+        self.assertEqual(self._chat('what can you do')['response'], chatbot.FALLBACK_RESPONSE)
+
+    def test_registered_intents_are_routed_by_priority(self):
+        with mock.patch.object(chatbot, 'INTENTS', list(chatbot.INTENTS)), mock.patch.object(chatbot, '_router', None):
+            @chatbot.intent('rates', r'(?P<amount>\d+) rates?', keywords=('rate',), priority=25)
+            def rates(request, match):
+                return {'response': f"Rates for {match['amount']}"}
+
+            self.assertEqual(self._chat('hi, 10 rates please')['response'], 'Rates for 10')
+            # pay (priority 20) still comes first
+            self.assertEqual(self._chat('pay 10 to jithu, 10 rates')['type'], 'confirmation')
+        self.assertEqual(self._chat('10 rates')['response'], chatbot.FALLBACK_RESPONSE)
+
+    def test_router_without_intents(self):
+        self.assertEqual(chatbot.IntentRouter([]).match('hello'), (None, None))
+
+
+class RecipientResolverTests(TestCase):
+    def setUp(self):
+        recipients._recipients.clear()
+        self.maya = CustomUser.objects.create_user(username='Maya', email='Maya@Example.com', password='12345')
+        self.savings = Account.objects.create(user=self.maya, account_type='Savings', account_number='RS1')
+        self.checking = Account.objects.create(user=self.maya, account_type='Checking', account_number='RS2')
+        self.lower = CustomUser.objects.create_user(username='maya', password='12345')
+        self.lower_account = Account.objects.create(user=self.lower, account_type='Savings', account_number='RS3')
+
+    def test_resolution_order(self):
+        self.assertEqual(recipients.resolve_recipient('RS1').pk, self.savings.pk)
+        # Exact-case username beats a case-insensitive one; Checking is preferred within a user
+        self.assertEqual(recipients.resolve_recipient('Maya').pk, self.checking.pk)
+        self.assertEqual(recipients.resolve_recipient('maya').pk, self.lower_account.pk)
+        self.assertEqual(recipients.resolve_recipient('MAYA').pk, self.checking.pk)
+        self.assertEqual(recipients.resolve_recipient(' maya@example.COM ').pk, self.checking.pk)
+        self.assertIsNone(recipients.resolve_recipient('nobody'))
+        self.assertIsNone(recipients.resolve_recipient(''))
+
+    def test_single_query_then_cached(self):
+        with CaptureQueriesContext(connection) as captured:
+            account = recipients.resolve_recipient('MAYA')
+        self.assertEqual(len(captured), 1)
+        self.assertIn('UNION ALL', captured[0]['sql'])
+        self.assertIn('LOWER(', captured[0]['sql'].upper())
+        with self.assertNumQueries(0):
+            cached = recipients.resolve_recipient('MAYA')
+            self.assertEqual((cached.pk, cached.account_number, cached.user.username), (self.checking.pk, 'RS2', 'Maya'))
+        self.assertEqual(account.balance, Decimal('0.00')) # Deferred, read fresh
+
+    def test_transfer_resolves_usernames(self):
+        payer = CustomUser.objects.create_user(username='payer', password='12345')
+        source = Account.objects.create(user=payer, account_type='Checking', balance=Decimal('50.00'), account_number='RS4')
+        self.client.login(username='payer', password='12345')
+        response = self.client.post(reverse('transfer'), {
+            'from_account': source.pk, 'recipient': 'MAYA', 'amount': '20.00', 'note': '', 'idempotency_key': 'r-1',
+        })
+        self.assertRedirects(response, reverse('dashboard'))
+        self.checking.refresh_from_db()
+        self.assertEqual(self.checking.balance, Decimal('20.00'))
+
+
+class StatementExportTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='merchant', password='12345')
+        self.checking = Account.objects.create(user=self.user, account_type='Checking', account_number='EX1')
+        self.savings = Account.objects.create(user=self.user, account_type='Savings', account_number='EX2')
+        customer = CustomUser.objects.create_user(username='customer', password='12345')
+        self.customer = Account.objects.create(user=customer, account_type='Checking', account_number='EX3')
+        self.entries = [
+            deposit(self.checking, Decimal('100.00')),
+            transfer_funds(self.checking, self.savings, Decimal('30.00')),
+            deposit(self.customer, Decimal('50.00')),
+            transfer_funds(self.customer, self.checking, Decimal('20.00')),
+            transfer_funds(self.savings, self.customer, Decimal('5.00')),
+        ]
+        Transaction.objects.filter(pk=self.entries[0].pk).update(timestamp=timezone.now() - datetime.timedelta(days=40))
+
+    def _csv(self, text):
+        return list(csv.DictReader(io.StringIO(text)))
+
+    def test_csv_is_oldest_first_with_direction(self):
+        rows = self._csv(''.join(export_statement([self.checking.pk], 'csv', chunk_size=1)))
+        self.assertEqual([row['transaction_id'] for row in rows],
+                         [str(self.entries[i].pk) for i in (0, 1, 3)])
+        self.assertEqual([row['direction'] for row in rows], ['credit', 'debit', 'credit'])
+        self.assertEqual(rows[1]['receiver_account'], 'EX2')
+        self.assertEqual(rows[0]['receiver_account'], '')
+
+    def test_jsonl_covers_every_account_of_the_user(self):
+        lines = ''.join(export_statement([self.checking.pk, self.savings.pk], 'jsonl')).splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['transaction_id'] for record in records],
+                         [str(self.entries[i].pk) for i in (0, 1, 3, 4)])
+        self.assertEqual(records[1]['amount'], '30.00')
+        with self.assertRaises(ValueError):
+            export_statement([self.checking.pk], 'xml')
+
+    def test_view_streams_the_users_accounts(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_statement'), {'start_date': timezone.localdate().isoformat()})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="statement-merchant-', response['Content-Disposition'])
+        rows = self._csv(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual([row['transaction_id'] for row in rows], [str(self.entries[i].pk) for i in (1, 3, 4)])
+
+        response = self.client.get(reverse('export_statement'), {'account': self.savings.pk, 'format': 'jsonl'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        self.assertEqual(self.client.get(reverse('export_statement'), {'account': self.customer.pk}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_statement'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_statement'), {'account': 'EX1'}).status_code, 400)
+
+    async def test_view_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('export_statement'), {'format': 'jsonl'})
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        records = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual([record['transaction_id'] for record in records],
+                         [str(self.entries[i].pk) for i in (0, 1, 3, 4)])
+
+    async def test_async_export_fetches_one_chunk_at_a_time(self):
+        chunks = aexport_statement([self.checking.pk], 'csv', chunk_size=1)
+        with mock.patch('core.services.exports.islice', wraps=islice) as fetches:
+            self.assertEqual(await anext(chunks), 'transaction_id,timestamp,transaction_type,direction,amount,'
+                                                  'status,sender_account,receiver_account,description\r\n')
+            self.assertEqual(fetches.call_count, 0)
+            self.assertIn(str(self.entries[0].pk), await anext(chunks))
+            self.assertEqual(fetches.call_count, 1)
+            self.assertEqual(len([chunk async for chunk in chunks]), 2)
+            # One fetch per row, and a last one that finds nothing left
+            self.assertEqual(fetches.call_count, 4)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_statement', '--account', 'EX3', stdout=out)
+        self.assertEqual(len(self._csv(out.getvalue())), 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'merchant.jsonl')
+            call_command('export_statement', '--user', 'merchant', '--format', 'jsonl', '--output', path,
+                         '--start-date', timezone.localdate().isoformat(), stdout=io.StringIO())
+            with open(path) as f:
+                self.assertEqual(len(f.read().splitlines()), 3)
+        with self.assertRaises(CommandError):
+            call_command('export_statement', '--user', 'nobody', stdout=io.StringIO())
+
+
+class SerializerFastPathTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='rest', password='12345', email='rest@example.com')
+        stranger = CustomUser.objects.create_user(username='stranger', password='12345')
+        self.checking = Account.objects.create(user=self.user, account_type='Checking', account_number='RF1')
+        self.savings = Account.objects.create(user=self.user, account_type='Savings', account_number='RF2')
+        self.other = Account.objects.create(user=stranger, account_type='Checking', account_number='RF3')
+        self.entries = [
+            deposit(self.checking, Decimal('100.00')),
+            transfer_funds(self.checking, self.savings, Decimal('12.50')),
+            transfer_funds(self.checking, self.other, Decimal('7.25')),
+        ]
+        self.theirs = deposit(self.other, Decimal('1.00'))
+
+    def test_values_rows_match_the_serializer(self):
+        serializer = TransactionSerializer()
+        transactions = Transaction.objects.filter(pk__in=[entry.pk for entry in self.entries]).order_by('timestamp')
+        with self.assertNumQueries(1):
+            fast = serializer.from_values(transactions.values(*serializer.values_fields()))
+        with self.assertNumQueries(1):
+            slow = TransactionSerializer(transactions.select_related('sender_account', 'receiver_account'),
+                                         many=True).data
+        self.assertEqual(json.dumps(fast), json.dumps(slow))
+        self.assertIsNone(fast[0]['receiver_account'])
+        self.assertEqual(fast[1]['receiver_account'], {'account_number': 'RF2', 'account_type': 'Savings'})
+
+        accounts = Account.objects.filter(user=self.user).order_by('pk')
+        account_serializer = AccountSerializer()
+        self.assertEqual(json.dumps(account_serializer.from_values(accounts.values(*account_serializer.values_fields()))),
+                         json.dumps(AccountSerializer(accounts, many=True).data))
+
+    def test_unsupported_fields_are_refused(self):
+        class Described(ValuesSerializerMixin, serializers.ModelSerializer):
+            sender_account = serializers.StringRelatedField()
+
+            class Meta:
+                model = Transaction
+                fields = ['sender_account']
+        with self.assertRaises(TypeError):
+            Described().values_fields()
+
+    def test_viewsets(self):
+        self.assertEqual(self.client.get(reverse('api-account-list')).status_code, 403)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3): # session, user, accounts
+            accounts = self.client.get(reverse('api-account-list')).json()
+        self.assertEqual([account['account_number'] for account in accounts], ['RF1', 'RF2'])
+        self.assertEqual(accounts[0]['user']['email'], 'rest@example.com')
+        self.assertEqual(self.client.get(reverse('api-account-detail', args=[self.other.pk])).status_code, 404)
+
+        # Transactions are served by the async history views, with the same fast path
+        seen, url = [], reverse('api_transaction_history') + '?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            seen += [entry['transaction_id'] for entry in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [str(entry.pk) for entry in reversed(self.entries)])
+        detail = self.client.get(reverse('api_transaction_detail', args=[self.entries[2].pk])).json()
+        self.assertEqual(detail['amount'], '7.25')
+        self.assertEqual(self.client.get(reverse('api_transaction_detail', args=[self.theirs.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_transaction_history'), {'cursor': 'nope'}).status_code, 400)
+
+
+class HashFormatTests(TestCase):
+    ARGS = (uuid.UUID('12345678-1234-5678-1234-567812345678'), 7, None, Decimal('10.50'), 'Deposit', None,
+            datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc), '0' * 64, 'Completed')
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='hashuser', password='12345')
+        self.checking = Account.objects.create(user=user, account_type='Checking', balance=1000, account_number='HF1')
+        self.savings = Account.objects.create(user=user, account_type='Savings', balance=0, account_number='HF2')
+
+    def _append(self, count):
+        return [Transaction.objects.create(sender_account=self.checking, receiver_account=self.savings,
+                                           amount=Decimal('10.00'), transaction_type='Transfer', status='Completed')
+                for _ in range(count)]
+
+    def test_formats_are_stable(self):
+        # Golden values: changing either means every stored hash of that version stops verifying
+        self.assertEqual(hash_transaction_values(*self.ARGS, 1),
+                         '93cd285ff07b7c719756c9b369c1f019a5301f8f99e4251d6b1cd4eeae835657')
+        self.assertEqual(hash_transaction_values(*self.ARGS, 2),
+                         '87c7de9ed9b94d1406521c1200b7787a314dda736f42b6334fce0e72ed45d777')
+        with self.assertRaises(ValueError):
+            hash_transaction_values(*self.ARGS, 99)
+
+    def test_binary_format_keeps_fields_apart(self):
+        # NULL and empty text, and a shifted boundary between two texts, encode differently
+        self.assertNotEqual(encode_transaction(*self.ARGS[:5], '', *self.ARGS[6:]), encode_transaction(*self.ARGS))
+        shifted = list(self.ARGS)
+        shifted[4], shifted[5] = 'Deposi', 'tx'
+        self.assertNotEqual(encode_transaction(*shifted), encode_transaction(*self.ARGS[:5], 'x', *self.ARGS[6:]))
+        with self.assertRaises(ValueError):
+            encode_transaction(*self.ARGS[:3], Decimal('1.005'), *self.ARGS[4:])
+
+    def test_v1_rows_stay_verifiable_beside_v2_rows(self):
+        # Rewrite the first rows as they were hashed before the binary format
+        previous = GENESIS_HASH
+        for txn in self._append(3):
+            txn.previous_block_hash, txn.hash_version = previous, 1
+            txn.hash = txn._calculate_hash()
+            Transaction.objects.filter(pk=txn.pk).update(previous_block_hash=previous, hash_version=1, hash=txn.hash)
+            previous = txn.hash
+        ChainHead.objects.update(last_hash=previous)
+        new = self._append(2)
+        self.assertEqual([txn.hash_version for txn in new], [CURRENT_HASH_VERSION] * 2)
+        self.assertEqual(new[0].previous_block_hash, previous)
+
+        self.assertTrue(verify_ledger_integrity(full_rescan=True)[0])
+        self.assertTrue(audit_ledger(workers=1, segment_size=2)['is_valid'])
+        # A row cannot be passed off under another format
+        Transaction.objects.filter(pk=new[0].pk).update(hash_version=1)
+        self.assertFalse(verify_ledger_integrity(full_rescan=True)[0])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        recipients._recipients.clear()
+        self.user = CustomUser.objects.create_user(username='async', password='12345')
+        stranger = CustomUser.objects.create_user(username='outsider', password='12345')
+        self.checking = Account.objects.create(
+            user=self.user, account_type='Checking', balance=Decimal('80.00'), account_number='AS1'
+        )
+        self.other = Account.objects.create(
+            user=stranger, account_type='Checking', balance=Decimal('80.00'), account_number='AS2'
+        )
+        self.mine = transfer_funds(self.checking, self.other, Decimal('30.00'))
+        self.theirs = withdraw(self.other, Decimal('1.00'))
+
+    async def test_read_apis(self):
+        await self.async_client.aforce_login(self.user)
+        balances = (await self.async_client.get(reverse('api_balances'))).json()
+        self.assertEqual(balances, {'total_balance': '50.00',
+                                    'accounts': [{'id': self.checking.pk, 'account_type': 'Checking', 'balance': '50.00'}]})
+        detail = await self.async_client.get(reverse('api_transaction_detail', args=[self.mine.pk]))
+        self.assertEqual(detail.json()['receiver_account'], {'account_number': 'AS2', 'account_type': 'Checking'})
+        missing = await self.async_client.get(reverse('api_transaction_detail', args=[self.theirs.pk]))
+        self.assertEqual(missing.status_code, 404)
+        history = (await self.async_client.get(reverse('api_transaction_history'))).json()
+        self.assertEqual([entry['transaction_id'] for entry in history['results']], [str(self.mine.pk)])
+        self.assertEqual((await self.async_client.post(reverse('api_balances'))).status_code, 405)
+
+    async def test_chatbot(self):
+        await self.async_client.aforce_login(self.user)
+
+        async def chat(message):
+            response = await self.async_client.post(reverse('chatbot_api'), {'message': message},
+                                                    content_type='application/json')
+            return response.json()
+        self.assertIn('Checking: ₹50.00', (await chat('my balance'))['response'])
+        self.assertEqual((await chat('pay 5 to outsider'))['details']['recipient_account_number'], 'AS2')
+        self.assertIn('(Transfer)', (await chat('history please'))['response'])
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse('api_balances'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_load_test_sessions_are_logged_in(self):
+        user_ids, sessions = loadtest.create_sessions(2)
+        session_key, csrf_token, peer = sessions[0]
+        client = Client(enforce_csrf_checks=True)
+        client.cookies['sessionid'] = session_key
+        client.cookies['csrftoken'] = csrf_token
+        response = client.post(reverse('chatbot_api'), {'message': f'pay 1 to {peer}'},
+                               content_type='application/json', HTTP_X_CSRFTOKEN=csrf_token)
+        self.assertEqual(response.json()['details']['recipient_account_number'],
+                         Account.objects.get(user__username=peer).account_number)
+        loadtest.delete_sessions(user_ids)
+        self.assertFalse(CustomUser.objects.filter(pk__in=user_ids).exists())
+
+
+class LedgerLogTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        user = CustomUser.objects.create_user(username='logger', password='12345')
+        payee = CustomUser.objects.create_user(username='payee', password='12345')
+        self.checking = Account.objects.create(user=user, account_type='Checking', account_number='LL1')
+        self.savings = Account.objects.create(user=user, account_type='Savings', account_number='LL2')
+        self.payee = Account.objects.create(user=payee, account_type='Checking', account_number='LL3')
+        # CoreConfig.ready only connects the receivers when LEDGER_LOG_DIR is set at startup
+        ledgerlog.connect_receivers()
+        self.addCleanup(transfer_completed.disconnect, dispatch_uid='core.ledgerlog')
+        self.addCleanup(batch_completed.disconnect, dispatch_uid='core.ledgerlog')
+
+    def _logged(self, operation, *args, **kwargs):
+        with override_settings(LEDGER_LOG_DIR=self.directory), self.captureOnCommitCallbacks(execute=True):
+            return operation(*args, **kwargs)
+
+    def assertBalancesMatch(self, report):
+        balances = dict(Account.objects.values_list('pk', 'balance'))
+        # Accounts the log never mentions have not moved since the start
+        self.assertEqual({pk: report['balances'].get(pk, 0) for pk in balances}, balances)
+
+    def _heads(self):
+        return {head.shard: {'height': head.height, 'last_hash': head.last_hash} for head in ChainHead.objects.all()}
+
+    def test_receivers_connect_only_with_a_log_directory(self):
+        config = apps.get_app_config('core')
+        self.assertTrue(transfer_completed.disconnect(dispatch_uid='core.ledgerlog'))
+        with self.settings(LEDGER_LOG_DIR=None):
+            config.ready()
+        self.assertFalse(transfer_completed.disconnect(dispatch_uid='core.ledgerlog'))
+        with self.settings(LEDGER_LOG_DIR=self.directory):
+            config.ready()
+        self.assertTrue(transfer_completed.disconnect(dispatch_uid='core.ledgerlog'))
+
+    def test_append_locks_with_msvcrt_without_fcntl(self):
+        msvcrt = mock.Mock(LK_LOCK=1, LK_UNLCK=0)
+        with mock.patch.dict(sys.modules, {'fcntl': None, 'msvcrt': msvcrt}):
+            self._logged(deposit, self.checking, Decimal('5.00'))
+        self.assertEqual([call.args[1:] for call in msvcrt.locking.call_args_list], [(1, 1), (0, 1)])
+        self.assertEqual(ledgerlog.replay_ledger(self.directory)['transactions'], 1)
+
+    @override_settings(LEDGER_LOG_SEGMENT_RECORDS=3)
+    def test_replay_recomputes_balances_and_chain(self):
+        self._logged(deposit, self.checking, Decimal('500.00'))
+        self._logged(transfer_funds, self.checking, self.savings, Decimal('120.50'), description='\u20b9 rent ' * 30)
+        self._logged(withdraw, self.savings, Decimal('20.25'))
+        self._logged(transfer_batch, self.checking, [
+            {'recipient_account_number': 'LL3', 'amount': '10.00'},
+            {'recipient_account_number': 'LL2', 'amount': '5.00', 'description': 'split'},
+        ])
+
+        report = ledgerlog.replay_ledger(self.directory)
+        self.assertTrue(report['is_valid'], report['failure'])
+        self.assertEqual(report['transactions'], 5)
+        self.assertBalancesMatch(report)
+        self.assertEqual(report['shards'], self._heads())
+        # The long description spilled into continuation records, and the log rolled over into new segments
+        self.assertGreater(report['records'], 5)
+        self.assertEqual(len(ledgerlog.LedgerLog(self.directory).segments()), -(-report['records'] // 3))
+
+        output = io.StringIO()
+        call_command('replay_ledger', directory=self.directory, compare=True, stdout=output)
+        self.assertIn('Every database balance matches the log.', output.getvalue())
+
+    def test_only_committed_transfers_are_logged(self):
+        with self.assertRaises(InsufficientFunds):
+            self._logged(withdraw, self.checking, Decimal('1.00'))
+        with self.assertRaises(RuntimeError), override_settings(LEDGER_LOG_DIR=self.directory):
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                deposit(self.checking, Decimal('50.00'))
+                raise RuntimeError
+        self.assertEqual(ledgerlog.LedgerLog(self.directory).segments(), [])
+        with self.settings(LEDGER_LOG_DIR=None), self.captureOnCommitCallbacks(execute=True):
+            deposit(self.checking, Decimal('50.00'))
+        self.assertEqual(ledgerlog.LedgerLog(self.directory).segments(), [])
+
+    def test_entries_may_arrive_out_of_chain_order(self):
+        entries = [deposit(self.checking, Decimal('100.00'))]
+        entries += [transfer_funds(self.checking, self.payee, Decimal('10.00')) for _ in range(3)]
+        log = ledgerlog.LedgerLog(self.directory)
+        for entry in (entries[2], entries[0], entries[3], entries[1]):
+            log.append([entry])
+        report = ledgerlog.replay_ledger(self.directory)
+        self.assertTrue(report['is_valid'], report['failure'])
+        self.assertBalancesMatch(report)
+
+    def test_missing_and_tampered_entries_fail(self):
+        entries = [deposit(self.checking, Decimal('100.00'))]
+        entries += [transfer_funds(self.checking, self.payee, Decimal('10.00')) for _ in range(2)]
+        ledgerlog.LedgerLog(self.directory).append([entries[0], entries[2]])
+        report = ledgerlog.replay_ledger(self.directory)
+        self.assertFalse(report['is_valid'])
+        self.assertIn('missing chain position 2', report['failure']['reason'])
+
+        ledgerlog.LedgerLog(self.directory).append([entries[1]])
+        self.assertTrue(ledgerlog.replay_ledger(self.directory)['is_valid'])
+        (_, path), = ledgerlog.LedgerLog(self.directory).segments()
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        # Raise the first transfer's amount and re-seal the record: only the hash gives it away
+        record = bytearray(data[ledgerlog.RECORD_SIZE * 2:ledgerlog.RECORD_SIZE * 3])
+        record[45:53] = (100000).to_bytes(8, 'big')
+        data[ledgerlog.RECORD_SIZE * 2:ledgerlog.RECORD_SIZE * 3] = ledgerlog._seal(bytes(record[:-4]))
+        with open(path, 'wb') as f:
+            f.write(data)
+        report = ledgerlog.replay_ledger(self.directory)
+        self.assertFalse(report['is_valid'])
+        self.assertEqual(report['failure']['sequence'], 2)
+        self.assertIn('hash mismatch', report['failure']['reason'])
+
+        # Any other change to a record fails its checksum
+        data[ledgerlog.RECORD_SIZE + 50] ^= 1
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.assertIn('fails its checksum', ledgerlog.replay_ledger(self.directory)['failure']['reason'])
+        with self.assertRaises(CommandError):
+            call_command('replay_ledger', directory=self.directory, stdout=io.StringIO())
+
+    def test_seed_starts_a_log_on_existing_history(self):
+        deposit(self.checking, Decimal('300.00'))
+        early = transfer_funds(self.checking, self.payee, Decimal('25.00'))
+        # An entry logged before the seed is superseded by it
+        ledgerlog.LedgerLog(self.directory).append([early])
+        call_command('replay_ledger', directory=self.directory, seed=True, stdout=io.StringIO())
+        self._logged(transfer_funds, self.payee, self.savings, Decimal('5.00'))
+        self._logged(withdraw, self.checking, Decimal('75.00'))
+
+        report = ledgerlog.replay_ledger(self.directory)
+        self.assertTrue(report['is_valid'], report['failure'])
+        self.assertEqual(report['seeded_at'], 1)
+        self.assertEqual(report['transactions'], 2)
+        self.assertBalancesMatch(report)
+        self.assertEqual(report['shards'], self._heads())
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.accounts = [
+            Account.objects.create(user=CustomUser.objects.create_user(username=f'reconciler{i}', password='12345'),
+                                   account_type='Checking', account_number=f'RC{i}')
+            for i in range(3)
+        ]
+
+    def test_balances_posted_through_the_ledger_reconcile(self):
+        first, second, third = self.accounts
+        deposit(first, Decimal('100.29'))
+        deposit(second, Decimal('0.07'), transaction_type='Salary')
+        transfer_funds(first, second, Decimal('40.10'))
+        withdraw(second, Decimal('0.29'))
+        transfer_batch(first, [{'recipient_account_number': 'RC2', 'amount': '0.01'},
+                               {'recipient_account_number': 'RC1', 'amount': '9.99'}])
+        report = reconcile_balances(chunk_size=2)
+        self.assertEqual(report['mismatches'], [])
+        self.assertEqual((report['accounts'], report['transactions']), (3, 6))
+
+        output = io.StringIO()
+        call_command('reconcile_balances', stdout=output)
+        self.assertIn('Every account balance matches', output.getvalue())
+
+    def test_reports_mismatched_accounts(self):
+        first, second, third = self.accounts
+        deposit(first, Decimal('50.00'))
+        Account.objects.filter(pk=first.pk).update(balance=Decimal('50.01'))
+        Account.objects.filter(pk=third.pk).update(balance=Decimal('-3.00'))
+        # Failed transactions never moved money
+        Transaction.objects.create(sender_account=second, receiver_account=third, amount=Decimal('5.00'),
+                                   transaction_type='Transfer', status='Failed')
+
+        report = reconcile_balances(chunk_size=1)
+        self.assertEqual(report['mismatches'], [(third.pk, -300, 0), (first.pk, 5001, 5000)])
+        output = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 account balances do not match'):
+            call_command('reconcile_balances', stdout=output)
+        self.assertIn('RC2', output.getvalue())
+
+
+class SeedBankTests(TestCase):
+    def test_seeded_bank_is_consistent(self):
+        report = seed_bank(6, 300, days=10, password='seeded-pass', seed=7)
+        self.assertEqual(report['users'], 6)
+        self.assertEqual(report['transactions'], report['accounts'] + 300)
+        self.assertEqual(Transaction.objects.count(), report['transactions'])
+        self.assertEqual(Account.objects.filter(balance__lt=0).count(), 0)
+
+        # Balances are the net of the ledger, the chain verifies, and the snapshots match a backfill
+        self.assertEqual(reconcile_balances()['mismatches'], [])
+        self.assertEqual(verify_ledger_integrity(full_rescan=True)[:2], (True, report['transactions']))
+        fields = ('account_id', 'date', 'closing_balance', 'credits', 'debits', 'transaction_count')
+        seeded = set(DailyBalanceSnapshot.objects.values_list(*fields))
+        backfill_snapshots()
+        self.assertEqual(set(DailyBalanceSnapshot.objects.values_list(*fields)), seeded)
+
+        username = CustomUser.objects.filter(username__startswith=f"customer_{report['tag']}_").first().username
+        self.assertTrue(self.client.login(username=username, password='seeded-pass'))
+
+    def test_seed_makes_the_history_reproducible(self):
+        def history(tag):
+            return list(Transaction.objects.filter(sender_account__account_number__startswith=f'SB{tag}')
+                        .order_by('chain_position').values_list('amount', 'transaction_type', 'description'))
+        first, second = seed_bank(3, 50, seed=1), seed_bank(3, 50, seed=1)
+        self.assertEqual(history(first['tag']), history(second['tag']))
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('seed_bank', users=2, transactions=10, stdout=output)
+        self.assertIn('Created 2 users', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed_bank', users=0, stdout=io.StringIO())
@@ -1,7 +1,12 @@
 # core/urls.py
-from django.urls import path
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
 from . import views
 
+# The DRF resources live beside the async views: /api/accounts/ (transactions are the async /api/transactions/)
+router = DefaultRouter()
+router.register('accounts', views.AccountViewSet, basename='api-account')
+
 urlpatterns = [
     path('', views.dashboard_view, name='home'),
     path('signup/', views.signup_view, name='signup'),
@@ -9,7 +14,14 @@ urlpatterns = [
     path('transfer/', views.transfer_view, name='transfer'),
     path('scan/', views.scan_and_pay_view, name='scan_and_pay'),
     path('transactions/', views.transaction_list_view, name='transactions'),
+    path('transactions/export/', views.export_statement_view, name='export_statement'),
+    path('api/balances/', views.api_balances, name='api_balances'),
+    path('api/transactions/', views.api_transaction_history, name='api_transaction_history'),
     path('api/transactions/<uuid:transaction_id>/', views.api_transaction_detail, name='api_transaction_detail'),
+    path('api/transactions/<uuid:transaction_id>/proof/', views.api_transaction_proof, name='api_transaction_proof'),
+    path('api/transfers/', views.api_transfer, name='api_transfer'),
+    path('api/transfers/batch/', views.api_transfer_batch, name='api_transfer_batch'),
+    path('api/', include(router.urls)),
     path('accounts/', views.dashboard_view, name='accounts'),
     path('accounts/create/', views.create_account_view, name='create_account'),
     path('qr_code/<int:account_id>/', views.qr_code_view, name='qr_code'),
@@ -1,39 +1,71 @@
 import hashlib
-import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
 from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .hashing import HASHED_FIELDS, hash_transaction_values
+
+GENESIS_HASH = '0' * 64 # Represents the hash of the "genesis block"
 
 def calculate_transaction_hash(transaction_instance):
     """
-    Calculates the SHA-256 hash for a given Transaction instance.
-    Ensure all relevant fields are included and ordered for consistent hashing.
+    Calculates the SHA-256 hash for a given Transaction instance, in the
+    format of its hash_version.
     """
-    data = {
-        'transaction_id': str(transaction_instance.transaction_id),
-        'sender_account_id': str(transaction_instance.sender_account.id),
-        'receiver_account_id': str(transaction_instance.receiver_account.id) if transaction_instance.receiver_account else None,
-        'amount': str(transaction_instance.amount), # Convert Decimal to string for consistent hashing
-        'transaction_type': transaction_instance.transaction_type,
-        'description': transaction_instance.description,
-        'timestamp': transaction_instance.timestamp.isoformat(), # Use ISO format for consistent datetime string
-        'previous_block_hash': transaction_instance.previous_block_hash,
-    }
-    # Sort keys to ensure consistent hash regardless of dictionary order
-    encoded_data = json.dumps(data, sort_keys=True).encode('utf-8')
-    return hashlib.sha256(encoded_data).hexdigest()
+    # Use the raw foreign key ids so hashing never triggers an Account lookup
+    return hash_transaction_values(*(getattr(transaction_instance, field) for field in HASHED_FIELDS))
 
-def verify_ledger_integrity():
+def account_number_shard(account, shard_count):
     """
-    Verifies the integrity of the entire transaction ledger.
-    Returns (is_valid, total_blocks, last_block_hash, last_update_time).
+    Default shard function: spreads accounts across shards by a hash of the account number.
     """
-    from .models import Transaction # Import Transaction here to avoid circular import
+    digest = hashlib.sha256(account.account_number.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
 
-    # Order by timestamp to ensure correct chain traversal
-    transactions = Transaction.objects.filter(status='Completed').order_by('timestamp')
-    is_valid = True
-    current_hash_in_chain = '0' * 64 # Represents the hash of the "genesis block"
+def ledger_shard_for(sender_account):
+    """
+    Returns the ledger shard a transaction from sender_account is appended to.
+    Uses settings.LEDGER_SHARDS and, if set, the LEDGER_SHARD_FUNCTION dotted path,
+    which is called as func(account, shard_count) and must return 0 <= shard < shard_count.
+    """
+    shard_count = getattr(settings, 'LEDGER_SHARDS', 1)
+    if shard_count <= 1:
+        return 0
+    function_path = getattr(settings, 'LEDGER_SHARD_FUNCTION', None)
+    shard_function = import_string(function_path) if function_path else account_number_shard
+    return shard_function(sender_account, shard_count)
+
+def verify_shard_integrity(shard=0, full_rescan=False):
+    """
+    Verifies one shard's chain, resuming from its latest signed LedgerCheckpoint
+    unless full_rescan is set. Returns (is_valid, total_blocks, last_block_hash).
+    """
+    from .models import Transaction, LedgerCheckpoint # Import models here to avoid circular import
 
-    for transaction in transactions:
+    # Walk the chain in the order it was appended
+    transactions = Transaction.objects.filter(shard=shard, chain_position__isnull=False).order_by('chain_position')
+    current_hash_in_chain = GENESIS_HASH
+    total_blocks = 0
+    last_transaction = None
+
+    checkpoint = None if full_rescan else LedgerCheckpoint.objects.filter(shard=shard).order_by('-position').first()
+    if checkpoint is not None:
+        if not checkpoint.is_authentic():
+            # A forged or edited checkpoint cannot be trusted; fall back to genesis
+            print(f"Ignoring checkpoint {checkpoint.pk}: signature mismatch")
+        elif not Transaction.objects.filter(pk=checkpoint.last_transaction_id, hash=checkpoint.last_hash).exists():
+            print(f"Chain integrity broken at checkpoint {checkpoint.pk}: transaction {checkpoint.last_transaction_id} is missing or was altered")
+            return False, checkpoint.position, checkpoint.last_hash
+        else:
+            current_hash_in_chain = checkpoint.last_hash
+            total_blocks = checkpoint.position
+            transactions = transactions.filter(chain_position__gt=checkpoint.position)
+
+    is_valid = True
+    for transaction in transactions.iterator(chunk_size=2000):
         # 1. Verify previous_block_hash linkage
         if transaction.previous_block_hash != current_hash_in_chain:
             print(f"Chain integrity broken at transaction {transaction.transaction_id}: Expected previous hash {current_hash_in_chain}, got {transaction.previous_block_hash}")
@@ -49,5 +81,97 @@ def verify_ledger_integrity():
 
         # Update current_hash_in_chain for the next iteration
         current_hash_in_chain = transaction.hash
-    
-    return is_valid, transactions.count(), current_hash_in_chain, timezone.now()
+        total_blocks += 1
+        last_transaction = transaction
+
+    # Only a fully verified prefix of the chain may become the next starting point
+    if is_valid and last_transaction is not None:
+        LedgerCheckpoint.objects.create(
+            shard=shard,
+            last_transaction_id=last_transaction.transaction_id,
+            last_hash=last_transaction.hash,
+            position=total_blocks,
+            last_timestamp=last_transaction.timestamp,
+        )
+
+    return is_valid, total_blocks, current_hash_in_chain
+
+def verify_ledger_integrity(full_rescan=False):
+    """
+    Verifies the integrity of every ledger shard.
+
+    Each shard resumes from its latest signed LedgerCheckpoint, so a call only
+    re-hashes the transactions appended since the previous run. Pass
+    full_rescan=True to ignore checkpoints and walk every chain from genesis.
+    Returns (is_valid, total_blocks, last_block_hash, last_update_time), where
+    last_block_hash is the shard head for a single shard and the Merkle root
+    over all verified shard heads otherwise.
+    """
+    from .models import ChainHead # Import ChainHead here to avoid circular import
+    from .merkle import merkle_root
+
+    is_valid = True
+    total_blocks = 0
+    head_hashes = []
+    for shard in ChainHead.objects.order_by('shard').values_list('shard', flat=True):
+        shard_valid, shard_blocks, shard_hash = verify_shard_integrity(shard, full_rescan=full_rescan)
+        is_valid = is_valid and shard_valid
+        total_blocks += shard_blocks
+        head_hashes.append(shard_hash)
+
+    last_block_hash = head_hashes[0] if len(head_hashes) == 1 else merkle_root(head_hashes)
+    return is_valid, total_blocks, last_block_hash, timezone.now()
+
+def percentile(values, fraction):
+    """Returns the value at fraction (0 to 1) of the way through values when sorted, or 0.0 if there are none."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+class LRUCache:
+    """
+    A small thread-safe, in-process least-recently-used cache.
+
+    Holds at most maxsize entries, evicting the least recently used one when
+    full. With ttl (seconds) set, entries also expire that long after they were
+    stored. Each worker process keeps its own copy, so it is only suitable as a
+    front for data that is also kept somewhere authoritative.
+    """
+    _MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
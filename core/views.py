@@ -1,26 +1,37 @@
 # core/views.py
 import uuid
-from django.http import HttpResponse, JsonResponse
-import qrcode
-from io import BytesIO
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from io import StringIO
 from django.urls import reverse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_GET
 from django.contrib.auth import login
 from django.contrib import messages
-from django.db import transaction
 from django.db.models import Q
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
-from datetime import datetime
+from django.utils.cache import get_conditional_response, patch_cache_control
+from datetime import datetime, time
 import json
-import re 
 from decimal import Decimal
 
-from .models import Account, Transaction, CustomUser
+from .models import Account, Transaction, LedgerBlock
 from .forms import TransferForm, AccountCreationForm, UserProfileForm, SignUpForm
-from .serializers import TransactionSerializer
+from .serializers import AccountSerializer, TransactionSerializer, TransferRequestSerializer, BatchTransferRequestSerializer
+from .services.transfers import transfer_funds, transfer_batch, read_transfer_lines, deposit, TransferError, BatchValidationError
+from .services.idempotency import idempotent
+from .services.history import account_history, user_history_page, auser_history_page, PAGE_SIZE
+from .services.statements import statement
+from .services.exports import EXPORT_FORMATS, aexport_statement, export_statement
+from .services.read_models import user_summary, auser_summary
+from .services.recipients import resolve_recipient
+from .qrcodes import qr_png
+from . import chatbot
+from rest_framework import viewsets
 from rest_framework.decorators import api_view
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 def generate_account_number():
@@ -56,8 +67,13 @@ def create_account_view(request):
                 messages.error(request, f"You already have a {account.account_type} account.")
                 return render(request, 'core/create_account.html', {'form': form})
             
+            # The opening balance is booked through the ledger like any other deposit
+            opening_balance = account.balance or 0
+            account.balance = 0
             account.account_number = generate_account_number()
             account.save()
+            if opening_balance > 0:
+                deposit(account, opening_balance, description='Opening balance')
             messages.success(request, f"New {account.account_type} account created!")
             return redirect('accounts')
     else:
@@ -66,29 +82,18 @@ def create_account_view(request):
 
 @login_required
 def dashboard_view(request):
-    user_accounts = Account.objects.filter(user=request.user)
-    total_balance = sum(account.balance for account in user_accounts)
-    checking_account = user_accounts.filter(account_type__iexact='Checking').first()
-    savings_account = user_accounts.filter(account_type__iexact='Savings').first()
-    checking_balance = checking_account.balance if checking_account else 0.00
-    savings_balance = savings_account.balance if savings_account else 0.00
-    recent_transactions = Transaction.objects.filter(
-        Q(sender_account__user=request.user) | Q(receiver_account__user=request.user)
-    ).order_by('-timestamp')[:5]
-
+    summary = user_summary(request.user)
     context = {
-        'user_accounts': user_accounts,
-        'total_balance': total_balance,
-        'checking_account': checking_account,
-        'savings_account': savings_account,
-        'checking_balance': checking_balance,
-        'savings_balance': savings_balance,
-        'recent_transactions': recent_transactions,
+        'total_balance': summary['total_balance'],
+        'checking_balance': summary['checking_balance'],
+        'savings_balance': summary['savings_balance'],
+        'checking_account_id': summary['checking_account_id'],
+        'recent_transactions': summary['recent_transactions'],
     }
     return render(request, 'core/dashboard.html', context)
 
 @login_required
-@transaction.atomic
+@idempotent
 def transfer_view(request):
     if request.method == 'POST':
         form = TransferForm(request.POST, user=request.user)
@@ -99,38 +104,21 @@ def transfer_view(request):
             note = form.cleaned_data['note']
 
             try:
-                receiver_account = Account.objects.filter(account_number=recipient_identifier).first()
-                if not receiver_account:
-                    recipient_user = CustomUser.objects.filter(
-                        Q(email=recipient_identifier) | Q(username=recipient_identifier)
-                    ).first()
-                    if recipient_user:
-                        receiver_account = Account.objects.filter(user=recipient_user).first()
+                receiver_account = resolve_recipient(recipient_identifier)
                 if not receiver_account:
                     messages.error(request, "Recipient account not found.")
-                    return render(request, 'core/transfer.html', {'form': form})
-                if sender_account.balance < amount:
-                    messages.error(request, "Insufficient funds.")
-                    return render(request, 'core/transfer.html', {'form': form})
-                sender_account.balance -= amount
-                receiver_account.balance += amount
-                sender_account.save()
-                receiver_account.save()
-                Transaction.objects.create(
-                    sender_account=sender_account,
-                    receiver_account=receiver_account,
-                    amount=amount,
-                    transaction_type='Transfer',
-                    description=note,
-                    status='Completed'
-                )
+                    return render(request, 'core/transfer.html', {'form': form}, status=400)
+                transfer_funds(sender_account, receiver_account, amount, description=note)
                 messages.success(request, "Transfer completed successfully!")
                 return redirect('dashboard')
+            except TransferError as e:
+                messages.error(request, str(e))
+                return render(request, 'core/transfer.html', {'form': form}, status=400)
             except Exception as e:
                 messages.error(request, f"An error occurred: {e}")
-                return render(request, 'core/transfer.html', {'form': form})
+                return render(request, 'core/transfer.html', {'form': form}, status=500)
         else:
-            return render(request, 'core/transfer.html', {'form': form})
+            return render(request, 'core/transfer.html', {'form': form}, status=400)
     else:
         form = TransferForm(user=request.user)
     return render(request, 'core/transfer.html', {'form': form})
@@ -144,56 +132,214 @@ def pay_me_view(request, account_number):
     return render(request, 'core/transfer.html', {'form': form, 'recipient_account': recipient_account})
 
 
+def _history_period(request):
+    """
+    Parses the optional start_date/end_date (YYYY-MM-DD) query parameters into
+    (start_day, start, end_day, end), where start and end are aware datetimes
+    covering the whole of both days. Raises ValueError if malformed.
+    """
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    start_day = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    start = timezone.make_aware(datetime.combine(start_day, time.min)) if start_day else None
+    end = timezone.make_aware(datetime.combine(end_day, time.max)) if end_day else None
+    return start_day, start, end_day, end
+
 @login_required
 def transaction_list_view(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
-    transactions_list = Transaction.objects.filter(
-        Q(sender_account__user=request.user) | 
-        Q(receiver_account__user=request.user)
-    ).order_by('-timestamp')
-
-    if start_date:
-        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-        transactions_list = transactions_list.filter(timestamp__gte=start_date_obj)
-    if end_date:
-        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-        transactions_list = transactions_list.filter(timestamp__lte=end_date_obj)
-
-    paginator = Paginator(transactions_list, 10)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    start_day, start, end_day, end = _history_period(request)
+    cursor = request.GET.get('cursor')
+    try:
+        transactions, next_cursor = user_history_page(request.user, cursor, start=start, end=end)
+    except ValueError:
+        # A stale or mangled cursor just starts over from the newest page
+        cursor = None
+        transactions, next_cursor = user_history_page(request.user, start=start, end=end)
+    # Per account, from the daily balance snapshots rather than the ledger. A transfer between two of
+    # the user's accounts is money out of one and into the other, so summing them would count it twice
+    statements = [statement(account, start_day, end_day)
+                  for account in Account.objects.filter(user=request.user).order_by('pk')]
 
     context = {
-        'transactions': page_obj,
+        'transactions': transactions,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+        'statements': statements,
         'start_date': start_date,
         'end_date': end_date
     }
     return render(request, 'core/transactions.html', context)
 
 
+@login_required
+def export_statement_view(request):
+    # All of the user's accounts, or just ?account=<id>; streamed, so any length of history is fine
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+    try:
+        _, start, _, end = _history_period(request)
+        account_id = int(request.GET['account']) if request.GET.get('account') else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid date or account.")
+    if account_id is not None:
+        account = get_object_or_404(Account, id=account_id, user=request.user)
+        account_ids, name = [account.pk], account.account_number
+    else:
+        account_ids, name = list(Account.objects.filter(user=request.user).values_list('pk', flat=True)), request.user.username
+
+    content_type, _ = EXPORT_FORMATS[export_format]
+    # Under ASGI a sync iterator would be read into memory whole before the first byte is sent
+    export = aexport_statement if isinstance(request, ASGIRequest) else export_statement
+    response = StreamingHttpResponse(export(account_ids, export_format, start, end), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="statement-{name}-{timezone.localdate()}.{export_format}"'
+    return response
+
+
 @login_required
 def account_detail_view(request, account_id):
     account = get_object_or_404(Account, id=account_id, user=request.user)
-    transactions = Transaction.objects.filter(
-        Q(sender_account=account) | Q(receiver_account=account)
-    ).order_by('-timestamp')[:10]
+    transactions = account_history(account, limit=10)
     context = { 'account': account, 'recent_transactions': transactions }
     return render(request, 'core/account_detail.html', context)
 
 
+# The read APIs and the chatbot are async views: while they wait on the database,
+# an ASGI worker keeps serving other requests (see quantum/asgi.py)
+
+@require_GET
+@login_required
+async def api_transaction_detail(request, transaction_id):
+    user = await request.auser()
+    transaction = await Transaction.objects.select_related('sender_account', 'receiver_account').filter(
+        Q(sender_account__user=user) | Q(receiver_account__user=user),
+        transaction_id=transaction_id
+    ).afirst()
+    if transaction is None:
+        return JsonResponse({"error": "Transaction not found"}, status=404)
+    return JsonResponse(TransactionSerializer(transaction).data)
+
+
+def _history_page_args(request):
+    """Returns (cursor, page_size, start, end) for a page of history. Raises ValueError if malformed."""
+    _, start, _, end = _history_period(request)
+    page_size = min(int(request.GET.get('page_size', PAGE_SIZE)), 100)
+    if page_size < 1:
+        raise ValueError("Invalid page_size.")
+    return request.GET.get('cursor'), page_size, start, end
+
+def _next_page_url(request, next_cursor):
+    if not next_cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+
+@require_GET
+@login_required
+async def api_transaction_history(request):
+    # Keyset-paginated: follow 'next' until it is null
+    serializer = TransactionSerializer()
+    try:
+        transactions, next_cursor = await auser_history_page(
+            await request.auser(), *_history_page_args(request), values=serializer.values_fields()
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor, page_size or date."}, status=400)
+    return JsonResponse({
+        "next": _next_page_url(request, next_cursor),
+        "results": serializer.from_values(transactions),
+    })
+
+
+@require_GET
+@login_required
+async def api_balances(request):
+    summary = await auser_summary(await request.auser())
+    return JsonResponse({
+        "total_balance": summary['total_balance'],
+        "accounts": [
+            {"id": account['pk'], "account_type": account['account_type'], "balance": account['balance']}
+            for account in summary['accounts']
+        ],
+    })
+
+
+# Read-only REST resources. Lists are built by the serializers' values() fast path, in one query.
+
+class AccountViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = AccountSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Account.objects.filter(user=self.request.user).select_related('user').order_by('pk')
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        return Response(serializer.from_values(self.get_queryset().values(*serializer.values_fields())))
+
+
+@api_view(['POST'])
+@idempotent
+@login_required
+def api_transfer(request):
+    serializer = TransferRequestSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    data = serializer.validated_data
+    try:
+        ledger_entry = transfer_funds(
+            data['from_account'], data['to_account'], data['amount'], description=data.get('description')
+        )
+    except TransferError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response(TransactionSerializer(ledger_entry).data, status=201)
+
+@api_view(['POST'])
+@idempotent
+@login_required
+def api_transfer_batch(request):
+    # Accepts a JSON body with a 'transfers' list, or a multipart upload with a CSV/JSON 'file'
+    serializer = BatchTransferRequestSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    data = serializer.validated_data
+    try:
+        if 'file' in data:
+            fmt = 'json' if data['file'].name.lower().endswith('.json') else 'csv'
+            lines = read_transfer_lines(StringIO(data['file'].read().decode('utf-8-sig')), fmt)
+        else:
+            lines = data['transfers']
+        ledger_entries = transfer_batch(data['from_account'], lines, transaction_type=data['transaction_type'])
+    except BatchValidationError as e:
+        return Response({"error": str(e), "lines": [{"line": line, "error": msg} for line, msg in e.errors]}, status=400)
+    except TransferError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({
+        "posted": len(ledger_entries),
+        "total": str(sum(entry.amount for entry in ledger_entries)),
+        "first_transaction_id": str(ledger_entries[0].transaction_id),
+        "last_transaction_id": str(ledger_entries[-1].transaction_id),
+    }, status=201)
+
 @api_view(['GET'])
 @login_required
-def api_transaction_detail(request, transaction_id):
+def api_transaction_proof(request, transaction_id):
     try:
         transaction = Transaction.objects.get(
             Q(sender_account__user=request.user) | Q(receiver_account__user=request.user),
             transaction_id=transaction_id
         )
-        serializer = TransactionSerializer(transaction)
-        return Response(serializer.data)
     except Transaction.DoesNotExist:
         return Response({"error": "Transaction not found"}, status=404)
+    proof = LedgerBlock.inclusion_proof(transaction)
+    if proof is None:
+        return Response({"error": "Transaction is not sealed into a ledger block yet"}, status=404)
+    return Response(proof)
 
 
 @login_required
@@ -202,12 +348,14 @@ def qr_code_view(request, account_id):
     pay_me_url = request.build_absolute_uri(
         reverse('pay_me', args=[account.account_number])
     )
-    data = pay_me_url
-    qr_image = qrcode.make(data, box_size=10, border=4)
-    stream = BytesIO()
-    qr_image.save(stream, format='PNG')
-    stream.seek(0)
-    return HttpResponse(stream.getvalue(), content_type="image/png")
+    png, etag = qr_png(pay_me_url)
+    # The image never changes for a URL, so a browser holding it gets a 304 without the body
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(png, content_type="image/png")
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.QR_CACHE_MAX_AGE)
+    return response
 
 @login_required
 def scan_and_pay_view(request):
@@ -215,7 +363,7 @@ def scan_and_pay_view(request):
 
 # --- SECURE VIEW TO EXECUTE TRANSFERS (SELF AND P2P) ---
 @login_required
-@transaction.atomic
+@idempotent
 def execute_chatbot_transfer(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Invalid request method.'}, status=405)
@@ -251,25 +399,12 @@ def execute_chatbot_transfer(request):
         if not to_account:
             return JsonResponse({'status': 'error', 'message': "Recipient account not found."}, status=404)
 
-        # 3. Perform Balance Check
+        # 3. Execute Transfer (locks both accounts and checks the balance)
         amount = Decimal(amount_str)
-        if from_account.balance < amount:
-            return JsonResponse({'status': 'error', 'message': 'Insufficient funds.'}, status=400)
-
-        # 4. Execute Transfer
-        from_account.balance -= amount
-        to_account.balance += amount
-        from_account.save()
-        to_account.save()
-        
-        Transaction.objects.create(
-            sender_account=from_account,
-            receiver_account=to_account,
-            amount=amount,
-            transaction_type='Transfer',
-            description='Transfer via AI Assistant',
-            status='Completed'
-        )
+        try:
+            transfer_funds(from_account, to_account, amount, description='Transfer via AI Assistant')
+        except TransferError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
         
         # Custom success message
         if recipient_num:
@@ -285,94 +420,10 @@ def execute_chatbot_transfer(request):
 
 # --- CHATBOT API VIEW ---
 @login_required
-def chatbot_api_view(request):
+async def chatbot_api_view(request):
     if request.method == 'POST':
+        # Handlers read request.user; load it here, since the lazy one cannot query from async code
+        request.user = await request.auser()
         data = json.loads(request.body)
-        user_message = data.get('message', '').lower()
-        bot_response = ""
-        
-        # --- Intent 1: Self Transfer ---
-        self_transfer_match = re.search(r'(transfer|move)\s+₹?(\d+(\.\d{1,2})?)\s+from\s+(checking|savings|investment)\s+to\s+(checking|savings|investment)', user_message)
-        
-        # --- Intent 2: Pay Another User ---
-        p2p_match = re.search(r'(pay|send)\s+₹?(\d+(\.\d{1,2})?)\s+to\s+([a-zA-Z0-9_@\.]+)', user_message)
-
-        if self_transfer_match:
-            amount = self_transfer_match.group(2)
-            from_acc = self_transfer_match.group(4).capitalize()
-            to_acc = self_transfer_match.group(5).capitalize()
-            if from_acc == to_acc:
-                return JsonResponse({'response': "You can't transfer money to the same account."})
-            
-            return JsonResponse({
-                'type': 'confirmation',
-                'message': f"I'm ready to transfer ₹{amount} from your {from_acc} to your {to_acc}. Please confirm.",
-                'details': { 'amount': amount, 'from_type': from_acc, 'to_type': to_acc }
-            })
-
-        elif p2p_match:
-            amount = p2p_match.group(2)
-            recipient_name = p2p_match.group(4)
-            
-            # Logic to find the recipient
-            recipient_account = None
-            
-            # 1. Try Account Number
-            recipient_account = Account.objects.filter(account_number=recipient_name).first()
-            
-            # 2. Try Username
-            if not recipient_account:
-                try:
-                    target_user = CustomUser.objects.get(username__iexact=recipient_name)
-                    recipient_account = Account.objects.filter(user=target_user, account_type='Checking').first()
-                    if not recipient_account:
-                         recipient_account = Account.objects.filter(user=target_user).first()
-                except CustomUser.DoesNotExist:
-                    pass
-
-            if not recipient_account:
-                return JsonResponse({'response': f"I couldn't find a user or account named '{recipient_name}'."})
-            
-            if recipient_account.user == request.user:
-                return JsonResponse({'response': "You can't pay yourself using this command. Use 'transfer from checking to savings' instead."})
-
-            return JsonResponse({
-                'type': 'confirmation',
-                'message': f"Found user {recipient_account.user.username} ({recipient_account.account_number}). Ready to send ₹{amount} from your Checking account. Confirm?",
-                'details': { 
-                    'amount': amount, 
-                    'from_type': 'Checking',
-                    'recipient_account_number': recipient_account.account_number 
-                }
-            })
-
-        # --- Other Intents ---
-        elif 'balance' in user_message:
-            accounts = Account.objects.filter(user=request.user)
-            if not accounts.exists():
-                bot_response = "You don't have any accounts yet."
-            else:
-                bot_response = "Here are your account balances:\n"
-                for acc in accounts:
-                    bot_response += f"• {acc.account_type}: ₹{acc.balance:,.2f}\n"
-            return JsonResponse({'response': bot_response})
-        
-        elif 'transaction' in user_message or 'history' in user_message:
-            txns = Transaction.objects.filter(
-                Q(sender_account__user=request.user) | Q(receiver_account__user=request.user)
-            ).order_by('-timestamp')[:3]
-            if not txns.exists():
-                bot_response = "You don't have any recent transactions."
-            else:
-                bot_response = "Here are your last 3 transactions:\n"
-                for txn in txns:
-                    bot_response += f"• ₹{txn.amount:,.2f} ({txn.transaction_type}) on {txn.timestamp.strftime('%d-%b-%Y')}\n"
-            return JsonResponse({'response': bot_response})
-            
-        elif 'hello' in user_message or 'hi' in user_message:
-            bot_response = f"Hello, {request.user.username}! You can say 'Pay 500 to Jithu' or 'Transfer 100 to savings'."
-        else:
-            bot_response = "I'm sorry, I don't understand. Try 'Pay 100 to [Username]' or ask for your balance."
-        
-        return JsonResponse({'response': bot_response})
+        return JsonResponse(await chatbot.respond(request, data.get('message', '')))
     return JsonResponse({'error': 'Invalid request'}, status=400)
\ No newline at end of file
@@ -3,6 +3,23 @@ ASGI config for quantum project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The chatbot and JSON read APIs are async views, so under an ASGI server a
+worker keeps serving other requests while one waits on the database. Run it
+with, for example:
+
+    uvicorn quantum.asgi:application --host 0.0.0.0 --port $PORT --workers 2
+
+Set DB_CONN_MAX_AGE=0 when doing so. Every in-flight request holds its own
+database connection, so keep workers times concurrent requests below the
+database's connection limit, with --limit-concurrency or a pooler such as
+PgBouncer. With more than one worker, set CACHE_BACKEND to a shared cache
+such as Redis; on the local-memory default the dashboard and balance read
+models are rebuilt on every request. The remaining views are synchronous and
+run in a thread per request, as do WhiteNoise's static files.
+
+`manage.py chat_load_test` compares how many concurrent chat sessions a
+worker holds under this and under gunicorn.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
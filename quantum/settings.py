@@ -87,7 +87,9 @@ if DEBUG:
 else:
     DATABASES = {
         'default': dj_database_url.config(
-            conn_max_age=600,
+            # Set DB_CONN_MAX_AGE=0 under an ASGI server: async requests each run on their own thread,
+            # so persistent connections would pile up instead of being reused
+            conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '600')),
             ssl_require=True
         )
     }
@@ -125,4 +127,60 @@ LOGOUT_REDIRECT_URL = '/'
 # --- EMAIL SETTINGS FOR PASSWORD RESET ---
 # For development, we print emails to the console.
 # For production, you would use a real email service like SendGrid or Mailgun.
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# --- LEDGER SHARDING ---
+# Number of independent hash chains transactions are spread across. Each shard
+# has its own head and verification; `manage.py commit_ledger_heads` binds all
+# shard heads into one Merkle root. Keep at 1 for a single chain.
+LEDGER_SHARDS = int(os.environ.get('LEDGER_SHARDS', '1'))
+# Optional dotted path to a callable(account, shard_count) -> shard number.
+# Defaults to core.utils.account_number_shard (a hash of the account number).
+LEDGER_SHARD_FUNCTION = os.environ.get('LEDGER_SHARD_FUNCTION') or None
+# Maximum number of transactions sealed into one Merkle block by `manage.py seal_ledger_blocks`.
+LEDGER_BLOCK_SIZE = int(os.environ.get('LEDGER_BLOCK_SIZE', '1024'))
+# Optional directory of the append-only ledger log (core.ledgerlog) that
+# `manage.py replay_ledger` audits offline. Every worker on the host appends to it;
+# read at startup, so set it before the workers start.
+LEDGER_LOG_DIR = os.environ.get('LEDGER_LOG_DIR') or None
+# Records per segment file of the ledger log (256 bytes each).
+LEDGER_LOG_SEGMENT_RECORDS = int(os.environ.get('LEDGER_LOG_SEGMENT_RECORDS', '65536'))
+# fsync after every append. The database stays the source of truth, and
+# replay reports any entry a crash kept out of the log, so it is off by default.
+LEDGER_LOG_FSYNC = os.environ.get('LEDGER_LOG_FSYNC', '0') == '1'
+
+# --- IDEMPOTENCY KEYS ---
+# Completed Idempotency-Key responses each worker process keeps in memory, so
+# client retries are replayed without a database query.
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+
+# --- CACHE ---
+# Holds the per-user dashboard and balance read models (core.services.read_models).
+# Every worker must share it for invalidation to reach them all, so point it at
+# Redis or Memcached in production; the local-memory default suits one process
+# (see READ_MODEL_CACHE_LOCAL).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+# Whether the read models may use a process-local cache (LocMemCache). Only one
+# process can then see its invalidations, so it defaults to on for DEBUG
+# (runserver) only; otherwise read models skip the cache until it is shared.
+READ_MODEL_CACHE_LOCAL = os.environ.get('READ_MODEL_CACHE_LOCAL', '1' if DEBUG else '0') == '1'
+# Seconds a cached read model is kept; invalidation makes it stale sooner.
+READ_MODEL_CACHE_TIMEOUT = int(os.environ.get('READ_MODEL_CACHE_TIMEOUT', '300'))
+
+# --- QR CODES ---
+# Rendered "Pay Me" QR images each worker keeps in memory (core.qrcodes).
+QR_CACHE_SIZE = int(os.environ.get('QR_CACHE_SIZE', '1024'))
+# Optional directory the rendered images are also stored in, shared by every worker on the host.
+QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR') or None
+# Seconds browsers may reuse a QR image before revalidating it with its ETag.
+QR_CACHE_MAX_AGE = int(os.environ.get('QR_CACHE_MAX_AGE', '86400'))
+
+# --- RECIPIENT LOOKUPS ---
+# Recently resolved transfer recipients each worker keeps in memory, and for how many seconds.
+RECIPIENT_CACHE_SIZE = int(os.environ.get('RECIPIENT_CACHE_SIZE', '10000'))
+RECIPIENT_CACHE_TTL = int(os.environ.get('RECIPIENT_CACHE_TTL', '60'))